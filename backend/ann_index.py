@@ -0,0 +1,173 @@
+"""
+Approximate nearest-neighbor index for the local vector store
+IVF (inverted file): spherical k-means centroids partition the rows of the
+store's matrix into lists, and a query only scans the nprobe closest lists
+"""
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class IVFIndex:
+    """Inverted-file index over row numbers of a normalized vector matrix"""
+
+    def __init__(self, dimension: int, n_lists: Optional[int] = None, nprobe: int = 16,
+                 min_train_size: int = 10000, kmeans_iterations: int = 10, seed: int = 0):
+        """
+        n_lists defaults to ~4*sqrt(N) at training time. Until min_train_size
+        rows exist the index stays untrained and callers should scan exactly.
+        """
+        self.dimension = dimension
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: list = []
+        self._list_arrays: list = []
+        self._assignment: Dict[int, int] = {}
+        self.trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._assignment)
+
+    def train(self, vectors: np.ndarray):
+        """Fit centroids with spherical k-means and assign every row of vectors"""
+        size = vectors.shape[0]
+        n_lists = self.n_lists or max(1, int(4 * math.sqrt(size)))
+        n_lists = min(n_lists, size)
+
+        # Train on a sample; k-means quality saturates well before the full corpus
+        sample_size = min(size, n_lists * 256)
+        sample_rows = self._rng.choice(size, sample_size, replace=False)
+        sample = np.asarray(vectors[np.sort(sample_rows)], dtype=np.float32)
+
+        centroids = sample[self._rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            labels = self._nearest(sample, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            order = np.argsort(labels, kind='stable')
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            occupied = counts > 0
+            sums[occupied] = np.add.reduceat(sample[order], starts[occupied], axis=0)
+
+            # Re-seed empty lists from random sample points
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[self._rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        self.centroids = centroids.astype(np.float32)
+        self._lists = [set() for _ in range(n_lists)]
+        self._list_arrays = [None] * n_lists
+        self._assignment = {}
+        self.trained_size = size
+        self.add(np.arange(size), vectors[:size])
+
+    def retrained(self, vectors: np.ndarray) -> 'IVFIndex':
+        """A new index with the same settings, trained on vectors (this one is left as is)"""
+        index = IVFIndex(self.dimension, n_lists=self.n_lists, nprobe=self.nprobe,
+                         min_train_size=self.min_train_size,
+                         kmeans_iterations=self.kmeans_iterations,
+                         seed=int(self._rng.integers(2 ** 32)))
+        index.train(vectors)
+        return index
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        """Index of the most similar centroid for each row, computed in batches"""
+        labels = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], batch_size):
+            block = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+            labels[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Assign rows (with their normalized vectors) to their nearest lists"""
+        if not self.is_trained or len(rows) == 0:
+            return
+        for row, label in zip(rows.tolist(), self._nearest(vectors, self.centroids).tolist()):
+            previous = self._assignment.get(row)
+            if previous is not None:
+                self._discard(row, previous)
+            self._assignment[row] = label
+            self._lists[label].add(row)
+            self._list_arrays[label] = None
+
+    def _discard(self, row: int, label: int):
+        self._lists[label].discard(row)
+        self._list_arrays[label] = None
+
+    def remove(self, row: int):
+        """Forget a row"""
+        label = self._assignment.pop(row, None)
+        if label is not None:
+            self._discard(row, label)
+
+    def move(self, old_row: int, new_row: int):
+        """Renumber a row (the store compacts its matrix on delete)"""
+        label = self._assignment.pop(old_row, None)
+        if label is None:
+            return
+        self._discard(old_row, label)
+        self._assignment[new_row] = label
+        self._lists[label].add(new_row)
+
+    def _list_rows(self, label: int) -> np.ndarray:
+        rows = self._list_arrays[label]
+        if rows is None:
+            rows = self._list_arrays[label] = np.fromiter(
+                self._lists[label], dtype=np.int64, count=len(self._lists[label])
+            )
+        return rows
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Row numbers in the nprobe lists whose centroids are closest to query"""
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        similarities = self.centroids @ query
+        probed = np.argpartition(-similarities, nprobe - 1)[:nprobe]
+        return np.concatenate([self._list_rows(int(label)) for label in probed])
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to restore the index (for np.savez)"""
+        rows = np.fromiter(self._assignment.keys(), dtype=np.int64, count=len(self._assignment))
+        labels = np.fromiter(self._assignment.values(), dtype=np.int64, count=len(self._assignment))
+        return {
+            'centroids': self.centroids,
+            'rows': rows,
+            'labels': labels,
+            'trained_size': np.array(self.trained_size)
+        }
+
+    def restore(self, state: Dict[str, np.ndarray]):
+        """Restore from arrays produced by state()"""
+        self.centroids = np.asarray(state['centroids'], dtype=np.float32)
+        n_lists = self.centroids.shape[0]
+        self._lists = [set() for _ in range(n_lists)]
+        self._list_arrays = [None] * n_lists
+        self._assignment = {}
+        for row, label in zip(state['rows'].tolist(), state['labels'].tolist()):
+            self._assignment[row] = label
+            self._lists[label].add(row)
+        self.trained_size = int(state['trained_size'])
+
+    def stats(self) -> Dict:
+        sizes = [len(rows) for rows in self._lists]
+        return {
+            'type': 'ivf',
+            'trained': self.is_trained,
+            'n_lists': len(self._lists),
+            'nprobe': self.nprobe,
+            'indexed_rows': len(self._assignment),
+            'largest_list': max(sizes) if sizes else 0
+        }
@@ -0,0 +1,161 @@
+"""
+Semantic answer cache for the CMU-Africa Campus Assistant
+Reuses generated answers for near-identical questions that retrieve the same
+versions of the same documents
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Cosine-similarity lookup over cached query embeddings, backed by a NumPy matrix"""
+
+    def __init__(self, dimension: int, max_entries: int = 1000,
+                 similarity_threshold: float = 0.97, ttl_seconds: Optional[float] = 3600):
+        """Initialize the cache; max_entries=0 disables it"""
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+
+        # One normalized query embedding per slot; inactive slots are masked out
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.float32)
+        self._active = np.zeros(max_entries, dtype=bool)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._slots_by_doc: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_embedding: np.ndarray, doc_ids: Iterable[str],
+               versions: Optional[Dict[str, Optional[str]]] = None) -> Optional[Dict]:
+        """
+        Return a cached entry whose query is similar enough and cites the same documents
+
+        With versions (doc ID -> content version, e.g. from the index
+        manifest), entries stored for other versions of those documents are
+        stale: they are dropped instead of returned, whichever process
+        changed the documents.
+        """
+        if not self.enabled:
+            return None
+
+        doc_key = frozenset(doc_ids)
+        query = self._normalize(query_embedding)
+
+        with self._lock:
+            if not self._entries:
+                self._misses += 1
+                return None
+
+            similarities = self._vectors @ query
+            similarities[~self._active] = -np.inf
+            candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+
+            # Check the closest candidates first
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                slot = int(slot)
+                entry = self._entries[slot]
+                if self.ttl_seconds and time.time() - entry['created_at'] > self.ttl_seconds:
+                    self._remove_slot(slot)
+                    continue
+                if entry['doc_ids'] == doc_key:
+                    if entry['versions'] != versions:
+                        self._remove_slot(slot)
+                        self._invalidations += 1
+                        continue
+                    self._entries.move_to_end(slot)
+                    self._hits += 1
+                    return entry
+
+            self._misses += 1
+            return None
+
+    def store(self, query_embedding: np.ndarray, doc_ids: Iterable[str], answer: str,
+              versions: Optional[Dict[str, Optional[str]]] = None):
+        """Cache an answer generated for a query and the documents it was grounded on"""
+        if not self.enabled:
+            return
+
+        doc_key = frozenset(doc_ids)
+        with self._lock:
+            if not self._free_slots:
+                # Evict the least recently used entry
+                oldest_slot = next(iter(self._entries))
+                self._remove_slot(oldest_slot)
+                self._evictions += 1
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = self._normalize(query_embedding)
+            self._active[slot] = True
+            self._entries[slot] = {
+                'doc_ids': doc_key,
+                'versions': versions,
+                'answer': answer,
+                'created_at': time.time()
+            }
+            for doc_id in doc_key:
+                self._slots_by_doc.setdefault(doc_id, set()).add(slot)
+
+    def invalidate(self, doc_ids: Iterable[str]) -> int:
+        """Drop every cached answer that cites any of doc_ids; returns how many were dropped"""
+        removed = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                for slot in list(self._slots_by_doc.get(doc_id, ())):
+                    self._remove_slot(slot)
+                    removed += 1
+            self._invalidations += removed
+        return removed
+
+    def _remove_slot(self, slot: int):
+        """Free a slot and unlink it from the document index (lock held)"""
+        entry = self._entries.pop(slot, None)
+        if entry is None:
+            return
+        self._active[slot] = False
+        self._free_slots.append(slot)
+        for doc_id in entry['doc_ids']:
+            slots = self._slots_by_doc.get(doc_id)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._slots_by_doc[doc_id]
+
+    def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            for slot in list(self._entries):
+                self._remove_slot(slot)
+
+    def stats(self) -> Dict:
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'similarity_threshold': self.similarity_threshold,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
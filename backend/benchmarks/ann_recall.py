@@ -0,0 +1,114 @@
+"""
+Recall@k vs latency benchmark for the local vector store's IVF index
+
+Builds a flat (exact) and an IVF LocalVectorStore over the same synthetic,
+clustered embeddings, then reports recall@k against the exact scan and
+per-query latency for each nprobe setting. Runs fully offline.
+
+Usage:
+    python benchmarks/ann_recall.py --vectors 200000 --nprobe 1 2 4 8 16 32
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_store import LocalVectorStore  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the pct-th percentile of values (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def synthetic_embeddings(count: int, dimension: int, topics: int, rng) -> np.ndarray:
+    """Topic-clustered unit vectors, closer to real embeddings than uniform noise"""
+    centers = rng.standard_normal((topics, dimension)).astype(np.float32)
+    labels = rng.integers(0, topics, count)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fill(store: LocalVectorStore, vectors: np.ndarray, batch_size: int = 5000):
+    """Upsert vectors in batches, like the indexer does"""
+    for start in range(0, len(vectors), batch_size):
+        store.upsert([
+            {'id': str(start + i), 'values': row, 'metadata': {}}
+            for i, row in enumerate(vectors[start:start + batch_size])
+        ])
+
+
+def timed_queries(store: LocalVectorStore, queries: np.ndarray, top_k: int):
+    """Run every query, returning (result id sets, latencies in ms)"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        matches = store.query(query, top_k)['matches']
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({match['id'] for match in matches})
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall@k vs latency against the exact scan")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=15,
+                        help="Matches per query (retrieve_context fetches top_k * 3)")
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_embeddings(args.vectors, args.dimension, args.topics, rng)
+    # Queries are perturbed corpus vectors, like a question close to an indexed chunk
+    picks = rng.choice(args.vectors, args.queries, replace=False)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+
+    flat = LocalVectorStore(args.dimension, dtype=args.dtype, initial_capacity=args.vectors)
+    fill(flat, vectors)
+
+    start = time.perf_counter()
+    ivf = LocalVectorStore(args.dimension, dtype=args.dtype, initial_capacity=args.vectors,
+                           index_type="ivf", n_lists=args.n_lists,
+                           ann_min_rows=args.vectors)
+    fill(ivf, vectors)
+    ivf.wait_for_ann()
+    build_seconds = time.perf_counter() - start
+    ann_stats = ivf.describe_stats()['ann_index']
+
+    print(f"{args.vectors} vectors x {args.dimension} ({args.dtype}), "
+          f"{args.queries} queries, top_k={args.top_k}")
+    print(f"IVF: {ann_stats['n_lists']} lists, built in {build_seconds:.1f}s\n")
+
+    exact, exact_latencies = timed_queries(flat, queries, args.top_k)
+    print(f"{'index':>10} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    print(f"{'flat':>10} {1.0:>9.3f} {percentile(exact_latencies, 50):>8.2f} "
+          f"{percentile(exact_latencies, 95):>8.2f} {statistics.mean(exact_latencies):>8.2f}")
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        approximate, latencies = timed_queries(ivf, queries, args.top_k)
+        recall = statistics.mean(
+            len(found & truth) / len(truth) for found, truth in zip(approximate, exact)
+        )
+        print(f"{'nprobe=' + str(nprobe):>10} {recall:>9.3f} {percentile(latencies, 50):>8.2f} "
+              f"{percentile(latencies, 95):>8.2f} {statistics.mean(latencies):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Fit the reranker's relevance model to labeled queries and report its thresholds
+
+Retrieves over-fetched candidates for each query exactly as the pipeline
+does, labels a candidate relevant when it comes from one of the query's
+relevant documents, fits the logistic weights and saves them for
+RERANK_WEIGHTS_PATH. Labeled queries come from a JSON Lines file of
+{"query", "relevant": [document ids]} records (ideally real questions); without
+one, each knowledge base document's title and keywords serve as its queries.
+
+By default the configured index is used (as the API would: OPENAI_API_KEY,
+VECTOR_STORE...). With --offline, the knowledge base is indexed into an
+in-process store with fake embeddings, which only exercises the procedure.
+
+Usage:
+    python benchmarks/calibrate_reranker.py --labels labeled_queries.jsonl --output reranker_weights.json
+    python benchmarks/calibrate_reranker.py --offline
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from document_stream import iter_documents  # noqa: E402
+from lexical_index import reciprocal_rank_fusion, tokenize  # noqa: E402
+from reranker import FEATURES, Reranker  # noqa: E402
+
+DEFAULT_KB = os.path.join(BACKEND_DIR, '..', 'data', 'sample_knowledge_base.json')
+
+
+def synthetic_queries(documents: List[Dict]) -> List[Dict]:
+    """A title query and a keywords query per document, relevant to that document"""
+    queries = []
+    for doc in documents:
+        queries.append({'query': doc['title'], 'relevant': [doc['id']]})
+        if doc.get('keywords'):
+            queries.append({'query': ' '.join(doc['keywords'][:4]), 'relevant': [doc['id']]})
+    return queries
+
+
+def load_labels(path: str) -> List[Dict]:
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_pipeline(args, documents: List[Dict]):
+    """The configured pipeline, or with --offline one over fakes with documents indexed"""
+    if not args.offline:
+        import main
+        return main.get_rag_pipeline()
+
+    from fakes import AsyncFakeOpenAI, FakeOpenAI
+    from rag_pipeline import EnhancedRAGPipeline
+    from vector_store import LocalVectorStore
+    pipeline = EnhancedRAGPipeline(
+        openai_api_key="offline",
+        pinecone_api_key=None,
+        index_name="reranker-calibration",
+        vector_store=LocalVectorStore(dimension=1536),
+        openai_client=FakeOpenAI(embedding_latency=0.0),
+        async_openai_client=AsyncFakeOpenAI(embedding_latency=0.0)
+    )
+    pipeline.update_index(documents, force=True)
+    return pipeline
+
+
+def candidate_features(pipeline, reranker: Reranker, queries: List[Dict],
+                       candidates: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Features, labels and query number of every retrieved candidate"""
+    texts = [labeled['query'] for labeled in queries]
+    embeddings = []
+    for batch in pipeline._iter_batches(texts, pipeline.embed_batch_size):
+        embeddings.extend(pipeline.create_embeddings(batch))
+
+    features, labels, groups = [], [], []
+    for number, (labeled, embedding) in enumerate(zip(queries, embeddings)):
+        query = labeled['query']
+        relevant = set(labeled['relevant'])
+        lexical = pipeline._lexical_search(query, candidates)
+        dense = pipeline._parse_matches(pipeline.vector_store.query(embedding, candidates))
+        chunks = reciprocal_rank_fusion(dense, lexical)
+        if not chunks:
+            continue
+        dense_scores = {chunk['id']: chunk['score'] for chunk in dense}
+        idfs = pipeline.lexical_index.idf(set(tokenize(query)))
+        features.append(reranker.features(query, chunks, dense_scores, idfs))
+        labels.extend(1.0 if chunk['parent_id'] in relevant else 0.0 for chunk in chunks)
+        groups.extend([number] * len(chunks))
+    return np.vstack(features), np.array(labels), np.array(groups)
+
+
+def print_thresholds(reranker: Reranker, features: np.ndarray, labels: np.ndarray,
+                     groups: np.ndarray, thresholds: List[float]):
+    """Per threshold: precision/recall of kept candidates, passages kept and queries answered"""
+    scores = reranker.relevance(features)
+    queries = len(np.unique(groups))
+    print(f"{'threshold':>9} {'precision':>9} {'recall':>7} {'kept/query':>10} {'answered':>9}")
+    for threshold in thresholds:
+        kept = scores >= threshold
+        precision = labels[kept].mean() if kept.any() else 0.0
+        recall = kept[labels == 1].mean() if labels.any() else 0.0
+        answered = len(np.unique(groups[kept])) / queries
+        print(f"{threshold:>9.2f} {precision:>9.2f} {recall:>7.2f} "
+              f"{kept.sum() / queries:>10.1f} {answered:>9.0%}")
+
+
+def main_cli(args):
+    documents = list(iter_documents(args.kb))
+    queries = load_labels(args.labels) if args.labels else synthetic_queries(documents)
+    pipeline = build_pipeline(args, documents)
+    reranker = Reranker()
+
+    features, labels, groups = candidate_features(pipeline, reranker, queries, args.candidates)
+    print(f"{len(np.unique(groups))} queries, {len(labels)} candidates, "
+          f"{int(labels.sum())} relevant\n")
+    print("Default weights:")
+    print_thresholds(reranker, features, labels, groups, args.thresholds)
+
+    result = reranker.fit(features, labels, l2=args.l2)
+    print(f"\nFitted weights (log loss {result['log_loss']:.3f}):")
+    for name, weight in zip(FEATURES, reranker.weights):
+        print(f"  {name:>9}: {weight:+.2f}")
+    print(f"  {'bias':>9}: {reranker.bias:+.2f}")
+    print_thresholds(reranker, features, labels, groups, args.thresholds)
+
+    if args.output:
+        reranker.save(args.output)
+        print(f"\nSaved to {args.output}; set RERANK_WEIGHTS_PATH to use them")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the reranker to labeled queries")
+    parser.add_argument("--kb", default=DEFAULT_KB, help="Knowledge base (.json array or .jsonl)")
+    parser.add_argument("--labels", default=None,
+                        help="JSON Lines of {\"query\", \"relevant\": [document ids]}")
+    parser.add_argument("--offline", action="store_true",
+                        help="Index the knowledge base in-process with fake embeddings")
+    parser.add_argument("--candidates", type=int, default=30,
+                        help="Candidates retrieved per query (RERANK_CANDIDATES)")
+    parser.add_argument("--l2", type=float, default=1.0, help="L2 penalty on the weights")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3, 0.4, 0.5, 0.6, 0.7])
+    parser.add_argument("--output", default=None, help="File to save the fitted weights to")
+    main_cli(parser.parse_args())
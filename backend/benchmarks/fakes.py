@@ -0,0 +1,153 @@
+"""
+Deterministic local stand-ins for the OpenAI clients used by the RAG pipeline
+
+Embeddings are hashed bag-of-words vectors, so texts sharing words are
+similar and retrieval behaves plausibly; chat completions echo a canned
+answer with configurable latency and token-streaming rate. Response objects
+mirror the attributes of the openai SDK types the pipeline reads.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Union
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def fake_embedding(text: str, dimension: int = 1536) -> List[float]:
+    """Unit-length feature-hashed word counts of text"""
+    vector = [0.0] * dimension
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+        bucket = int.from_bytes(digest, 'little')
+        # The sign bit keeps unrelated words from only ever adding similarity
+        vector[bucket % dimension] += 1.0 if bucket & (1 << 63) else -1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _count_tokens(text: str) -> int:
+    return len(WORD_PATTERN.findall(text))
+
+
+class FakeEmbeddings:
+    """client.embeddings with a fixed per-request latency"""
+
+    def __init__(self, latency: float = 0.05, dimension: int = 1536):
+        self.latency = latency
+        self.dimension = dimension
+        self.requests = 0
+
+    def _response(self, input: Union[str, List[str]]) -> SimpleNamespace:
+        self.requests += 1
+        texts = [input] if isinstance(input, str) else input
+        tokens = sum(_count_tokens(text) for text in texts)
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=fake_embedding(text, self.dimension), index=i)
+                  for i, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens)
+        )
+
+    def create(self, input: Union[str, List[str]], model: str, **kwargs) -> SimpleNamespace:
+        time.sleep(self.latency)
+        return self._response(input)
+
+
+class AsyncFakeEmbeddings(FakeEmbeddings):
+    async def create(self, input: Union[str, List[str]], model: str, **kwargs) -> SimpleNamespace:
+        await asyncio.sleep(self.latency)
+        return self._response(input)
+
+
+class FakeChatCompletions:
+    """
+    client.chat.completions returning a canned answer of answer_tokens words
+
+    The first token arrives after latency seconds; the remaining tokens
+    follow at tokens_per_second (non-streaming calls wait for all of them).
+    """
+
+    def __init__(self, latency: float = 0.3, tokens_per_second: float = 50.0,
+                 answer_tokens: int = 60):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.requests = 0
+
+    def _answer_words(self, messages: List[Dict]) -> List[str]:
+        question = messages[-1]['content'] if messages else ''
+        words = f"Offline answer to: {question}".split()
+        filler = "This response was generated by the offline benchmark chat stub.".split()
+        while len(words) < self.answer_tokens:
+            words.extend(filler)
+        return words[:self.answer_tokens]
+
+    def _usage(self, messages: List[Dict], completion_tokens: int) -> SimpleNamespace:
+        prompt_tokens = sum(_count_tokens(message['content']) for message in messages)
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                               total_tokens=prompt_tokens + completion_tokens)
+
+    def _generation_time(self) -> float:
+        return self.latency + max(0, self.answer_tokens - 1) / self.tokens_per_second
+
+    def _response(self, messages: List[Dict]) -> SimpleNamespace:
+        self.requests += 1
+        words = self._answer_words(messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=' '.join(words)))],
+            usage=self._usage(messages, len(words))
+        )
+
+    def create(self, messages: List[Dict], stream: bool = False, **kwargs) -> SimpleNamespace:
+        if stream:
+            raise NotImplementedError("The offline benchmarks only stream with the async client")
+        time.sleep(self._generation_time())
+        return self._response(messages)
+
+
+class AsyncFakeChatCompletions(FakeChatCompletions):
+    async def create(self, messages: List[Dict], stream: bool = False, **kwargs):
+        if not stream:
+            await asyncio.sleep(self._generation_time())
+            return self._response(messages)
+
+        self.requests += 1
+        words = self._answer_words(messages)
+        include_usage = (kwargs.get('stream_options') or {}).get('include_usage', False)
+
+        async def chunks():
+            await asyncio.sleep(self.latency)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(1 / self.tokens_per_second)
+                delta = SimpleNamespace(content=word if i == 0 else f" {word}")
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            if include_usage:
+                yield SimpleNamespace(choices=[], usage=self._usage(messages, len(words)))
+
+        return chunks()
+
+
+class FakeOpenAI:
+    """Drop-in for openai.OpenAI as used by EnhancedRAGPipeline"""
+
+    def __init__(self, embedding_latency: float = 0.05, chat_latency: float = 0.3,
+                 tokens_per_second: float = 50.0, answer_tokens: int = 60):
+        self.embeddings = FakeEmbeddings(embedding_latency)
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(
+            chat_latency, tokens_per_second, answer_tokens
+        ))
+
+
+class AsyncFakeOpenAI:
+    """Drop-in for openai.AsyncOpenAI as used by EnhancedRAGPipeline"""
+
+    def __init__(self, embedding_latency: float = 0.05, chat_latency: float = 0.3,
+                 tokens_per_second: float = 50.0, answer_tokens: int = 60):
+        self.embeddings = AsyncFakeEmbeddings(embedding_latency)
+        self.chat = SimpleNamespace(completions=AsyncFakeChatCompletions(
+            chat_latency, tokens_per_second, answer_tokens
+        ))
@@ -0,0 +1,105 @@
+"""
+Concurrent load test for the CMU-Africa Campus Assistant chat API
+
+Drives /api/chat at increasing concurrency levels against a running server and
+reports throughput and latency percentiles for each level. With the async
+pipeline, requests/second per worker should grow with concurrency instead of
+staying flat at one in-flight chat.
+
+Usage:
+    python benchmarks/load_test.py --url http://localhost:8001 --concurrency 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_PROMPTS = [
+    "What are the shuttle bus timings today?",
+    "What housing options are available?",
+    "What are the library opening hours?",
+    "How do I access the student portal?",
+    "What are the graduation requirements for my program?",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the pct-th percentile of values (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int,
+                    total_requests: int, prompts: List[str], path: str = "/api/chat") -> Dict:
+    """Send total_requests chats with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json={
+                    "message": prompts[i % len(prompts)],
+                    "session_id": f"load_test_{i}"
+                })
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'errors': errors,
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies) if latencies else 0.0,
+    }
+
+
+def print_results(results: List[Dict]):
+    """Print a throughput/latency table, one row per concurrency level"""
+    print(f"{'conc':>5} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'scaling':>8}")
+    baseline = results[0]['throughput'] if results and results[0]['throughput'] else None
+    for r in results:
+        scaling = r['throughput'] / baseline if baseline else 0.0
+        print(f"{r['concurrency']:>5} {r['requests']:>6} {r['errors']:>6} "
+              f"{r['throughput']:>8.2f} {r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} "
+              f"{r['p99'] * 1000:>9.1f} {scaling:>7.2f}x")
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        results = []
+        for concurrency in args.concurrency:
+            total = max(args.requests, concurrency)
+            results.append(await run_level(client, concurrency, total, DEFAULT_PROMPTS))
+        print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the /api/chat endpoint")
+    parser.add_argument("--url", default="http://localhost:8001", help="Backend base URL")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Concurrency levels to test")
+    parser.add_argument("--requests", type=int, default=32,
+                        help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    asyncio.run(main(parser.parse_args()))
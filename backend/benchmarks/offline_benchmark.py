@@ -0,0 +1,190 @@
+"""
+Offline benchmark of the backend API with local stand-ins for OpenAI and Pinecone
+
+Runs main.app in-process (no server, no network, no API quota) with
+deterministic fake embeddings, a chat stub with configurable latency and
+token rate, and the in-process LocalVectorStore. Indexes a synthetic
+knowledge base through /api/index/documents, then drives /api/chat (or
+/api/chat/stream) at each concurrency level and reports throughput, latency
+percentiles and the per-stage breakdown from the pipeline metrics.
+
+Usage:
+    python benchmarks/offline_benchmark.py --documents 2000 --concurrency 1 4 16 64
+    python benchmarks/offline_benchmark.py --chat-latency 0.8 --tokens-per-second 30 --stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Indexing jobs are kept in memory and not throttled unless configured otherwise
+os.environ.setdefault("INDEX_JOBS_PATH", ":memory:")
+os.environ.setdefault("INDEX_JOB_TOKENS_PER_MINUTE", "0")
+
+import main  # noqa: E402
+from answer_cache import SemanticAnswerCache  # noqa: E402
+from embedding_cache import EmbeddingCache  # noqa: E402
+from fakes import AsyncFakeOpenAI, FakeOpenAI  # noqa: E402
+from load_test import DEFAULT_PROMPTS, percentile, print_results, run_level  # noqa: E402
+from rag_pipeline import EnhancedRAGPipeline  # noqa: E402
+from vector_store import LocalVectorStore  # noqa: E402
+
+DEFAULT_KB = os.path.join(BACKEND_DIR, '..', 'data', 'sample_knowledge_base.json')
+CAMPUSES = ['Kigali', 'Nairobi', 'Lagos', 'Accra', 'Addis Ababa', 'Dakar', 'Cape Town', 'Cairo']
+
+
+def synthetic_documents(base_documents: List[Dict], count: int) -> List[Dict]:
+    """count documents cycling through the sample knowledge base, one variant per campus/copy"""
+    documents = []
+    for i in range(count):
+        base = base_documents[i % len(base_documents)]
+        copy = i // len(base_documents)
+        campus = CAMPUSES[copy % len(CAMPUSES)]
+        documents.append({
+            **base,
+            'id': f"{base['id']}_{copy}" if copy else base['id'],
+            'title': f"{base['title']} ({campus})" if copy else base['title'],
+            'content': f"{base['content']} This applies to the {campus} campus, edition {copy}."
+                       if copy else base['content']
+        })
+    return documents
+
+
+def build_pipeline(args) -> EnhancedRAGPipeline:
+    """Pipeline wired to the fakes and an in-process vector store"""
+    fake_options = dict(
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens
+    )
+    return EnhancedRAGPipeline(
+        openai_api_key="offline",
+        pinecone_api_key=None,
+        index_name="offline-benchmark",
+        # Caches are off by default so every request pays for the full pipeline
+        embedding_cache=EmbeddingCache(max_entries=10000 if args.caches else 0),
+        answer_cache=SemanticAnswerCache(dimension=1536, max_entries=1000 if args.caches else 0),
+        embed_batch_size=args.embed_batch_size,
+        vector_store=LocalVectorStore(dimension=1536, index_type=args.index),
+        metrics=main.metrics,
+        openai_client=FakeOpenAI(**fake_options),
+        async_openai_client=AsyncFakeOpenAI(**fake_options)
+    )
+
+
+async def run_indexing(client: httpx.AsyncClient, documents: List[Dict],
+                       batch_size: int, concurrency: int) -> Dict:
+    """POST documents in batches to /api/index/documents?wait=true with `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(batch: List[Dict]):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/index/documents", json=batch,
+                                             params={"force": "true", "wait": "true"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    start = time.perf_counter()
+    await asyncio.gather(*(one(batch) for batch in batches))
+    elapsed = time.perf_counter() - start
+    return {
+        'documents': len(documents),
+        'requests': len(batches),
+        'errors': errors,
+        'elapsed': elapsed,
+        'docs_per_second': len(documents) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+    }
+
+
+def print_stage_summary(summary: Dict[str, Dict]):
+    """Print the pipeline's per-stage latency percentiles"""
+    print(f"{'stage':>18} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in summary.items():
+        print(f"{stage:>18} {stats['count']:>7} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+async def run(args):
+    with open(args.kb, 'r') as f:
+        documents = synthetic_documents(json.load(f), args.documents)
+
+    # The default prompts are the canned ones; answering them from precomputed
+    # responses would skip the pipeline this benchmark measures
+    main.PRECOMPUTE_ANSWERS = args.precompute
+    main.rag_pipeline = build_pipeline(args)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://offline",
+                                 timeout=args.timeout) as client:
+        indexing = await run_indexing(client, documents, args.index_batch_size,
+                                      args.index_concurrency)
+        print(f"Indexed {indexing['documents']} documents in {indexing['elapsed']:.2f}s "
+              f"({indexing['docs_per_second']:.0f} docs/s, {indexing['requests']} requests, "
+              f"{indexing['errors']} errors, p50 {indexing['p50'] * 1000:.0f} ms, "
+              f"p95 {indexing['p95'] * 1000:.0f} ms)\n")
+
+        path = "/api/chat/stream" if args.stream else "/api/chat"
+        results = []
+        for concurrency in args.concurrency:
+            total = max(args.requests, concurrency)
+            results.append(await run_level(client, concurrency, total, DEFAULT_PROMPTS, path))
+        print(f"{path}:")
+        print_results(results)
+
+    # Fallbacks skip the LLM, so a shift in outcomes changes what the latencies measure
+    outcomes = main.metrics.counter_values('rag_responses_total')
+    print("\nOutcomes: " + ", ".join(
+        f"{dict(labels)['outcome']}={int(count)}" for labels, count in sorted(outcomes.items())
+    ))
+    print("\nPipeline stages (all levels):")
+    print_stage_summary(main.metrics.summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API offline against local fakes")
+    parser.add_argument("--kb", default=DEFAULT_KB, help="Knowledge base JSON to replicate")
+    parser.add_argument("--documents", type=int, default=500,
+                        help="Synthetic documents to index")
+    parser.add_argument("--index-batch-size", type=int, default=100,
+                        help="Documents per /api/index/documents request")
+    parser.add_argument("--index-concurrency", type=int, default=4,
+                        help="Indexing requests in flight")
+    parser.add_argument("--embed-batch-size", type=int, default=100)
+    parser.add_argument("--index", choices=["flat", "ivf"], default="flat",
+                        help="Local vector store index type")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Chat concurrency levels to test")
+    parser.add_argument("--requests", type=int, default=32,
+                        help="Chat requests per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="Drive /api/chat/stream instead")
+    parser.add_argument("--caches", action="store_true",
+                        help="Enable the embedding and answer caches")
+    parser.add_argument("--precompute", action="store_true",
+                        help="Serve the canned prompts from precomputed answers")
+    parser.add_argument("--embedding-latency", type=float, default=0.05,
+                        help="Seconds per fake embeddings request")
+    parser.add_argument("--chat-latency", type=float, default=0.3,
+                        help="Seconds until the fake chat model's first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0,
+                        help="Fake chat model token rate")
+    parser.add_argument("--answer-tokens", type=int, default=60,
+                        help="Tokens per fake answer")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""
+Memory vs recall benchmark for the local vector store's compact storage
+
+Stores the same embeddings as float32, float16 and int8, optionally
+shortened to fewer dimensions, with and without full-precision rescoring.
+For each it reports the scanned bytes per million vectors, the float32
+rescoring copy (memory-mapped, only shortlisted rows are read), recall@k
+against an exact float32 scan of the full vectors, and per-query latency.
+Runs fully offline.
+
+Synthetic vectors carry no more information in their leading dimensions than
+in the rest, unlike text-embedding-3 embeddings, so they overstate what
+shortening costs; pass --vectors-file (e.g. a saved store's vectors.npy) to
+measure real embeddings.
+
+Usage:
+    python benchmarks/quantization_benchmark.py --vectors 100000 --dimensions 1536 512
+    python benchmarks/quantization_benchmark.py --vectors-file vector_store/vectors.npy
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_recall import fill, percentile, synthetic_embeddings, timed_queries  # noqa: E402
+from vector_store import LocalVectorStore  # noqa: E402
+
+MIB_PER_MILLION = 1e6 / 2 ** 20
+
+
+def python_list_bytes(dimension: int) -> int:
+    """Bytes one embedding takes as a list of Python floats (list plus float objects)"""
+    embedding = [float(i) + 0.5 for i in range(dimension)]
+    return sys.getsizeof(embedding) + sum(sys.getsizeof(value) for value in embedding)
+
+
+def shorten(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """Leading dimensions renormalized, as the embeddings API shortens embeddings"""
+    shortened = np.ascontiguousarray(vectors[:, :dimension])
+    norms = np.linalg.norm(shortened, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return shortened / norms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per million vectors and recall loss "
+                                                 "of compact vector storage")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--vectors-file", default=None,
+                        help=".npy matrix of real embeddings to use instead of synthetic ones")
+    parser.add_argument("--dimension", type=int, default=1536,
+                        help="Dimension of synthetic vectors")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=None,
+                        help="Stored dimensions to test (default: the full dimension)")
+    parser.add_argument("--dtypes", nargs="+", default=["float32", "float16", "int8"])
+    parser.add_argument("--rescore-factor", type=int, default=4,
+                        help="Shortlist multiple rescored at full precision (compact dtypes)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=15,
+                        help="Matches per query (retrieve_context fetches top_k * 3)")
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.vectors_file:
+        loaded = np.asarray(np.load(args.vectors_file, mmap_mode='r'), dtype=np.float32)
+        vectors = shorten(loaded, loaded.shape[1])
+    else:
+        vectors = synthetic_embeddings(args.vectors, args.dimension, args.topics, rng)
+    count, full_dimension = vectors.shape
+    # Queries are perturbed corpus vectors, like a question close to an indexed chunk
+    picks = rng.choice(count, min(args.queries, count), replace=False)
+    queries = shorten(
+        vectors[picks] + 0.3 * rng.standard_normal((len(picks), full_dimension)).astype(np.float32),
+        full_dimension
+    )
+
+    exact_store = LocalVectorStore(full_dimension, initial_capacity=count)
+    fill(exact_store, vectors)
+    exact, _ = timed_queries(exact_store, queries, args.top_k)
+    del exact_store
+
+    print(f"{count} vectors x {full_dimension}, {len(queries)} queries, top_k={args.top_k}")
+    print(f"As lists of Python floats: {python_list_bytes(full_dimension) * MIB_PER_MILLION:,.0f} "
+          f"MiB per million vectors\n")
+    print(f"{'dims':>5} {'dtype':>8} {'rescore':>7} {'scan MiB/M':>11} {'f32 copy MiB/M':>15} "
+          f"{'recall@k':>9} {'p50 ms':>8} {'mean ms':>8}")
+
+    for dimension in args.dimensions or [full_dimension]:
+        stored = shorten(vectors, dimension) if dimension < full_dimension else vectors
+        stored_queries = shorten(queries, dimension) if dimension < full_dimension else queries
+        for dtype in args.dtypes:
+            factors = [0] if dtype == "float32" else [0, args.rescore_factor]
+            for factor in factors:
+                store = LocalVectorStore(dimension, dtype=dtype, initial_capacity=count,
+                                         rescore_factor=factor)
+                fill(store, stored)
+                found, latencies = timed_queries(store, stored_queries, args.top_k)
+                recall = statistics.mean(
+                    len(result & truth) / len(truth) for result, truth in zip(found, exact)
+                )
+                copy_mib = dimension * 4 * MIB_PER_MILLION if factor else 0.0
+                print(f"{dimension:>5} {dtype:>8} {'x' + str(factor) if factor else '-':>7} "
+                      f"{store.bytes_per_vector * MIB_PER_MILLION:>11,.0f} {copy_mib:>15,.0f} "
+                      f"{recall:>9.3f} {percentile(latencies, 50):>8.2f} "
+                      f"{statistics.mean(latencies):>8.2f}")
+                del store
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    main()
+    print(f"\nDone in {time.perf_counter() - start:.1f}s")
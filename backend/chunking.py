@@ -0,0 +1,99 @@
+"""
+Document chunking for the CMU-Africa Campus Assistant
+Splits documents into overlapping, sentence-aligned chunks sized in tokens
+"""
+import re
+from typing import Dict, Iterable, Iterator, List
+
+# Approximates BPE tokenization closely enough for budgeting: words and punctuation
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+(?:[.!?]+|\n+|$)")
+
+# Optional document fields naming the programs / study years a document is meant for
+AUDIENCE_FIELDS = ('programs', 'years')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of model tokens in text"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """Lazily yield the sentences of text"""
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentence = match.group().strip()
+        if sentence:
+            yield sentence
+
+
+def _split_long_sentence(sentence: str, max_tokens: int) -> Iterator[str]:
+    """Break a sentence longer than max_tokens into word windows"""
+    words = sentence.split()
+    window = []
+    window_tokens = 0
+    for word in words:
+        word_tokens = estimate_tokens(word)
+        if window and window_tokens + word_tokens > max_tokens:
+            yield ' '.join(window)
+            window, window_tokens = [], 0
+        window.append(word)
+        window_tokens += word_tokens
+    if window:
+        yield ' '.join(window)
+
+
+def iter_chunks(text: str, max_tokens: int = 200, overlap_tokens: int = 40) -> Iterator[str]:
+    """
+    Stream sentence-aligned chunks of at most max_tokens tokens
+
+    Consecutive chunks share trailing sentences worth up to overlap_tokens so
+    facts spanning a chunk boundary remain retrievable from either side.
+    """
+    window: List[tuple] = []
+    window_tokens = 0
+
+    for sentence in iter_sentences(text):
+        for piece in _split_long_sentence(sentence, max_tokens):
+            piece_tokens = estimate_tokens(piece)
+            if window and window_tokens + piece_tokens > max_tokens:
+                yield ' '.join(part for part, _ in window)
+
+                # Carry trailing sentences into the next chunk as overlap, as far
+                # as the piece starting it leaves room under max_tokens
+                overlap_budget = min(overlap_tokens, max_tokens - piece_tokens)
+                overlap, overlap_size = [], 0
+                for part, size in reversed(window):
+                    if overlap_size + size > overlap_budget:
+                        break
+                    overlap.insert(0, (part, size))
+                    overlap_size += size
+                window, window_tokens = overlap, overlap_size
+
+            window.append((piece, piece_tokens))
+            window_tokens += piece_tokens
+
+    if window:
+        yield ' '.join(part for part, _ in window)
+
+
+def chunk_id(parent_id: str, chunk_index: int) -> str:
+    """Vector ID for a chunk of a document"""
+    return f"{parent_id}#{chunk_index}"
+
+
+def iter_document_chunks(documents: Iterable[Dict], max_tokens: int = 200,
+                         overlap_tokens: int = 40) -> Iterator[Dict]:
+    """Stream chunk records for documents, carrying parent_id, chunk_index and audience"""
+    for doc in documents:
+        audience = {field: doc[field] for field in AUDIENCE_FIELDS if doc.get(field)}
+        for index, content in enumerate(iter_chunks(doc['content'], max_tokens, overlap_tokens)):
+            yield {
+                'id': chunk_id(doc['id'], index),
+                'parent_id': doc['id'],
+                'chunk_index': index,
+                'title': doc.get('title', ''),
+                'category': doc.get('category', ''),
+                'keywords': doc.get('keywords', []),
+                'content': content,
+                **audience
+            }
@@ -0,0 +1,120 @@
+"""
+Token-budgeted prompt context for the CMU-Africa Campus Assistant
+Fits retrieved contexts into a fixed token budget: duplicate passages are
+dropped and long contexts are reduced to their most query-relevant sentences
+"""
+import re
+from typing import Dict, List, Set
+
+from chunking import estimate_tokens, iter_sentences
+from lexical_index import tokenize
+
+WORD_PATTERN = re.compile(r"\w")
+
+
+def _normalize(sentence: str) -> str:
+    return ' '.join(sentence.lower().split())
+
+
+class ContextBuilder:
+    """Select and compress retrieved contexts into a token-budgeted prompt section"""
+
+    def __init__(self, max_tokens: int = 1200, max_contexts: int = 5,
+                 max_tokens_per_context: int = 400, min_relative_score: float = 0.75,
+                 duplicate_overlap: float = 0.8):
+        """
+        Contexts are taken in rank order while they fit max_tokens; those
+        scoring below min_relative_score x the top score are left out.
+        Sentences sharing duplicate_overlap of their words with one already
+        selected count as duplicates.
+        """
+        self.max_tokens = max_tokens
+        self.max_contexts = max_contexts
+        self.max_tokens_per_context = max_tokens_per_context
+        self.min_relative_score = min_relative_score
+        self.duplicate_overlap = duplicate_overlap
+
+    def _is_duplicate(self, words: Set[str], seen: List[Set[str]]) -> bool:
+        for other in seen:
+            # Very short sentences ("Yes.", "Open daily.") only count when identical
+            if min(len(words), len(other)) < 4:
+                if words == other:
+                    return True
+                continue
+            overlap = len(words & other) / min(len(words), len(other))
+            if overlap >= self.duplicate_overlap:
+                return True
+        return False
+
+    def _select_sentences(self, query_terms: Set[str], sentences: List[str],
+                          budget: int) -> List[str]:
+        """Most query-relevant sentences within budget, in document order"""
+        tokens = [estimate_tokens(sentence) for sentence in sentences]
+        if sum(tokens) <= budget:
+            return sentences
+
+        def relevance(position: int) -> tuple:
+            overlap = len(query_terms & set(tokenize(sentences[position])))
+            # The opening sentence usually states what the passage is about
+            return (overlap + (0.5 if position == 0 else 0.0), -position)
+
+        selected = []
+        used = 0
+        for position in sorted(range(len(sentences)), key=relevance, reverse=True):
+            if used + tokens[position] <= budget:
+                selected.append(position)
+                used += tokens[position]
+        return [sentences[position] for position in sorted(selected)]
+
+    def build(self, query: str, contexts: List[Dict]) -> Dict:
+        """
+        Build the prompt context for query
+
+        Returns {'text', 'contexts' (those included, in rank order), 'tokens',
+        'sentences_dropped'}.
+        """
+        query_terms = set(tokenize(query))
+        min_score = contexts[0]['score'] * self.min_relative_score if contexts else 0.0
+        remaining = self.max_tokens
+        seen_words: List[Set[str]] = []
+        sections, included = [], []
+        dropped = 0
+
+        for ctx in contexts[:self.max_contexts]:
+            if included and ctx['score'] < min_score:
+                break
+            header = f"[{ctx['category']}] {ctx['title']}:\n"
+            budget = min(remaining, self.max_tokens_per_context) - estimate_tokens(header)
+            if budget <= 0:
+                break
+
+            # Chunk overlap and near-identical documents repeat passages; keep the first copy
+            sentences, candidate_words = [], []
+            for sentence in iter_sentences(ctx['content']):
+                if not WORD_PATTERN.search(sentence):
+                    continue
+                words = set(_normalize(sentence).split())
+                if self._is_duplicate(words, seen_words + candidate_words):
+                    dropped += 1
+                    continue
+                sentences.append(sentence)
+                candidate_words.append(words)
+
+            selected = self._select_sentences(query_terms, sentences, budget)
+            dropped += len(sentences) - len(selected)
+            if not selected:
+                continue
+            seen_words.extend(set(_normalize(sentence).split()) for sentence in selected)
+
+            section = header + ' '.join(selected)
+            sections.append(section)
+            included.append(ctx)
+            remaining -= estimate_tokens(section)
+
+        text = "\n\n".join(sections)
+        return {
+            'text': text,
+            'contexts': included,
+            'tokens': estimate_tokens(text),
+            'sentences_dropped': dropped
+        }
@@ -0,0 +1,101 @@
+"""
+Streaming knowledge-base readers for the CMU-Africa Campus Assistant
+Yield documents one at a time from JSON Lines files or large JSON arrays
+without loading the whole file into memory
+"""
+import json
+from typing import Dict, IO, Iterator
+
+READ_SIZE = 1 << 16
+
+# Largest JSON array element read before a decode error is reported rather than read further
+MAX_DOCUMENT_CHARS = 1 << 24
+# A cut inside an escape like "\u00e9" fails up to this many characters before the end
+TRUNCATION_MARGIN = 6
+
+
+def iter_jsonl(f: IO[str]) -> Iterator[Dict]:
+    """Yield one document per non-empty line of a JSON Lines file"""
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e.msg}")
+
+
+def iter_json_array(f: IO[str], read_size: int = READ_SIZE,
+                    max_document_chars: int = MAX_DOCUMENT_CHARS) -> Iterator[Dict]:
+    """
+    Incrementally yield the elements of a top-level JSON array
+
+    An element that fails to decode is read further only while the failure
+    could be the element being cut off by the read, and while it stays
+    within max_document_chars; otherwise the decode error is raised with the
+    element's number and character offset in the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    offset = 0  # characters of the file before buffer
+    index = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, eof
+        data = f.read(read_size)
+        if not data:
+            eof = True
+            return False
+        buffer += data
+        return True
+
+    def skip(chars: int):
+        nonlocal buffer, offset
+        buffer = buffer[chars:]
+        offset += chars
+
+    def invalid(e: json.JSONDecodeError) -> ValueError:
+        return ValueError(f"Invalid JSON in document {index}: {e.msg} (char {offset + e.pos})")
+
+    # Skip to the opening bracket
+    while not buffer.lstrip():
+        if not fill():
+            return
+    skip(len(buffer) - len(buffer.lstrip()))
+    if not buffer.startswith('['):
+        raise ValueError("Knowledge base JSON must be an array of documents")
+    skip(1)
+
+    while True:
+        skip(len(buffer) - len(buffer.lstrip().lstrip(',').lstrip()))
+        if not buffer:
+            if not fill():
+                raise ValueError("Unexpected end of file inside JSON array")
+            continue
+        if buffer.startswith(']'):
+            return
+
+        try:
+            document, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            # An element split across reads fails at the cut (or inside its last string)
+            truncated = (e.pos >= len(buffer) - TRUNCATION_MARGIN
+                         or e.msg.startswith('Unterminated string'))
+            if not truncated or len(buffer) > max_document_chars or eof or not fill():
+                raise invalid(e) from e
+            continue
+
+        skip(end)
+        index += 1
+        yield document
+
+
+def iter_documents(path: str) -> Iterator[Dict]:
+    """Stream documents from a .jsonl/.ndjson file or a JSON array file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            yield from iter_jsonl(f)
+        else:
+            yield from iter_json_array(f)
@@ -0,0 +1,225 @@
+"""
+Query embedding cache for the CMU-Africa Campus Assistant
+Bounded in-memory LRU with TTL, backed by an optional SQLite tier that
+survives restarts and is shared by every worker pointing at the same file.
+The SQLite tier is only read after an in-memory miss and written behind in
+batches, never under the in-memory lock
+"""
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """LRU/TTL cache of embeddings keyed on normalized text + embedding model"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = 86400,
+                 db_path: Optional[str] = None, write_delay: float = 0.5):
+        """
+        Initialize the cache; pass db_path to enable the persistent SQLite tier
+
+        New embeddings reach the SQLite tier from a background thread, which
+        waits write_delay seconds so the embeddings set meanwhile share one
+        commit.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.write_delay = write_delay
+
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # SQLite tier rows not written yet (key -> model, created_at, vector), under _lock
+        self._unwritten: Dict[str, Tuple[str, float, bytes]] = {}
+        self._writing = False
+        self._db_lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._db = None
+        if db_path:
+            self._init_db()
+
+    def _init_db(self):
+        """Open the SQLite tier and drop expired rows"""
+        try:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0)
+            # WAL lets several gunicorn workers read while one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, "
+                "created_at REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            if self.ttl_seconds:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,)
+                )
+            self._db.commit()
+        except Exception as e:
+            raise Exception(f"Failed to initialize embedding cache database: {str(e)}")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query text so trivially different spellings share an entry"""
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    def make_key(self, text: str, model: str) -> str:
+        """Build the cache key for a text/model pair"""
+        payload = f"{model}\x00{self.normalize(text)}".encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for text, or None on a miss"""
+        key = self.make_key(text, model)
+        embedding = self._get_from_memory(key)
+        if embedding is not None:
+            return embedding
+        return self._get_from_disk(key) if self._db is not None else self._miss()
+
+    async def aget(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Async counterpart of get(): the SQLite tier is read in a worker thread"""
+        key = self.make_key(text, model)
+        embedding = self._get_from_memory(key)
+        if embedding is not None:
+            return embedding
+        if self._db is not None:
+            return await asyncio.to_thread(self._get_from_disk, key)
+        return self._miss()
+
+    def _get_from_memory(self, key: str) -> Optional[np.ndarray]:
+        """The fresh in-memory entry for key, counted as a hit, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, embedding = entry
+            if self._is_expired(created_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return embedding
+
+    def _get_from_disk(self, key: str) -> Optional[np.ndarray]:
+        """Look key up in the SQLite tier after an in-memory miss, counting the outcome"""
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT created_at, vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is None or self._is_expired(row[0]):
+            return self._miss()
+        embedding = np.frombuffer(row[1], dtype=np.float32)
+        with self._lock:
+            self._store_in_memory(key, row[0], embedding)
+            self._hits += 1
+            self._disk_hits += 1
+        return embedding
+
+    def _miss(self) -> None:
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, text: str, model: str, embedding: np.ndarray):
+        """Store an embedding in memory and, if enabled, queue it for the SQLite tier"""
+        key = self.make_key(text, model)
+        # A float32 array takes an eighth of the memory of the same list of Python floats
+        embedding = np.asarray(embedding, dtype=np.float32)
+        created_at = time.time()
+
+        with self._lock:
+            self._store_in_memory(key, created_at, embedding)
+            if self._db is None:
+                return
+            self._unwritten[key] = (model, created_at, embedding.tobytes())
+            if self._writing:
+                return
+            self._writing = True
+        threading.Thread(target=self._write_behind, name="embedding-cache-writer",
+                         daemon=True).start()
+
+    def _write_behind(self):
+        """Write queued embeddings to the SQLite tier until the queue stays empty"""
+        while True:
+            time.sleep(self.write_delay)
+            with self._lock:
+                if not self._unwritten:
+                    self._writing = False
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write the embeddings queued for the SQLite tier in one commit"""
+        if self._db is None:
+            return
+        with self._lock:
+            rows, self._unwritten = self._unwritten, {}
+        if not rows:
+            return
+        try:
+            with self._db_lock:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, model, created_at, vector) "
+                        "VALUES (?, ?, ?, ?)",
+                        [(key, *row) for key, row in rows.items()]
+                    )
+        except sqlite3.Error:
+            # The disk tier is best-effort; the in-memory entries are still valid
+            pass
+
+    def _store_in_memory(self, key: str, created_at: float, embedding: np.ndarray):
+        """Insert into the LRU, evicting the least recently used entries (lock held)"""
+        self._entries[key] = (created_at, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def clear(self):
+        """Drop every cached embedding from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            self._unwritten.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and sizes"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
+        if self._db is not None:
+            with self._db_lock:
+                stats['disk_size'] = self._db.execute(
+                    "SELECT COUNT(*) FROM embeddings"
+                ).fetchone()[0]
+        return stats
@@ -0,0 +1,397 @@
+"""
+Background indexing jobs for the CMU-Africa Campus Assistant
+Uploaded documents are indexed by background workers paced to an embedding
+token budget, so ingest never uses up the rate limit chat queries need; job
+progress is kept in SQLite so every API worker can report or cancel any job
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Statuses of jobs that will not change again
+FINISHED_STATUSES = ('succeeded', 'completed_with_errors', 'failed', 'cancelled', 'interrupted')
+
+# Seconds between progress writes and cancellation checks of a worker's jobs;
+# unfinished jobs not updated for STALE_AFTER seconds lost their worker
+HEARTBEAT_INTERVAL = 1.0
+STALE_AFTER = 30.0
+
+
+class IndexQueueFull(Exception):
+    """Too many indexing jobs are already queued in this worker"""
+
+
+class TokenBucket:
+    """Async limiter pacing work to a budget of tokens per minute (one event loop)"""
+
+    def __init__(self, tokens_per_minute: float, burst: Optional[float] = None):
+        """burst is the most spent at once after idling (default: 10 seconds of budget)"""
+        self.rate = tokens_per_minute / 60.0
+        self.capacity = burst if burst is not None else self.rate * 10
+        self.waited_seconds = 0.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float):
+        """Wait until tokens fit the budget, then spend them; callers are served in order"""
+        async with self._lock:
+            self._refill()
+            # More than the burst is let through once the bucket is full and paid
+            # back by later callers, so an oversized batch can't wait forever
+            needed = min(tokens, self.capacity)
+            if self._tokens < needed:
+                delay = (needed - self._tokens) / self.rate
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= tokens
+
+
+class IndexJobStore:
+    """SQLite record of indexing jobs and their progress, shared by API workers"""
+
+    def __init__(self, path: str = ":memory:", max_finished: int = 1000):
+        """Open (or create) the job table; only the newest max_finished finished jobs are kept"""
+        self.path = path
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS index_jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, documents INTEGER NOT NULL, "
+                "options TEXT NOT NULL, progress TEXT NOT NULL, error TEXT, "
+                "cancel_requested INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL, heartbeat_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS index_jobs_by_created ON index_jobs (created_at)"
+            )
+            self._db.commit()
+        except Exception as e:
+            raise Exception(f"Failed to open index job store: {str(e)}")
+
+    @staticmethod
+    def _to_job(row) -> Dict:
+        (job_id, status, documents, options, progress, error, cancel_requested,
+         created_at, started_at, finished_at, heartbeat_at) = row
+        if status not in FINISHED_STATUSES and time.time() - heartbeat_at > STALE_AFTER:
+            status = 'interrupted'
+        return {
+            'job_id': job_id,
+            'status': status,
+            'documents': documents,
+            'options': json.loads(options),
+            'progress': json.loads(progress),
+            'error': error,
+            'cancel_requested': bool(cancel_requested),
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at
+        }
+
+    def create(self, documents: int, options: Dict) -> Dict:
+        """Record a new queued job for a number of documents"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO index_jobs (job_id, status, documents, options, progress, "
+                    "created_at, heartbeat_at) VALUES (?, 'queued', ?, ?, '{}', ?, ?)",
+                    (job_id, documents, json.dumps(options), now, now)
+                )
+                placeholders = ', '.join('?' * len(FINISHED_STATUSES))
+                self._db.execute(
+                    f"DELETE FROM index_jobs WHERE job_id IN (SELECT job_id FROM index_jobs "
+                    f"WHERE status IN ({placeholders}) ORDER BY created_at DESC "
+                    f"LIMIT -1 OFFSET ?)",
+                    (*FINISHED_STATUSES, self.max_finished)
+                )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM index_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """Most recently created jobs first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM index_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def update(self, job_id: str, status: Optional[str] = None,
+               progress: Optional[Dict] = None, error: Optional[str] = None,
+               started_at: Optional[float] = None, finished_at: Optional[float] = None):
+        """Set the given fields of a job and refresh its heartbeat"""
+        fields = {'status': status, 'error': error, 'started_at': started_at,
+                  'finished_at': finished_at,
+                  'progress': json.dumps(progress) if progress is not None else None}
+        fields = {name: value for name, value in fields.items() if value is not None}
+        fields['heartbeat_at'] = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    f"UPDATE index_jobs SET {', '.join(f'{name} = ?' for name in fields)} "
+                    f"WHERE job_id = ?",
+                    (*fields.values(), job_id)
+                )
+
+    def heartbeat(self, progress: Dict[str, Optional[Dict]]) -> Set[str]:
+        """
+        Refresh unfinished jobs, saving progress where given; returns those asked to cancel
+        """
+        now = time.time()
+        # A heartbeat racing the job's final update must not overwrite its report
+        placeholders = ', '.join('?' * len(FINISHED_STATUSES))
+        with self._lock:
+            with self._db:
+                for job_id, job_progress in progress.items():
+                    if job_progress is None:
+                        self._db.execute(
+                            f"UPDATE index_jobs SET heartbeat_at = ? "
+                            f"WHERE job_id = ? AND status NOT IN ({placeholders})",
+                            (now, job_id, *FINISHED_STATUSES)
+                        )
+                    else:
+                        self._db.execute(
+                            f"UPDATE index_jobs SET heartbeat_at = ?, progress = ? "
+                            f"WHERE job_id = ? AND status NOT IN ({placeholders})",
+                            (now, json.dumps(job_progress), job_id, *FINISHED_STATUSES)
+                        )
+            return self._cancel_requested(progress)
+
+    def _cancel_requested(self, job_ids: Iterable[str]) -> Set[str]:
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        rows = self._db.execute(
+            f"SELECT job_id FROM index_jobs WHERE cancel_requested = 1 AND job_id IN "
+            f"({', '.join('?' * len(job_ids))})", job_ids
+        )
+        return {row[0] for row in rows}
+
+    def request_cancel(self, job_id: str) -> Optional[Dict]:
+        """Flag an unfinished job for cancellation by whichever worker holds it"""
+        placeholders = ', '.join('?' * len(FINISHED_STATUSES))
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    f"UPDATE index_jobs SET cancel_requested = 1 "
+                    f"WHERE job_id = ? AND status NOT IN ({placeholders})",
+                    (job_id, *FINISHED_STATUSES)
+                )
+        return self.get(job_id)
+
+
+class IndexJobQueue:
+    """
+    Queue of indexing jobs run by background tasks of this process (one event loop)
+
+    Each job runs the pipeline's aupdate_index with at most `concurrency`
+    embedding batches in flight and every batch paced by a TokenBucket of
+    tokens_per_minute (0 disables the throttle). `workers` jobs run at once;
+    at most max_queued wait behind them, after which submit raises
+    IndexQueueFull. on_finished(report) is called after every job that
+    changed the index, including jobs that failed or were cancelled partway.
+    """
+
+    def __init__(self, store: Optional[IndexJobStore] = None, workers: int = 1,
+                 concurrency: Optional[int] = None, tokens_per_minute: float = 0,
+                 max_queued: int = 100, metrics: Optional[Metrics] = None,
+                 on_finished: Optional[Callable[[Dict], None]] = None):
+        self.store = store if store is not None else IndexJobStore()
+        self.workers = workers
+        self.concurrency = concurrency
+        self.throttle = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_queued = max_queued
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.on_finished = on_finished
+
+        # Unfinished jobs of this process: pipeline, documents, live report, events
+        self._jobs: Dict[str, Dict] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.metrics.register_collector(self._collect_metrics)
+
+    def _start(self):
+        """Start the workers and heartbeat on first use, inside the running event loop"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._heartbeat()))
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running are left 'interrupted'"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._queue = [], None
+
+    async def submit(self, pipeline, documents: List[Dict], delete_missing: bool = False,
+                     force: bool = False) -> Dict:
+        """Queue documents for indexing by pipeline; returns the new job"""
+        self._start()
+        if self._queue.qsize() >= self.max_queued:
+            raise IndexQueueFull(f"{self._queue.qsize()} indexing jobs are already queued")
+
+        options = {'delete_missing': delete_missing, 'force': force}
+        job = await asyncio.to_thread(self.store.create, len(documents), options)
+        self._jobs[job['job_id']] = {
+            'pipeline': pipeline,
+            'documents': documents,
+            'options': options,
+            'report': {},
+            'running': False,
+            'cancelled': asyncio.Event(),
+            'finished': asyncio.Event()
+        }
+        self._queue.put_nowait(job['job_id'])
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def recent(self, limit: int = 20) -> List[Dict]:
+        return await asyncio.to_thread(self.store.recent, limit)
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Cancel a job, queued or running, in any worker; returns the job or None
+
+        A running job stops after its batches in flight; documents it
+        finished stay indexed.
+        """
+        job = await asyncio.to_thread(self.store.request_cancel, job_id)
+        if job_id in self._jobs:
+            await self._cancel_local(job_id)
+            job = await self.get(job_id)
+        return job
+
+    async def _cancel_local(self, job_id: str):
+        job = self._jobs[job_id]
+        job['cancelled'].set()
+        if not job['running']:
+            # Drop a queued job now rather than when a worker reaches it
+            del self._jobs[job_id]
+            job['finished'].set()
+            await self._finish(job_id, 'cancelled', job['report'])
+
+    async def wait(self, job_id: str) -> Optional[Dict]:
+        """Wait for a job of this process to finish; returns it"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            await job['finished'].wait()
+        return await self.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            try:
+                await self._run(job_id, job)
+            except Exception:
+                logger.exception("Indexing job %s could not be recorded", job_id)
+            finally:
+                self._jobs.pop(job_id, None)
+                job['finished'].set()
+
+    async def _run(self, job_id: str, job: Dict):
+        """Index a job's documents, recording its outcome"""
+        job['running'] = True
+        await asyncio.to_thread(self.store.update, job_id, status='running',
+                                started_at=time.time())
+        documents = job.pop('documents')
+        report = job['report']
+        try:
+            try:
+                await job['pipeline'].aupdate_index(
+                    documents, report=report, cancelled=job['cancelled'],
+                    throttle=self.throttle, concurrency=self.concurrency, **job['options']
+                )
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self.store.update, job_id, status='interrupted',
+                                        progress=self._snapshot(report),
+                                        finished_at=time.time())
+                raise
+            except Exception as e:
+                await self._finish(job_id, 'failed', report, error=str(e))
+                return
+
+            if report['cancelled']:
+                status = 'cancelled'
+            else:
+                status = 'completed_with_errors' if report['failed'] else 'succeeded'
+            await self._finish(job_id, status, report)
+        finally:
+            # Documents committed before a failure or cancellation change answers too
+            if self.on_finished is not None and any(
+                report.get(change) for change in ('added', 'updated', 'deleted')
+            ):
+                self.on_finished(report)
+
+    async def _finish(self, job_id: str, status: str, report: Dict, error: Optional[str] = None):
+        await asyncio.to_thread(self.store.update, job_id, status=status,
+                                progress=self._snapshot(report), error=error,
+                                finished_at=time.time())
+        self.metrics.inc('rag_index_jobs_total', "Indexing jobs by outcome", status=status)
+
+    @staticmethod
+    def _snapshot(report: Dict) -> Dict:
+        """Copy of a report being filled in, safe to serialize in another thread"""
+        return {key: list(value) if isinstance(value, list) else value
+                for key, value in report.items()}
+
+    async def _heartbeat(self):
+        """Save running jobs' progress, keep queued jobs alive and pick up cancellations"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            progress = {
+                job_id: self._snapshot(job['report']) if job['running'] else None
+                for job_id, job in self._jobs.items()
+            }
+            if not progress:
+                continue
+            try:
+                requested = await asyncio.to_thread(self.store.heartbeat, progress)
+            except Exception:
+                # The store may be briefly locked by another worker; try again next beat
+                continue
+            for job_id in requested:
+                if job_id in self._jobs:
+                    await self._cancel_local(job_id)
+
+    def _collect_metrics(self):
+        running = sum(1 for job in self._jobs.values() if job['running'])
+        yield ('rag_index_jobs_running', 'gauge', "Indexing jobs running in this worker", (),
+               running)
+        yield ('rag_index_jobs_queued', 'gauge', "Indexing jobs waiting in this worker", (),
+               len(self._jobs) - running)
+        if self.throttle is not None:
+            yield ('rag_index_throttle_wait_seconds_total', 'counter',
+                   "Time indexing batches waited for the embedding token budget", (),
+                   self.throttle.waited_seconds)
@@ -0,0 +1,230 @@
+"""
+Index manifest for the CMU-Africa Campus Assistant
+Records the content hash of every indexed document and chunk so re-indexing
+only embeds what changed and can delete vectors for removed documents
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chunking import AUDIENCE_FIELDS
+
+
+def document_hash(doc: Dict) -> str:
+    """Hash of the document fields that end up in the index"""
+    payload = json.dumps({
+        'title': doc.get('title', ''),
+        'category': doc.get('category', ''),
+        'content': doc['content'],
+        'keywords': doc.get('keywords', []),
+        # Only when set, so documents without an audience keep their existing hashes
+        **{field: doc[field] for field in AUDIENCE_FIELDS if doc.get(field)}
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def chunk_hash(chunk: Dict) -> str:
+    """Hash of a chunk's embedded text and metadata"""
+    payload = json.dumps({
+        'title': chunk.get('title', ''),
+        'category': chunk.get('category', ''),
+        'content': chunk['content'],
+        'keywords': chunk.get('keywords', []),
+        'chunk_index': chunk['chunk_index'],
+        **{field: chunk[field] for field in AUDIENCE_FIELDS if chunk.get(field)}
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class IndexManifest:
+    """SQLite record of document and chunk hashes for one vector index"""
+
+    def __init__(self, path: str = ":memory:", index_name: str = "default"):
+        """Open (or create) the manifest; index_name keeps several indexes apart"""
+        self.path = path
+        self.index_name = index_name
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "index_name TEXT NOT NULL, doc_id TEXT NOT NULL, doc_hash TEXT NOT NULL, "
+                "PRIMARY KEY (index_name, doc_id))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "index_name TEXT NOT NULL, doc_id TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+                "chunk_hash TEXT NOT NULL, PRIMARY KEY (index_name, chunk_id))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_by_doc ON chunks (index_name, doc_id)"
+            )
+            # Manifests written before categories were recorded lack the column
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(documents)")]
+            if 'category' not in columns:
+                self._db.execute(
+                    "ALTER TABLE documents ADD COLUMN category TEXT NOT NULL DEFAULT ''"
+                )
+            self._db.commit()
+        except Exception as e:
+            raise Exception(f"Failed to open index manifest: {str(e)}")
+
+    def get(self, doc_id: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """Return (doc_hash, {chunk_id: chunk_hash}) for an indexed document, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT doc_hash FROM documents WHERE index_name = ? AND doc_id = ?",
+                (self.index_name, doc_id)
+            ).fetchone()
+            if row is None:
+                return None
+            chunks = self._db.execute(
+                "SELECT chunk_id, chunk_hash FROM chunks WHERE index_name = ? AND doc_id = ?",
+                (self.index_name, doc_id)
+            ).fetchall()
+            return row[0], dict(chunks)
+
+    def doc_hashes(self, doc_ids: Iterable[str]) -> Dict[str, str]:
+        """Content hash of each of doc_ids that is recorded (absent ones are left out)"""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        with self._lock:
+            return dict(self._db.execute(
+                f"SELECT doc_id, doc_hash FROM documents WHERE index_name = ? AND doc_id IN "
+                f"({', '.join('?' * len(doc_ids))})", (self.index_name, *doc_ids)
+            ))
+
+    def put(self, doc_id: str, doc_hash: str, chunk_hashes: Dict[str, str],
+            category: str = ''):
+        """Record the indexed state of a document, replacing any previous chunks"""
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "DELETE FROM chunks WHERE index_name = ? AND doc_id = ?",
+                    (self.index_name, doc_id)
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO documents (index_name, doc_id, doc_hash, category) "
+                    "VALUES (?, ?, ?, ?)",
+                    (self.index_name, doc_id, doc_hash, category)
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO chunks (index_name, doc_id, chunk_id, chunk_hash) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(self.index_name, doc_id, cid, h) for cid, h in chunk_hashes.items()]
+                )
+
+    def remove(self, doc_ids: Iterable[str]):
+        """Forget documents and their chunks"""
+        rows = [(self.index_name, doc_id) for doc_id in doc_ids]
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "DELETE FROM chunks WHERE index_name = ? AND doc_id = ?", rows
+                )
+                self._db.executemany(
+                    "DELETE FROM documents WHERE index_name = ? AND doc_id = ?", rows
+                )
+
+    def doc_ids(self) -> List[str]:
+        """IDs of every document recorded for this index"""
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT doc_id FROM documents WHERE index_name = ?", (self.index_name,)
+            )]
+
+    def category_versions(self) -> Dict[str, str]:
+        """
+        Content version of each category: a hash of its documents' IDs and hashes
+
+        A category's version changes whenever one of its documents is added,
+        modified or removed, by any process sharing the manifest.
+        """
+        versions = {}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT category, doc_id, doc_hash FROM documents WHERE index_name = ? "
+                "ORDER BY category, doc_id", (self.index_name,)
+            )
+            for category, doc_id, doc_hash in rows:
+                digest = versions.get(category)
+                if digest is None:
+                    digest = versions[category] = hashlib.sha256()
+                digest.update(f"{doc_id}\0{doc_hash}\n".encode('utf-8'))
+        return {category: digest.hexdigest()[:16] for category, digest in versions.items()}
+
+    def stats(self) -> Dict:
+        """Document and chunk counts"""
+        with self._lock:
+            documents = self._db.execute(
+                "SELECT COUNT(*) FROM documents WHERE index_name = ?", (self.index_name,)
+            ).fetchone()[0]
+            chunks = self._db.execute(
+                "SELECT COUNT(*) FROM chunks WHERE index_name = ?", (self.index_name,)
+            ).fetchone()[0]
+            return {'documents': documents, 'chunks': chunks}
+
+
+class PendingDocuments:
+    """
+    Tracks documents whose changed chunks are still being embedded/upserted
+
+    A document is only complete, and safe to record in the manifest, once
+    every one of its pending chunks has been upserted.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Dict] = {}
+        self._completed: List[Dict] = []
+
+    def stage(self, doc_id: str, doc_hash: str, chunk_hashes: Dict[str, str],
+              pending_chunk_ids: List[str], stale_chunk_ids: List[str], category: str = '',
+              change: str = 'added'):
+        """Register a new or changed ('added'/'updated') document and the chunks it is waiting on"""
+        entry = {
+            'doc_id': doc_id,
+            'doc_hash': doc_hash,
+            'category': category,
+            'change': change,
+            'chunk_hashes': chunk_hashes,
+            'stale_chunk_ids': stale_chunk_ids,
+            'waiting': set(pending_chunk_ids)
+        }
+        if entry['waiting']:
+            self._pending[doc_id] = entry
+        else:
+            self._completed.append(entry)
+
+    def mark_indexed(self, chunks: Iterable[Dict]):
+        """Record that chunks were upserted"""
+        for chunk in chunks:
+            entry = self._pending.get(chunk['parent_id'])
+            if entry is None:
+                continue
+            entry['waiting'].discard(chunk['id'])
+            if not entry['waiting']:
+                self._completed.append(self._pending.pop(chunk['parent_id']))
+
+    def pop_completed(self) -> List[Dict]:
+        """Return and clear documents whose chunks are all upserted"""
+        completed, self._completed = self._completed, []
+        return completed
+
+    def mark_failed(self, chunks: Iterable[Dict]) -> List[Dict]:
+        """Give up on the documents of chunks that could not be upserted; returns them"""
+        failed = []
+        for chunk in chunks:
+            entry = self._pending.pop(chunk['parent_id'], None)
+            if entry is not None:
+                failed.append(entry)
+        return failed
+
+    def pop_pending(self) -> List[Dict]:
+        """Return and clear documents still waiting on chunks"""
+        pending, self._pending = list(self._pending.values()), {}
+        return pending
+
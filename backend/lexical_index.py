@@ -0,0 +1,355 @@
+"""
+Lexical (BM25) index for the CMU-Africa Campus Assistant
+An in-process inverted index over chunk titles, keywords and text, so exact
+terms like course codes, building names and shuttle stops are retrievable.
+Only postings and term statistics are kept, not chunk text; processes
+sharing its SQLite file pick up each other's changes in the background
+"""
+import json
+import logging
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from heapq import nlargest
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chunking import AUDIENCE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Words joined by - . / stay one term ("18-785", "n1.2"); their parts are indexed too
+TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+TERM_PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about an and are as at be but by can could do does for from how i if in is it
+its me my of on or our should so that the their there this to was we what when
+where which who why will with would you your
+""".split())
+
+# Term frequency multipliers per field (a simplified BM25F)
+FIELD_WEIGHTS = {'title': 2.0, 'keywords': 3.0, 'content': 1.0}
+
+# Rank constant of reciprocal-rank fusion; 60 is the value from the original RRF paper
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase index terms of text, without stopwords"""
+    terms = []
+    for term in TERM_PATTERN.findall(text.lower()):
+        if term in STOPWORDS:
+            continue
+        terms.append(term)
+        parts = TERM_PART_PATTERN.findall(term)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(*rankings: List[Dict], k: int = RRF_K) -> List[Dict]:
+    """
+    Merge ranked chunk lists by summed 1 / (k + rank)
+
+    A chunk found by several rankings keeps the record from the first one
+    that returned it, with the highest 'score' any ranking gave it.
+    """
+    fused: Dict[str, float] = {}
+    records: Dict[str, Dict] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            fused[chunk['id']] = fused.get(chunk['id'], 0.0) + 1.0 / (k + rank)
+            record = records.get(chunk['id'])
+            if record is None:
+                records[chunk['id']] = dict(chunk)
+            elif chunk['score'] > record['score']:
+                record['score'] = chunk['score']
+    return [records[chunk_id] for chunk_id in sorted(fused, key=fused.get, reverse=True)]
+
+
+# Rows of other processes' changes applied per lock acquisition, so searches interleave
+REFRESH_BATCH_ROWS = 500
+
+
+class BM25Index:
+    """
+    Thread-safe BM25 inverted index of chunks, optionally persisted to SQLite
+
+    Chunk text is not kept: results carry a chunk's ID, title, category and
+    audience, and callers fetch its text from the vector store. A flush
+    writes only the chunks changed since the last one, stamped with a new
+    version. Searches start a background refresh, at most every
+    refresh_interval seconds, that applies versions other processes (API
+    workers, the loader) wrote, so no search waits on the file.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75,
+                 refresh_interval: float = 2.0):
+        """Initialize the index, loading it from the SQLite file at path when given"""
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+
+        # Per chunk: parent_id, chunk_index, title, category and audience fields
+        self._records: Dict[str, Dict] = {}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._terms: Dict[str, Tuple[str, ...]] = {}
+        self._lengths: Dict[str, float] = {}
+        self._field_terms: Dict[str, frozenset] = {}
+        self._total_length = 0.0
+        self._lock = threading.RLock()
+        # Changes not flushed yet, by chunk ID: (record, term frequencies, title/keyword
+        # terms), or None when removed; and the newest version read from the file
+        self._pending: Dict[str, Optional[Tuple]] = {}
+        self._version = 0
+        self._refreshing = False
+        self._refreshed_at = 0.0
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                # record is NULL for removed chunks, so other processes drop them too
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS chunks ("
+                    "chunk_id TEXT PRIMARY KEY, version INTEGER NOT NULL, record TEXT)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS chunks_by_version ON chunks (version)")
+                self._db.commit()
+                self.refresh()
+            except Exception as e:
+                raise Exception(f"Failed to open lexical index: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._records
+
+    @staticmethod
+    def _entry(chunk: Dict) -> Tuple[Dict, Dict[str, float], List[str]]:
+        """(record, term frequencies, title/keyword terms) indexed for a chunk"""
+        record = {
+            'parent_id': chunk.get('parent_id', chunk['id']),
+            'chunk_index': chunk.get('chunk_index', 0),
+            'title': chunk.get('title', ''),
+            'category': chunk.get('category', '')
+        }
+        for field in AUDIENCE_FIELDS:
+            if chunk.get(field):
+                record[field] = [str(value) for value in chunk[field]]
+
+        keywords = chunk.get('keywords', '')
+        fields = {
+            'title': record['title'],
+            'keywords': keywords if isinstance(keywords, str) else ','.join(keywords),
+            'content': chunk['content']
+        }
+        frequencies = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(fields[field]):
+                frequencies[term] += weight
+        # Terms of the short, curated fields decide whether a query is a keyword hit
+        field_terms = sorted(set(tokenize(fields['title']) + tokenize(fields['keywords'])))
+        return record, dict(frequencies), field_terms
+
+    def _index(self, chunk_id: str, entry: Tuple):
+        """Add (or replace) a chunk's entry in the postings (lock held)"""
+        record, frequencies, field_terms = entry
+        self._unindex(chunk_id)
+        # Interned, so each chunk's term list shares the strings keying the postings
+        terms = tuple(sys.intern(term) for term in frequencies)
+        for term in terms:
+            self._postings.setdefault(term, {})[chunk_id] = frequencies[term]
+        length = sum(frequencies.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+        self._terms[chunk_id] = terms
+        self._field_terms[chunk_id] = frozenset(field_terms)
+        self._records[chunk_id] = record
+
+    def _unindex(self, chunk_id: str):
+        """Remove a chunk's terms from the postings (lock held)"""
+        if self._records.pop(chunk_id, None) is None:
+            return
+        for term in self._terms.pop(chunk_id):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id)
+        del self._field_terms[chunk_id]
+
+    def add(self, chunks: Iterable[Dict]):
+        """Index (or re-index) chunk records with id, title, keywords, content and metadata"""
+        with self._lock:
+            for chunk in chunks:
+                entry = self._entry(chunk)
+                self._index(chunk['id'], entry)
+                if self._db is not None:
+                    self._pending[chunk['id']] = entry
+
+    def remove(self, chunk_ids: Iterable[str]):
+        """Remove chunks by ID; unknown IDs are ignored"""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._unindex(chunk_id)
+                # Another process may have flushed the chunk since this one last refreshed
+                if self._db is not None:
+                    self._pending[chunk_id] = None
+
+    def _idf(self, term: str) -> float:
+        count = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self._records) - count + 0.5) / (count + 0.5))
+
+    def idf(self, terms: Iterable[str]) -> Dict[str, float]:
+        """BM25 inverse document frequency of each term"""
+        with self._lock:
+            self._schedule_refresh()
+            return {term: self._idf(term) for term in terms}
+
+    def search(self, query: str, top_k: int,
+               categories: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Return up to top_k chunk matches by descending BM25 score
+
+        Matches have each chunk's metadata but no 'content'. Each 'score' is
+        the IDF-weighted share of query terms the chunk contains (0-1),
+        comparable across queries unlike raw BM25, and 'keyword_hit' is True
+        when every query term appears in its title or keywords. With
+        categories, only chunks in those categories match.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        allowed = set(categories) if categories else None
+        with self._lock:
+            self._schedule_refresh()
+            if not terms or not self._records or top_k <= 0:
+                return []
+
+            idfs = {term: self._idf(term) for term in terms}
+            total_idf = sum(idfs.values())
+            average_length = self._total_length / len(self._records)
+            scores: Dict[str, float] = {}
+            matched_idf: Dict[str, float] = {}
+            for term in terms:
+                idf = idfs[term]
+                for chunk_id, frequency in self._postings.get(term, {}).items():
+                    if allowed is not None and self._records[chunk_id]['category'] not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + (
+                        idf * frequency * (self.k1 + 1) / (frequency + norm)
+                    )
+                    matched_idf[chunk_id] = matched_idf.get(chunk_id, 0.0) + idf
+
+            ranked = nlargest(top_k, scores, key=scores.get)
+            results = []
+            for chunk_id in ranked:
+                record = self._records[chunk_id]
+                results.append({
+                    'id': chunk_id,
+                    'parent_id': record['parent_id'],
+                    'chunk_index': int(record['chunk_index']),
+                    'title': record['title'],
+                    'category': record['category'],
+                    'score': matched_idf[chunk_id] / total_idf if total_idf else 0.0,
+                    'keyword_hit': all(term in self._field_terms[chunk_id] for term in terms),
+                    **{field: record[field] for field in AUDIENCE_FIELDS if field in record}
+                })
+            return results
+
+    def stats(self) -> Dict:
+        return {
+            'chunks': len(self._records),
+            'terms': len(self._postings)
+        }
+
+    def flush(self):
+        """Write the chunks added or removed since the last flush to the index file"""
+        if self._db is None:
+            return
+        with self._lock:
+            pending = dict(self._pending)
+        if not pending:
+            return
+
+        rows = [(chunk_id, json.dumps(entry) if entry is not None else None)
+                for chunk_id, entry in pending.items()]
+        with self._db_lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    latest = self._db.execute(
+                        "SELECT COALESCE(MAX(version), 0) FROM chunks"
+                    ).fetchone()[0]
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO chunks (chunk_id, version, record) VALUES (?, ?, ?)",
+                        [(chunk_id, latest + 1, record) for chunk_id, record in rows]
+                    )
+                    self._db.commit()
+                except Exception:
+                    self._db.rollback()
+                    raise
+            except Exception as e:
+                raise Exception(f"Failed to save lexical index: {str(e)}")
+
+            with self._lock:
+                # Changes made while writing stay pending for the next flush
+                for chunk_id, entry in pending.items():
+                    if self._pending.get(chunk_id, False) is entry:
+                        del self._pending[chunk_id]
+                # Nobody else wrote since the last refresh: no need to read this version back
+                if latest == self._version:
+                    self._version = latest + 1
+
+    def refresh(self):
+        """Apply the changes other processes flushed to the index file since the last refresh"""
+        if self._db is None:
+            return
+        with self._db_lock:
+            cursor = self._db.execute(
+                "SELECT chunk_id, version, record FROM chunks WHERE version > ? ORDER BY version",
+                (self._version,)
+            )
+            while True:
+                rows = cursor.fetchmany(REFRESH_BATCH_ROWS)
+                if not rows:
+                    return
+                with self._lock:
+                    for chunk_id, version, record in rows:
+                        # This process's unsaved change to the chunk is newer
+                        if chunk_id in self._pending:
+                            continue
+                        if record is None:
+                            self._unindex(chunk_id)
+                        else:
+                            self._index(chunk_id, json.loads(record))
+                    self._version = rows[-1][1]
+
+    def _schedule_refresh(self):
+        """Start a background refresh unless one ran within refresh_interval (lock held)"""
+        if self._db is None or self._refreshing:
+            return
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_interval:
+            return
+        self._refreshing = True
+        self._refreshed_at = now
+        threading.Thread(target=self._background_refresh, name="lexical-index-refresh",
+                         daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("Refreshing the lexical index failed: %s", e)
+        finally:
+            self._refreshing = False
@@ -1,76 +1,255 @@
-
 """
 Script to load sample CMU-Africa knowledge base into Pinecone
+
+Documents are streamed from a JSON array or JSON Lines file and indexed in
+bounded segments, so memory stays flat regardless of corpus size. Progress is
+checkpointed after every segment and an interrupted run can be resumed.
 """
+import argparse
+import asyncio
 import json
 import os
+from itertools import islice
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from rag_pipeline import EnhancedRAGPipeline
+from index_manifest import IndexManifest
+from vector_store import LocalVectorStore
+from lexical_index import BM25Index
+from context_builder import ContextBuilder
+from precomputed_answers import PrecomputedAnswers
+from reranker import Reranker
+from document_stream import iter_documents
 
 # Load environment variables
 load_dotenv()
 
-def load_knowledge_base():
-    """Load sample knowledge base into vector store"""
+REPORT_KEYS = ('added', 'updated', 'skipped', 'failed', 'deleted', 'chunks_embedded',
+               'chunks_deleted')
+
+def _file_signature(path: str) -> Dict:
+    """Size and mtime of the knowledge base, to detect a changed file on resume"""
+    stat = os.stat(path)
+    return {'kb_path': os.path.abspath(path), 'kb_size': stat.st_size, 'kb_mtime': stat.st_mtime}
+
+def _read_checkpoint(checkpoint_path: str, kb_path: str) -> Optional[Dict]:
+    """Return the saved checkpoint if it belongs to this (unchanged) knowledge base"""
+    try:
+        with open(checkpoint_path, 'r') as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
     
-    # Path to existing knowledge base
-    kb_path = "../data/sample_knowledge_base.json"
+    signature = _file_signature(kb_path)
+    if any(checkpoint.get(key) != value for key, value in signature.items()):
+        print("Checkpoint is for a different or modified knowledge base file; starting over")
+        return None
+    return checkpoint
+
+def _write_checkpoint(checkpoint_path: str, kb_path: str, documents_done: int, report: Dict):
+    """Atomically record how many documents have been fully indexed"""
+    checkpoint = {**_file_signature(kb_path), 'documents_done': documents_done, 'report': report}
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def load_knowledge_base(kb_path: Optional[str] = None, force: bool = False,
+                        delete_missing: bool = True, segment_size: int = 1000,
+                        checkpoint_path: Optional[str] = None, resume: bool = False,
+                        precompute: bool = True):
+    """
+    Load knowledge base into vector store
     
-    # Check if file exists, if not, use the original one
-    if not os.path.exists(kb_path):
-        kb_path = "/home/ubuntu/code_artifacts/cmu-africa-assistant/data/cmu_africa_knowledge_base.json"
+    Only new or modified documents are embedded; with delete_missing, vectors
+    of documents no longer in the knowledge base file are removed. With
+    precompute, answers to the canned prompts are then rebuilt for the
+    categories that changed, for the API to serve.
+    """
     
-    print(f"Loading knowledge base from: {kb_path}")
+    if kb_path is None:
+        # Path to existing knowledge base
+        kb_path = "../data/sample_knowledge_base.json"
+        
+        # Check if file exists, if not, use the original one
+        if not os.path.exists(kb_path):
+            kb_path = "/home/ubuntu/code_artifacts/cmu-africa-assistant/data/cmu_africa_knowledge_base.json"
     
-    # Load documents
-    try:
-        with open(kb_path, 'r') as f:
-            documents = json.load(f)
-        print(f"Loaded {len(documents)} documents")
-    except FileNotFoundError:
+    if not os.path.exists(kb_path):
         print(f"Error: Knowledge base file not found at {kb_path}")
         return
     
+    print(f"Streaming knowledge base from: {kb_path}")
+    checkpoint_path = checkpoint_path or f"{kb_path}.checkpoint"
+    
     # Initialize RAG pipeline
     print("Initializing RAG pipeline...")
     openai_api_key = os.getenv("OPENAI_API_KEY")
     pinecone_api_key = os.getenv("PINECONE_API_KEY")
+    use_local_store = os.getenv("VECTOR_STORE", "pinecone") == "local"
     
-    if not openai_api_key or not pinecone_api_key:
+    if not openai_api_key or not (pinecone_api_key or use_local_store):
         print("Error: Please set OPENAI_API_KEY and PINECONE_API_KEY in .env file")
         return
     
     try:
+        # Shortened text-embedding-3 embeddings; changing the size requires a full re-index
+        embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+        index_name = os.getenv("PINECONE_INDEX_NAME", "cmu-africa-kb")
+        vector_store = None
+        if use_local_store:
+            vector_store = LocalVectorStore(
+                dimension=embedding_dimensions or 1536,
+                path=os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_store"),
+                dtype=os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32"),
+                index_type=os.getenv("LOCAL_VECTOR_INDEX", "flat"),
+                nprobe=int(os.getenv("LOCAL_VECTOR_NPROBE", "16")),
+                n_lists=int(os.getenv("LOCAL_VECTOR_NLISTS", "0")) or None,
+                ann_min_rows=int(os.getenv("LOCAL_VECTOR_ANN_MIN_ROWS", "10000")),
+                rescore_factor=int(os.getenv("LOCAL_VECTOR_RESCORE_FACTOR", "4"))
+            )
         pipeline = EnhancedRAGPipeline(
             openai_api_key=openai_api_key,
             pinecone_api_key=pinecone_api_key,
             pinecone_environment=os.getenv("PINECONE_ENVIRONMENT", "us-east-1"),
-            index_name=os.getenv("PINECONE_INDEX_NAME", "cmu-africa-kb")
+            index_name=index_name,
+            embedding_dimensions=embedding_dimensions,
+            embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "100")),
+            embed_concurrency=int(os.getenv("EMBED_CONCURRENCY", "4")),
+            chunk_max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "200")),
+            chunk_overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "40")),
+            manifest=IndexManifest(
+                path=os.getenv("INDEX_MANIFEST_PATH", "index_manifest.db"),
+                index_name=index_name
+            ),
+            vector_store=vector_store,
+            lexical_index=BM25Index(path=os.getenv("LEXICAL_INDEX_PATH", "lexical_index.db")),
+            http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            http_timeout=float(os.getenv("HTTP_TIMEOUT", "30")),
+            # Precomputed answers are served by the API, so build them the same way it would
+            keyword_fast_path_max_terms=int(os.getenv("KEYWORD_FAST_PATH_MAX_TERMS", "4")),
+            context_builder=ContextBuilder(
+                max_tokens=int(os.getenv("PROMPT_CONTEXT_TOKENS", "1200")),
+                max_contexts=int(os.getenv("PROMPT_MAX_CONTEXTS", "5"))
+            ),
+            max_answer_tokens=int(os.getenv("MAX_ANSWER_TOKENS", "500")),
+            reranker=Reranker(
+                min_relevance=float(os.getenv("RERANK_MIN_RELEVANCE", "0.5")),
+                path=os.getenv("RERANK_WEIGHTS_PATH") or None
+            ),
+            rerank=os.getenv("RERANK", "true").lower() == "true",
+            rerank_candidates=int(os.getenv("RERANK_CANDIDATES", "30")),
+            precomputed_answers=PrecomputedAnswers(
+                path=os.getenv("PRECOMPUTED_ANSWERS_PATH", "precomputed_answers.json")
+            )
         )
         print("RAG pipeline initialized successfully!")
     except Exception as e:
         print(f"Error initializing RAG pipeline: {e}")
         return
     
-    # Index documents
-    print("Indexing documents into Pinecone...")
-    try:
-        pipeline.index_documents(documents)
-        print(f"✅ Successfully indexed {len(documents)} documents!")
-        
-        # Get stats
-        stats = pipeline.get_index_stats()
-        print(f"\nIndex Statistics:")
-        print(f"  Total vectors: {stats.get('total_vectors', 0)}")
-        print(f"  Dimension: {stats.get('dimension', 0)}")
+    # Resume after the last fully indexed segment
+    checkpoint = _read_checkpoint(checkpoint_path, kb_path) if resume else None
+    start = checkpoint['documents_done'] if checkpoint else 0
+    report = dict(checkpoint['report']) if checkpoint else dict.fromkeys(REPORT_KEYS, 0)
+    if start:
+        print(f"Resuming after {start} already indexed documents")
+    
+    # One event loop for the whole run: embedding requests go through the pipeline's
+    # rate-limit scheduler (in its background lane), which is bound to that loop
+    with asyncio.Runner() as runner:
+        # Index documents segment by segment
+        print("Indexing documents into Pinecone...")
+        seen_ids = set()
+        position = 0
+        try:
+            documents = iter_documents(kb_path)
+            while True:
+                segment = list(islice(documents, segment_size))
+                if not segment:
+                    break
+                seen_ids.update(doc.get('id') for doc in segment)
+                
+                todo = segment[max(0, start - position):]
+                position += len(segment)
+                if not todo:
+                    continue
+                
+                segment_report = runner.run(pipeline.aupdate_index(todo, force=force))
+                for key in REPORT_KEYS:
+                    # Checkpoints written before failures were counted lack 'failed'
+                    report[key] = report.get(key, 0) + segment_report[key]
+                for failure in segment_report['errors']:
+                    print(f"  Failed to index {failure['id']}: {failure['error']}")
+                _write_checkpoint(checkpoint_path, kb_path, position, report)
+                print(f"  {position} documents processed "
+                      f"({report['chunks_embedded']} chunks embedded so far)")
+            
+            if delete_missing:
+                deleted, deleted_chunks = pipeline.delete_missing_documents(seen_ids)
+                report['deleted'] += deleted
+                report['chunks_deleted'] += deleted_chunks
+            
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            
+            print(f"✅ Indexed {position} documents: "
+                  f"{report['added']} added, {report['updated']} updated, "
+                  f"{report['skipped']} skipped, {report['deleted']} deleted")
+            if report['failed']:
+                print(f"⚠️  {report['failed']} documents failed to index; re-run to retry them")
+            print(f"   Chunks embedded: {report['chunks_embedded']}, "
+                  f"chunks deleted: {report['chunks_deleted']}")
+            
+            # Get stats
+            stats = pipeline.get_index_stats()
+            print(f"\nIndex Statistics:")
+            print(f"  Total vectors: {stats.get('total_vectors', 0)}")
+            print(f"  Dimension: {stats.get('dimension', 0)}")
+            
+        except Exception as e:
+            print(f"Error indexing documents: {e}")
+            print(f"Progress is saved in {checkpoint_path}; re-run with --resume to continue")
+            return
         
-    except Exception as e:
-        print(f"Error indexing documents: {e}")
+        if precompute:
+            print("\nPrecomputing answers to the suggestion and follow-up prompts...")
+            try:
+                result = runner.run(pipeline.arefresh_precomputed_answers())
+                print(f"  {result['refreshed']} refreshed, {result['failed']} failed, "
+                      f"{result['prompts'] - result['refreshed'] - result['failed']} already up to date")
+            except Exception as e:
+                print(f"Error precomputing answers: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the knowledge base into the vector store")
+    parser.add_argument("kb_path", nargs="?", default=None,
+                        help="Knowledge base file (.json array or .jsonl)")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-embed every document, ignoring the index manifest")
+    parser.add_argument("--keep-missing", action="store_true",
+                        help="Keep vectors of documents no longer in the knowledge base file")
+    parser.add_argument("--segment-size", type=int, default=1000,
+                        help="Documents indexed (and checkpointed) per segment")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file (default: <kb_path>.checkpoint)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip documents already indexed by an interrupted run")
+    parser.add_argument("--skip-precompute", action="store_true",
+                        help="Don't rebuild the precomputed answers to the canned prompts")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("CMU-Africa Campus Assistant - Knowledge Base Loader")
     print("=" * 60)
-    load_knowledge_base()
+    load_knowledge_base(
+        kb_path=args.kb_path,
+        force=args.force,
+        delete_missing=not args.keep_missing,
+        segment_size=args.segment_size,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        precompute=not args.skip_precompute
+    )
     print("\n✅ Knowledge base loading complete!")
     print("You can now start the FastAPI server: python main.py")
@@ -2,23 +2,70 @@
 """
 FastAPI Backend for CMU-Africa Campus Assistant
 """
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, List
+import asyncio
+import logging
 import os
+import time
 from dotenv import load_dotenv
-from rag_pipeline import EnhancedRAGPipeline
+from metrics import Metrics, server_timing_header, start_request
+from index_jobs import IndexJobQueue, IndexJobStore, IndexQueueFull
 import json
 
+# The RAG pipeline and its dependencies (openai, numpy, pinecone) are imported
+# when the pipeline is built, in the background after the worker has booted
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Build and warm up the pipeline in the background at startup, so workers
+# answer liveness checks at once and the first chat doesn't pay for it
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
+# Answers to the canned suggestion/follow-up prompts are precomputed and refreshed
+# after index updates; the interval also picks up updates made by the loader
+PRECOMPUTE_ANSWERS = os.getenv("PRECOMPUTE_ANSWERS", "true").lower() == "true"
+PRECOMPUTE_INTERVAL = float(os.getenv("PRECOMPUTE_INTERVAL", "300"))
+
+# Startup progress reported by /ready
+startup_state = {"status": "starting", "error": None, "attempts": 0, "warm_up": None}
+
+# Background tasks, referenced until done so they aren't garbage collected
+background_tasks = set()
+
+def run_in_background(coroutine) -> asyncio.Task:
+    """Schedule a coroutine as a tracked background task"""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the background pipeline warm-up, and stop background work on shutdown"""
+    if WARM_UP_ON_STARTUP:
+        run_in_background(warm_up_pipeline())
+    yield
+    for task in list(background_tasks):
+        task.cancel()
+    await index_jobs.stop()
+    if rag_pipeline is not None:
+        # Embeddings still queued for the SQLite tier
+        await asyncio.to_thread(rag_pipeline.embedding_cache.flush)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CMU-Africa Campus Assistant API",
     description="AI-powered campus assistant with RAG pipeline",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -30,11 +77,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pipeline stage latencies, token counts and cache hit rates, served at /api/metrics
+metrics = Metrics()
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and, when enabled, report pipeline stage timings as Server-Timing"""
+    timings = start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    
+    # Label by route template, not raw path, so IDs and unknown URLs can't blow up
+    # metric cardinality; the router records the matched route in the scope
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.inc('rag_http_requests_total', "HTTP requests by path and status",
+                path=path, status=str(response.status_code))
+    
+    # Streaming responses run the pipeline after headers are sent, so only
+    # requests answered in full get stage timings
+    if SERVER_TIMING and timings:
+        timings.append(('app', time.perf_counter() - started))
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+def index_job_finished(report: Dict):
+    """Rebuild canned-prompt answers drawing on categories an indexing job changed"""
+    if PRECOMPUTE_ANSWERS and (report['added'] or report['updated'] or report['deleted']):
+        run_in_background(refresh_precomputed_answers(rag_pipeline))
+
+# Uploaded documents are indexed by background jobs, paced to an embedding token
+# budget per worker process so ingest leaves chat queries their share of the rate limit
+index_jobs = IndexJobQueue(
+    store=IndexJobStore(path=os.getenv("INDEX_JOBS_PATH", "index_jobs.db")),
+    workers=int(os.getenv("INDEX_JOB_WORKERS", "1")),
+    concurrency=int(os.getenv("INDEX_JOB_CONCURRENCY", "2")),
+    tokens_per_minute=float(os.getenv("INDEX_JOB_TOKENS_PER_MINUTE", "150000")),
+    max_queued=int(os.getenv("INDEX_JOB_MAX_QUEUED", "100")),
+    metrics=metrics,
+    on_finished=index_job_finished
+)
+
 # Request/Response models
 class ChatRequest(BaseModel):
     message: str
     user_profile: Optional[Dict] = None
     session_id: Optional[str] = None
+    categories: Optional[List[str]] = None
 
 class Source(BaseModel):
     id: str
@@ -52,6 +142,21 @@ class ChatResponse(BaseModel):
     sources: List[Source]
     suggestions: List[Suggestion]
     follow_up: Optional[str] = None
+    usage: Optional[Dict] = None
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest]
+
+class ChatBatchItem(BaseModel):
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
+
+# Batch chat limits: questions per request, and answers generated concurrently per batch
+CHAT_BATCH_MAX_SIZE = int(os.getenv("CHAT_BATCH_MAX_SIZE", "64"))
+CHAT_BATCH_LLM_CONCURRENCY = int(os.getenv("CHAT_BATCH_LLM_CONCURRENCY", "4"))
 
 # Initialize RAG pipeline
 rag_pipeline = None
@@ -62,25 +167,185 @@ def get_rag_pipeline():
     if rag_pipeline is None:
         openai_api_key = os.getenv("OPENAI_API_KEY")
         pinecone_api_key = os.getenv("PINECONE_API_KEY")
+        use_local_store = os.getenv("VECTOR_STORE", "pinecone") == "local"
         
-        if not openai_api_key or not pinecone_api_key:
+        if not openai_api_key or not (pinecone_api_key or use_local_store):
             raise HTTPException(
                 status_code=500,
                 detail="API keys not configured. Please set OPENAI_API_KEY and PINECONE_API_KEY in .env file"
             )
         
         try:
+            from rag_pipeline import EnhancedRAGPipeline
+            from embedding_cache import EmbeddingCache
+            from answer_cache import SemanticAnswerCache
+            from index_manifest import IndexManifest
+            from vector_store import LocalVectorStore
+            from lexical_index import BM25Index
+            from context_builder import ContextBuilder
+            from precomputed_answers import PrecomputedAnswers
+            from session_store import MemorySessionStore, SQLiteSessionStore
+            from reranker import Reranker
+            from rate_limiter import RateLimitScheduler
+            
+            # Shortened text-embedding-3 embeddings; changing the size requires a full re-index
+            embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+            embedding_cache = EmbeddingCache(
+                max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+                ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "86400")),
+                db_path=os.getenv("EMBEDDING_CACHE_PATH") or None
+            )
+            answer_cache = SemanticAnswerCache(
+                dimension=embedding_dimensions or 1536,
+                max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+                similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97")),
+                ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+            )
+            session_limits = dict(
+                max_turns=int(os.getenv("SESSION_MAX_TURNS", "4")),
+                max_turn_chars=int(os.getenv("SESSION_TURN_CHARS", "600")),
+                max_summary_chars=int(os.getenv("SESSION_SUMMARY_CHARS", "1200")),
+                ttl_seconds=float(os.getenv("SESSION_TTL", "3600"))
+            )
+            # SQLite lets every worker see a session's history, whichever served the last turn
+            session_store_path = os.getenv("SESSION_STORE_PATH")
+            if session_store_path:
+                session_store = SQLiteSessionStore(
+                    path=session_store_path,
+                    max_sessions=int(os.getenv("SESSION_MAX", "100000")),
+                    **session_limits
+                )
+            else:
+                session_store = MemorySessionStore(
+                    max_sessions=int(os.getenv("SESSION_MAX", "10000")),
+                    **session_limits
+                )
+            index_name = os.getenv("PINECONE_INDEX_NAME", "cmu-africa-kb")
+            vector_store = None
+            if use_local_store:
+                vector_store = LocalVectorStore(
+                    dimension=embedding_dimensions or 1536,
+                    path=os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_store"),
+                    dtype=os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32"),
+                    index_type=os.getenv("LOCAL_VECTOR_INDEX", "flat"),
+                    nprobe=int(os.getenv("LOCAL_VECTOR_NPROBE", "16")),
+                    n_lists=int(os.getenv("LOCAL_VECTOR_NLISTS", "0")) or None,
+                    ann_min_rows=int(os.getenv("LOCAL_VECTOR_ANN_MIN_ROWS", "10000")),
+                    rescore_factor=int(os.getenv("LOCAL_VECTOR_RESCORE_FACTOR", "4"))
+                )
             rag_pipeline = EnhancedRAGPipeline(
                 openai_api_key=openai_api_key,
                 pinecone_api_key=pinecone_api_key,
                 pinecone_environment=os.getenv("PINECONE_ENVIRONMENT", "us-east-1"),
-                index_name=os.getenv("PINECONE_INDEX_NAME", "cmu-africa-kb")
+                index_name=index_name,
+                embedding_dimensions=embedding_dimensions,
+                embedding_cache=embedding_cache,
+                answer_cache=answer_cache,
+                embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "100")),
+                embed_concurrency=int(os.getenv("EMBED_CONCURRENCY", "4")),
+                chunk_max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "200")),
+                chunk_overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "40")),
+                manifest=IndexManifest(
+                    path=os.getenv("INDEX_MANIFEST_PATH", "index_manifest.db"),
+                    index_name=index_name
+                ),
+                vector_store=vector_store,
+                lexical_index=BM25Index(path=os.getenv("LEXICAL_INDEX_PATH", "lexical_index.db")),
+                keyword_fast_path_max_terms=int(os.getenv("KEYWORD_FAST_PATH_MAX_TERMS", "4")),
+                context_builder=ContextBuilder(
+                    max_tokens=int(os.getenv("PROMPT_CONTEXT_TOKENS", "1200")),
+                    max_contexts=int(os.getenv("PROMPT_MAX_CONTEXTS", "5"))
+                ),
+                max_answer_tokens=int(os.getenv("MAX_ANSWER_TOKENS", "500")),
+                metrics=metrics,
+                http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+                http_max_keepalive=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+                http_keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+                http_timeout=float(os.getenv("HTTP_TIMEOUT", "30")),
+                openai_max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+                # 0 disables a stage's deadline
+                stage_timeouts={
+                    'embedding': float(os.getenv("EMBEDDING_TIMEOUT", "10")) or None,
+                    'vector_query': float(os.getenv("VECTOR_QUERY_TIMEOUT", "10")) or None,
+                    'llm': float(os.getenv("LLM_TIMEOUT", "60")) or None
+                },
+                coalesce_queries=os.getenv("COALESCE_QUERIES", "true").lower() == "true",
+                route_queries=os.getenv("ROUTE_QUERIES", "true").lower() == "true",
+                reranker=Reranker(
+                    min_relevance=float(os.getenv("RERANK_MIN_RELEVANCE", "0.5")),
+                    path=os.getenv("RERANK_WEIGHTS_PATH") or None
+                ),
+                rerank=os.getenv("RERANK", "true").lower() == "true",
+                rerank_candidates=int(os.getenv("RERANK_CANDIDATES", "30")),
+                precomputed_answers=PrecomputedAnswers(
+                    path=os.getenv("PRECOMPUTED_ANSWERS_PATH", "precomputed_answers.json")
+                ) if PRECOMPUTE_ANSWERS else None,
+                session_store=session_store,
+                # Chat requests go ahead of indexing and precomputation; budgets are
+                # learned from OpenAI's rate-limit headers
+                rate_limiter=RateLimitScheduler(
+                    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+                    background_reserve=float(os.getenv("OPENAI_BACKGROUND_RESERVE", "0.2")),
+                    latency_spike=float(os.getenv("OPENAI_LATENCY_SPIKE", "3")),
+                    metrics=metrics
+                )
             )
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to initialize RAG pipeline: {str(e)}")
     
     return rag_pipeline
 
+_pipeline_lock = asyncio.Lock()
+
+async def aget_rag_pipeline():
+    """Get or initialize RAG pipeline without blocking the event loop"""
+    if rag_pipeline is not None:
+        return rag_pipeline
+    
+    # Pipeline construction talks to Pinecone, so run it in a worker thread once
+    async with _pipeline_lock:
+        return await asyncio.to_thread(get_rag_pipeline)
+
+async def warm_up_pipeline():
+    """Build the pipeline (retrying with backoff) and warm it up, recording startup_state"""
+    while True:
+        startup_state["attempts"] += 1
+        try:
+            pipeline = await aget_rag_pipeline()
+            break
+        except Exception as e:
+            startup_state.update(status="failed", error=str(getattr(e, "detail", e)))
+            delay = min(60, 2 ** startup_state["attempts"])
+            logger.warning("Pipeline initialization failed (%s); retrying in %ss",
+                           startup_state["error"], delay)
+            await asyncio.sleep(delay)
+    
+    # A failed warm-up only costs the first requests some latency; the pipeline still serves
+    try:
+        startup_state["warm_up"] = await pipeline.awarm_up()
+    except Exception as e:
+        startup_state["warm_up"] = {"error": str(e)}
+        logger.warning("Pipeline warm-up failed: %s", e)
+    startup_state.update(status="ready", error=None)
+    
+    if PRECOMPUTE_ANSWERS:
+        run_in_background(refresh_precomputed_answers_periodically(pipeline))
+
+async def refresh_precomputed_answers(pipeline):
+    """Bring the canned-prompt answers up to date with the knowledge base"""
+    try:
+        report = await pipeline.arefresh_precomputed_answers()
+        if report['refreshed'] or report['failed']:
+            logger.info("Precomputed answers refreshed: %s", report)
+    except Exception as e:
+        logger.warning("Refreshing precomputed answers failed: %s", e)
+
+async def refresh_precomputed_answers_periodically(pipeline):
+    """Refresh precomputed answers now and then every PRECOMPUTE_INTERVAL seconds"""
+    while True:
+        await refresh_precomputed_answers(pipeline)
+        await asyncio.sleep(PRECOMPUTE_INTERVAL)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -92,19 +357,27 @@ async def root():
 
 @app.get("/health")
 async def health_simple():
-    """Simple health check for Docker"""
+    """Simple health check for Docker (liveness: the worker is up, ready or not)"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 once the pipeline is built and warmed up, 503 until then"""
+    if startup_state["status"] == "ready" or (not WARM_UP_ON_STARTUP and rag_pipeline is not None):
+        return {"status": "ready", "warm_up": startup_state["warm_up"]}
+    return JSONResponse(status_code=503, content=startup_state)
+
 @app.get("/api/health")
 async def health_check():
     """Detailed health check endpoint"""
     try:
-        pipeline = get_rag_pipeline()
-        stats = pipeline.get_index_stats()
+        pipeline = await aget_rag_pipeline()
+        stats = await pipeline.aget_index_stats()
         return {
             "status": "healthy",
             "rag_pipeline": "initialized",
-            "vector_store_stats": stats
+            "vector_store_stats": stats,
+            "latency": metrics.summary()
         }
     except Exception as e:
         return {
@@ -121,7 +394,8 @@ async def chat(request: ChatRequest):
     {
         "message": "User's question",
         "user_profile": {"program": "MSIT", "year": 2},  // Optional
-        "session_id": "unique-session-id"  // Optional
+        "session_id": "unique-session-id",  // Optional
+        "categories": ["Transportation"]  // Optional: search only these categories
     }
     
     Response:
@@ -129,7 +403,9 @@ async def chat(request: ChatRequest):
         "answer": "AI-generated response",
         "sources": [{"id": "...", "title": "...", "snippet": "...", "category": "..."}],
         "suggestions": [{"id": "...", "label": "...", "prompt": "..."}],
-        "follow_up": "Suggested follow-up question"
+        "follow_up": "Suggested follow-up question",
+        "usage": {"context_tokens": 412, "contexts_used": 3, "prompt_tokens": 538,
+                  "completion_tokens": 96, "cached": false}
     }
     """
     try:
@@ -137,13 +413,14 @@ async def chat(request: ChatRequest):
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
         # Get RAG pipeline
-        pipeline = get_rag_pipeline()
+        pipeline = await aget_rag_pipeline()
         
         # Process query
-        result = pipeline.query(
+        result = await pipeline.aquery(
             user_query=request.message,
             user_profile=request.user_profile,
-            session_id=request.session_id
+            session_id=request.session_id,
+            categories=request.categories
         )
         
         return ChatResponse(**result)
@@ -153,10 +430,114 @@ async def chat(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process query: {str(e)}")
 
+@app.post("/api/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(batch: ChatBatchRequest):
+    """
+    Batch chat endpoint - answers several /api/chat requests in one call
+    
+    All queries share one embeddings request and their vector searches run
+    concurrently; at most CHAT_BATCH_LLM_CONCURRENCY answers are generated
+    at once. Results are returned in request order, each with either a
+    response or an error, so one failing question doesn't fail the batch.
+    
+    Request body:
+    {
+        "requests": [{"message": "...", "user_profile": {...}, "session_id": "..."}]
+    }
+    
+    Response:
+    {
+        "results": [{"response": {...ChatResponse...}, "error": null}]
+    }
+    """
+    if len(batch.requests) > CHAT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: at most {CHAT_BATCH_MAX_SIZE} requests allowed"
+        )
+    
+    results: List[Optional[Dict]] = [None] * len(batch.requests)
+    valid = []
+    for i, request in enumerate(batch.requests):
+        if not request.message or len(request.message.strip()) == 0:
+            results[i] = {"response": None, "error": "Message cannot be empty"}
+        else:
+            valid.append(i)
+    
+    if valid:
+        try:
+            pipeline = await aget_rag_pipeline()
+            answered = await pipeline.aquery_batch(
+                [
+                    {
+                        "user_query": batch.requests[i].message,
+                        "user_profile": batch.requests[i].user_profile,
+                        "session_id": batch.requests[i].session_id,
+                        "categories": batch.requests[i].categories
+                    }
+                    for i in valid
+                ],
+                llm_concurrency=CHAT_BATCH_LLM_CONCURRENCY
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to process batch: {str(e)}")
+        for i, result in zip(valid, answered):
+            results[i] = result
+    
+    return ChatBatchResponse(results=[ChatBatchItem(**result) for result in results])
+
+def _format_sse(event: str, data: Dict) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint - same input as /api/chat, answered as Server-Sent Events
+    
+    Events, in order:
+        metadata: {"sources": [...], "suggestions": [...], "follow_up": "..."}
+        token:    {"text": "answer delta"}   (repeated)
+        done:     {"answer": "full answer", "usage": {...}}
+    An "error" event {"message": "..."} replaces "done" if generation fails.
+    """
+    if not request.message or len(request.message.strip()) == 0:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    pipeline = await aget_rag_pipeline()
+    
+    async def event_stream():
+        async for event, data in pipeline.astream_query(
+            user_query=request.message,
+            user_profile=request.user_profile,
+            session_id=request.session_id,
+            categories=request.categories
+        ):
+            yield _format_sse(event, data)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx from buffering the stream
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @app.post("/api/index/documents")
-async def index_documents(documents: List[Dict]):
+async def index_documents(documents: List[Dict], delete_missing: bool = False,
+                          force: bool = False, wait: bool = False):
     """
-    Index documents into the vector store
+    Queue documents for incremental indexing into the vector store
+    
+    Indexing runs as a background job and the job is returned at once (202);
+    follow it at /api/index/jobs/{job_id}. With ?wait=true the response is
+    the finished job's report instead. Unchanged documents are skipped. With
+    ?delete_missing=true, previously indexed documents absent from the
+    request are deleted; ?force=true re-embeds everything.
     
     Request body:
     [
@@ -170,25 +551,71 @@ async def index_documents(documents: List[Dict]):
     ]
     """
     try:
-        pipeline = get_rag_pipeline()
-        success = pipeline.index_documents(documents)
-        return {
-            "status": "success" if success else "failed",
-            "indexed_count": len(documents)
-        }
+        pipeline = await aget_rag_pipeline()
+        job = await index_jobs.submit(pipeline, documents, delete_missing=delete_missing,
+                                      force=force)
+    except IndexQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to index documents: {str(e)}")
+    
+    if not wait:
+        return JSONResponse(status_code=202, content=job)
+    job = await index_jobs.wait(job['job_id'])
+    if job['status'] in ('failed', 'interrupted'):
+        raise HTTPException(status_code=500,
+                            detail=f"Failed to index documents: {job['error'] or job['status']}")
+    report = job['progress']
+    return {
+        "status": "success" if job['status'] == 'succeeded' else job['status'],
+        "job_id": job['job_id'],
+        "indexed_count": report['added'] + report['updated'],
+        **report
+    }
+
+@app.get("/api/index/jobs")
+async def list_index_jobs(limit: int = 20):
+    """Most recent indexing jobs, newest first"""
+    return {"jobs": await index_jobs.recent(limit)}
+
+@app.get("/api/index/jobs/{job_id}")
+async def get_index_job(job_id: str):
+    """Status and progress of an indexing job"""
+    job = await index_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Indexing job not found")
+    return job
+
+@app.post("/api/index/jobs/{job_id}/cancel")
+async def cancel_index_job(job_id: str):
+    """
+    Cancel an indexing job
+    
+    A queued job is dropped; a running one stops after the batches in
+    flight, keeping the documents it finished. Finished jobs are unchanged.
+    """
+    job = await index_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Indexing job not found")
+    return job
 
 @app.get("/api/index/stats")
 async def get_index_stats():
     """Get vector store statistics"""
     try:
-        pipeline = get_rag_pipeline()
-        stats = pipeline.get_index_stats()
+        pipeline = await aget_rag_pipeline()
+        stats = await pipeline.aget_index_stats()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: stage latency histograms and percentiles, tokens, cache hits, errors"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,200 @@
+"""
+Request metrics for the CMU-Africa Campus Assistant
+Per-stage latency histograms with recent-window percentiles, counters, and
+Prometheus text exposition; stage spans of the current request are also
+collected for Server-Timing headers
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Seconds; covers cache hits (sub-millisecond) up to slow LLM completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stage timings of the request being served, when a caller opted in via start_request()
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    'request_timings', default=None
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (name, type, help, labels, value) as yielded by registered collectors
+Sample = Tuple[str, str, str, Labels, float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Histogram:
+    """Cumulative bucket counts plus a window of recent observations for percentiles"""
+
+    def __init__(self, buckets: Tuple[float, ...], window: int):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantile(self, q: float) -> float:
+        """Nearest-rank percentile over the recent window"""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[max(0, min(len(ordered) - 1, int(round(q * len(ordered))) - 1))]
+
+
+class Metrics:
+    """Thread-safe registry of stage latencies and labelled counters"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, window: int = 2048):
+        """window bounds the observations kept per stage for p50/p95/p99"""
+        self.buckets = buckets
+        self.window = window
+        self._stages: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterator[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """Record one duration for a stage"""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = _Histogram(self.buckets, self.window)
+            histogram.observe(seconds)
+
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    def inc(self, name: str, help_text: str, amount: float = 1, **labels: str):
+        """Increment a counter (name should end in _total)"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def counter_values(self, name: str) -> Dict[Labels, float]:
+        """Current values of a counter, keyed by label tuples"""
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a block as a stage; exceptions also count towards rag_errors_total"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            # Cancellation (e.g. a client disconnecting) is not a stage failure
+            if isinstance(e, Exception):
+                self.inc('rag_errors_total', "Pipeline stage failures", stage=stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def register_collector(self, collector: Callable[[], Iterator[Sample]]):
+        """Add a callable yielding (name, type, help, labels, value) samples at render time"""
+        self._collectors.append(collector)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per-stage count and p50/p95/p99 (milliseconds) over the recent window"""
+        with self._lock:
+            return {
+                stage: {
+                    'count': histogram.count,
+                    **{f"p{int(q * 100)}_ms": round(histogram.quantile(q) * 1000, 2)
+                       for q in QUANTILES}
+                }
+                for stage, histogram in sorted(self._stages.items())
+            }
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            stages = sorted(self._stages.items())
+            lines.append("# HELP rag_stage_duration_seconds Time spent in each pipeline stage")
+            lines.append("# TYPE rag_stage_duration_seconds histogram")
+            for stage, histogram in stages:
+                labels = (('stage', stage),)
+                for bound, count in zip(self.buckets, histogram.counts):
+                    lines.append(f"rag_stage_duration_seconds_bucket"
+                                 f"{_format_labels(labels, (('le', repr(bound)),))} {count}")
+                lines.append(f"rag_stage_duration_seconds_bucket"
+                             f"{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"rag_stage_duration_seconds_sum{_format_labels(labels)} "
+                             f"{_format_value(histogram.total)}")
+                lines.append(f"rag_stage_duration_seconds_count{_format_labels(labels)} "
+                             f"{histogram.count}")
+
+            lines.append("# HELP rag_stage_latency_seconds Recent-window stage latency percentiles")
+            lines.append("# TYPE rag_stage_latency_seconds summary")
+            for stage, histogram in stages:
+                labels = (('stage', stage),)
+                for q in QUANTILES:
+                    lines.append(f"rag_stage_latency_seconds"
+                                 f"{_format_labels(labels, (('quantile', str(q)),))} "
+                                 f"{_format_value(histogram.quantile(q))}")
+                lines.append(f"rag_stage_latency_seconds_sum{_format_labels(labels)} "
+                             f"{_format_value(histogram.total)}")
+                lines.append(f"rag_stage_latency_seconds_count{_format_labels(labels)} "
+                             f"{histogram.count}")
+
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        families: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in self._collectors:
+            for name, metric_type, help_text, labels, value in collector():
+                family = families.setdefault(name, (metric_type, help_text, []))
+                family[2].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, (metric_type, help_text, samples) in sorted(families.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(samples)
+
+        return '\n'.join(lines) + '\n'
+
+
+def start_request() -> List[Tuple[str, float]]:
+    """Collect stage timings for the current request (and tasks/threads it spawns)"""
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Format stage timings as a Server-Timing header value (durations in ms)"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
@@ -0,0 +1,150 @@
+"""
+Precomputed answers for the CMU-Africa Campus Assistant
+Responses to the fixed suggestion, follow-up and fallback prompts, built ahead
+of time and tagged with the knowledge base version of the categories they drew
+on, so the most common questions are answered without retrieval or an LLM call
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from embedding_cache import EmbeddingCache
+
+# Dependency key for answers grounded on no document (e.g. fallbacks): any KB change
+ALL_CATEGORIES = '*'
+
+
+def kb_version(category_versions: Dict[str, str]) -> str:
+    """Version of the whole knowledge base from its per-category versions"""
+    payload = json.dumps(category_versions, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class PrecomputedAnswers:
+    """Thread-safe store of canned-prompt responses, optionally saved as JSON"""
+
+    def __init__(self, path: Optional[str] = None, versions_ttl: float = 5.0):
+        """
+        Initialize the store, loading entries from path when one was saved there
+
+        Category versions are considered current for versions_ttl seconds
+        after set_versions(); callers re-read them once versions_expired().
+        """
+        self.path = path
+        self.versions_ttl = versions_ttl
+        self._entries: Dict[str, Dict] = {}
+        self._versions: Dict[str, str] = {}
+        self._versions_at = float('-inf')
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, prompt: str) -> bool:
+        """Whether a response (fresh or not) is stored for prompt"""
+        return EmbeddingCache.normalize(prompt) in self._entries
+
+    def _is_fresh(self, entry: Dict) -> bool:
+        versions = self._versions
+        return bool(versions) and all(
+            versions.get(category) == version for category, version in entry['depends_on'].items()
+        )
+
+    def get(self, prompt: str) -> Optional[Dict]:
+        """Copy of the response to prompt, if it was computed against the current KB version"""
+        entry = self._entries.get(EmbeddingCache.normalize(prompt))
+        if entry is None or not self._is_fresh(entry):
+            return None
+        with self._lock:
+            self.hits += 1
+        return copy.deepcopy(entry['response'])
+
+    def set_versions(self, category_versions: Dict[str, str]):
+        """Set the current KB version of each category; entries built from older ones go stale"""
+        versions = dict(category_versions)
+        versions[ALL_CATEGORIES] = kb_version(category_versions)
+        self._versions = versions
+        self._versions_at = time.monotonic()
+
+    def versions_expired(self) -> bool:
+        """Whether the category versions were set more than versions_ttl seconds ago"""
+        return time.monotonic() - self._versions_at > self.versions_ttl
+
+    def stale(self, prompts: Iterable[str]) -> List[str]:
+        """Prompts with no response computed against the current KB version"""
+        stale = []
+        with self._lock:
+            for prompt in prompts:
+                entry = self._entries.get(EmbeddingCache.normalize(prompt))
+                if entry is None or not self._is_fresh(entry):
+                    stale.append(prompt)
+        return stale
+
+    def put(self, prompt: str, response: Dict, categories: Iterable[str]):
+        """Store a response built from documents in categories (none: the whole KB)"""
+        depends_on = {category: self._versions.get(category)
+                      for category in set(categories) or {ALL_CATEGORIES}}
+        with self._lock:
+            self._entries[EmbeddingCache.normalize(prompt)] = {
+                'prompt': prompt,
+                'response': response,
+                'depends_on': depends_on,
+                'computed_at': time.time()
+            }
+            self._dirty = True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            fresh = sum(1 for entry in self._entries.values() if self._is_fresh(entry))
+            return {
+                'entries': len(self._entries),
+                'fresh': fresh,
+                'hits': self.hits
+            }
+
+    def flush(self):
+        if self.path and self._dirty:
+            self.save()
+
+    def save(self, path: Optional[str] = None):
+        """Write the entries to a JSON file shared by the API workers and the loader"""
+        path = path or self.path
+        if not path:
+            raise ValueError("No path configured for precomputed answers")
+
+        with self._lock:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(list(self._entries.values()), f)
+            os.replace(tmp_path, path)
+            self._dirty = False
+
+    def reload(self):
+        """Merge in entries other processes saved since, if the file exists"""
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def load(self, path: Optional[str] = None):
+        """Merge entries saved by save(), keeping the most recently computed of each prompt"""
+        path = path or self.path
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            raise Exception(f"Failed to load precomputed answers: {str(e)}")
+
+        with self._lock:
+            for entry in entries:
+                key = EmbeddingCache.normalize(entry['prompt'])
+                current = self._entries.get(key)
+                if current is None or entry['computed_at'] > current['computed_at']:
+                    self._entries[key] = entry
@@ -0,0 +1,52 @@
+"""
+Query intent for the CMU-Africa Campus Assistant
+Keyword rules that recognize questions clearly about one knowledge base
+category (shuttle, housing, library...), so their search can be restricted
+to that category's documents
+"""
+from typing import Dict, Iterable, Optional
+
+from lexical_index import tokenize
+
+# Terms that place a question in a category (as named in the knowledge base)
+CATEGORY_TERMS = {
+    'Transportation': ('shuttle', 'shuttles', 'bus', 'buses', 'transport', 'transportation',
+                       'route', 'routes', 'stop', 'stops', 'pickup'),
+    'Housing': ('housing', 'accommodation', 'accommodations', 'residence', 'residences',
+                'dorm', 'dorms', 'hostel', 'hostels', 'apartment', 'apartments', 'rent',
+                'roommate', 'roommates'),
+    'Campus Facilities': ('library', 'libraries', 'gym', 'cafeteria', 'printing', 'printer',
+                          'printers'),
+    'Academic Programs': ('course', 'courses', 'curriculum', 'degree', 'degrees', 'msit',
+                          'msece', 'mseai', 'graduation', 'credits', 'masters', 'program',
+                          'programs'),
+    'Student Life': ('event', 'events', 'club', 'clubs', 'activities', 'social', 'sports'),
+    'Administration': ('administration', 'admin', 'registrar'),
+    'Technology': ('portal', 'login', 'wifi', 'password'),
+    'Admissions': ('admission', 'admissions', 'deadline', 'deadlines')
+}
+
+
+class IntentClassifier:
+    """Maps a query to the one category its terms point at"""
+
+    def __init__(self, category_terms: Optional[Dict[str, Iterable[str]]] = None):
+        """Initialize the classifier from category -> terms rules (CATEGORY_TERMS by default)"""
+        self._term_categories: Dict[str, set] = {}
+        for category, terms in (category_terms or CATEGORY_TERMS).items():
+            for term in terms:
+                self._term_categories.setdefault(term, set()).add(category)
+
+    def classify(self, query: str) -> Optional[str]:
+        """
+        The category a query is about, or None
+
+        Only unambiguous queries are classified: those whose matching terms
+        all belong to a single category.
+        """
+        categories = set()
+        for term in tokenize(query):
+            categories.update(self._term_categories.get(term, ()))
+            if len(categories) > 1:
+                return None
+        return next(iter(categories), None)
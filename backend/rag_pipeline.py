@@ -3,122 +3,1075 @@
 Enhanced RAG Pipeline for CMU-Africa Campus Assistant
 Implements strict JSON response format with suggestions and follow-up questions
 """
+import asyncio
+import base64
+import contextlib
 import json
-from typing import List, Dict, Optional, Tuple
+import random
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, List, Dict, Optional, Tuple
+import httpx
+import numpy as np
 import openai
-from pinecone import Pinecone, ServerlessSpec
 import time
 import re
+from embedding_cache import EmbeddingCache
+from answer_cache import SemanticAnswerCache
+from chunking import AUDIENCE_FIELDS, chunk_id, estimate_tokens, iter_document_chunks
+from index_manifest import IndexManifest, PendingDocuments, chunk_hash, document_hash
+from vector_store import PineconeVectorStore, VectorStore
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from context_builder import ContextBuilder
+from metrics import Metrics
+from single_flight import SingleFlight
+from precomputed_answers import PrecomputedAnswers
+from session_store import MemorySessionStore, SessionStore, conversation_topic
+from query_intent import IntentClassifier
+from reranker import Reranker
+from rate_limiter import HeldStream, RateLimitScheduler, background
+
+# Upstream errors worth retrying with backoff (rate limits and transient failures)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Seconds each query stage may take before the query falls back to the canned
+# response (for streaming, "llm" bounds the wait for the first token)
+DEFAULT_STAGE_TIMEOUTS = {'embedding': 10.0, 'vector_query': 10.0, 'llm': 60.0}
+
+# Per-document indexing errors kept in an index report (all are counted)
+MAX_REPORTED_INDEX_ERRORS = 100
+
+# Suggestion pills offered after answers drawing on each category
+SUGGESTION_TEMPLATES = {
+    'Transportation': [
+        {'id': 'bus_schedule', 'label': '📅 Bus Schedule', 
+         'prompt': 'What are the shuttle bus timings today?'},
+        {'id': 'bus_routes', 'label': '🗺️ View Routes', 
+         'prompt': 'Show me all shuttle bus routes and stops'}
+    ],
+    'Academic Programs': [
+        {'id': 'program_requirements', 'label': '📚 Requirements', 
+         'prompt': 'What are the graduation requirements for my program?'},
+        {'id': 'courses', 'label': '📖 Course List', 
+         'prompt': 'Show me available courses this semester'}
+    ],
+    'Student Life': [
+        {'id': 'events', 'label': '🎉 Campus Events', 
+         'prompt': 'What events are happening this week?'},
+        {'id': 'clubs', 'label': '👥 Join Clubs', 
+         'prompt': 'Tell me about student clubs and organizations'}
+    ],
+    'Housing': [
+        {'id': 'housing_options', 'label': '🏠 Housing', 
+         'prompt': 'What housing options are available?'},
+        {'id': 'housing_apply', 'label': '📝 Apply', 
+         'prompt': 'How do I apply for on-campus housing?'}
+    ]
+}
+
+# Suggestions that fill the remaining pill slots
+GENERAL_SUGGESTIONS = [
+    {'id': 'contact_admin', 'label': '📞 Contact Admin', 
+     'prompt': 'How can I contact the administration office?'},
+    {'id': 'portal_access', 'label': '🌐 Student Portal', 
+     'prompt': 'How do I access the student portal?'},
+    {'id': 'library_hours', 'label': '📚 Library Hours', 
+     'prompt': 'What are the library opening hours?'}
+]
+
+# Suggestions offered when retrieval finds nothing to answer from
+FALLBACK_SUGGESTIONS = [
+    {'id': 'portal_search', 'label': '🔍 Search Portal', 
+     'prompt': 'Help me search the student portal'},
+    {'id': 'contact_admin', 'label': '📞 Contact Admin', 
+     'prompt': 'How do I contact the administration?'},
+    {'id': 'general_info', 'label': 'ℹ️ General Info', 
+     'prompt': 'Tell me about CMU-Africa campus'},
+    {'id': 'programs', 'label': '🎓 Programs', 
+     'prompt': 'What programs does CMU-Africa offer?'}
+]
+
+# Follow-up question offered after answers drawing on each category
+FOLLOW_UPS = {
+    'Transportation': 'Would you like to know about weekend shuttle schedules?',
+    'Academic Programs': 'Would you like to see the course curriculum details?',
+    'Student Life': 'Want to know about upcoming student activities?',
+    'Housing': 'Need help with the housing application process?',
+    'Admissions': 'Would you like information about application deadlines?'
+}
+DEFAULT_FOLLOW_UP = 'Is there anything else you\'d like to know?'
+
+class StageTimeout(Exception):
+    """A query stage ran past its deadline"""
+    
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} exceeded its {timeout:g}s deadline")
+        self.stage = stage
+        self.timeout = timeout
 
 class EnhancedRAGPipeline:
     """Enhanced RAG pipeline with structured JSON responses"""
     
-    def __init__(self, openai_api_key: str, pinecone_api_key: str, 
+    def __init__(self, openai_api_key: str, pinecone_api_key: Optional[str], 
                  pinecone_environment: str = "us-east-1", 
-                 index_name: str = "cmu-africa-assistant"):
+                 index_name: str = "cmu-africa-assistant",
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 answer_cache: Optional[SemanticAnswerCache] = None,
+                 embed_batch_size: int = 100,
+                 embed_concurrency: int = 4,
+                 max_retries: int = 5,
+                 chunk_max_tokens: int = 200,
+                 chunk_overlap_tokens: int = 40,
+                 manifest: Optional[IndexManifest] = None,
+                 vector_store: Optional[VectorStore] = None,
+                 lexical_index: Optional[BM25Index] = None,
+                 keyword_fast_path_max_terms: int = 4,
+                 context_builder: Optional[ContextBuilder] = None,
+                 max_answer_tokens: int = 500,
+                 metrics: Optional[Metrics] = None,
+                 openai_client: Optional[openai.OpenAI] = None,
+                 async_openai_client: Optional[openai.AsyncOpenAI] = None,
+                 http_max_connections: int = 100,
+                 http_max_keepalive: int = 20,
+                 http_keepalive_expiry: float = 30.0,
+                 http_timeout: float = 30.0,
+                 openai_max_retries: int = 2,
+                 stage_timeouts: Optional[Dict[str, float]] = None,
+                 coalesce_queries: bool = True,
+                 precomputed_answers: Optional[PrecomputedAnswers] = None,
+                 precompute_concurrency: int = 4,
+                 session_store: Optional[SessionStore] = None,
+                 intent_classifier: Optional[IntentClassifier] = None,
+                 route_queries: bool = True,
+                 reranker: Optional[Reranker] = None,
+                 rerank: bool = True,
+                 rerank_candidates: int = 30,
+                 embedding_dimensions: Optional[int] = None,
+                 rate_limiter: Optional[RateLimitScheduler] = None):
         """Initialize the enhanced RAG pipeline"""
         self.openai_api_key = openai_api_key
         self.pinecone_api_key = pinecone_api_key
         self.pinecone_environment = pinecone_environment
         self.index_name = index_name
         self.embedding_model = "text-embedding-3-small"
-        self.dimension = 1536
+        # text-embedding-3 models can return shortened embeddings (fewer dimensions,
+        # ranked nearly as well); cached embeddings are kept apart per size
+        self.embedding_dimensions = embedding_dimensions
+        self.dimension = embedding_dimensions or 1536
+        self.embedding_space = (self.embedding_model if embedding_dimensions is None
+                                else f"{self.embedding_model}@{embedding_dimensions}")
+        
+        # Indexing: texts per embeddings request, batches in flight, retries on 429s
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.max_retries = max_retries
+        
+        # Documents are split into overlapping chunks, one vector per chunk
+        self.chunk_max_tokens = chunk_max_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.chunk_overfetch = 3
+        self.max_chunks_per_document = 2
+        
+        # Content hashes of indexed documents, so re-indexing only embeds changes
+        self.manifest = manifest if manifest is not None else IndexManifest(index_name=index_name)
+        
+        # BM25 over chunk titles, keywords and text, fused with dense results at query time.
+        # Short queries whose terms all hit a chunk's title/keywords skip the embedding call.
+        self.lexical_index = lexical_index if lexical_index is not None else BM25Index()
+        self.keyword_fast_path_max_terms = keyword_fast_path_max_terms
+        
+        # Retrieved contexts are deduplicated and trimmed to a prompt token budget
+        self.context_builder = context_builder if context_builder is not None else ContextBuilder()
+        self.max_answer_tokens = max_answer_tokens
+        
+        # Per-stage latencies, token counts, outcomes and cache hit rates
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.metrics.register_collector(self._collect_metrics)
+        
+        # Query embeddings are cached; an in-memory LRU is used unless one is supplied
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+        
+        # Generated answers are reused for near-identical questions citing the same documents
+        self.answer_cache = (answer_cache if answer_cache is not None
+                             else SemanticAnswerCache(dimension=self.dimension))
+        
+        # Upstream HTTP: pooled keep-alive connections and explicit timeouts
+        # (the OpenAI SDK otherwise waits up to 10 minutes for a response)
+        limits = httpx.Limits(max_connections=http_max_connections,
+                              max_keepalive_connections=http_max_keepalive,
+                              keepalive_expiry=http_keepalive_expiry)
+        timeout = httpx.Timeout(http_timeout, connect=min(5.0, http_timeout))
+        
+        # Initialize OpenAI (sync client for scripts, async client for the API);
+        # compatible stand-ins can be supplied, e.g. by the offline benchmarks
+        if openai_client is None:
+            openai_client = openai.OpenAI(
+                api_key=self.openai_api_key,
+                timeout=timeout,
+                max_retries=openai_max_retries,
+                http_client=openai.DefaultHttpxClient(limits=limits, timeout=timeout)
+            )
+        if async_openai_client is None:
+            # Async requests are retried by _aopenai, so every 429 reaches the rate limiter
+            async_openai_client = openai.AsyncOpenAI(
+                api_key=self.openai_api_key,
+                timeout=timeout,
+                max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(limits=limits, timeout=timeout)
+            )
+        self.client = openai_client
+        self.async_client = async_openai_client
+        
+        # Async requests are admitted against the rate limits the API reports, chat
+        # traffic ahead of indexing and precomputation (which run in the background lane)
+        self.rate_limiter = (rate_limiter if rate_limiter is not None
+                             else RateLimitScheduler(metrics=self.metrics))
         
-        # Initialize OpenAI
-        self.client = openai.OpenAI(api_key=self.openai_api_key)
+        # Vector store: Pinecone unless another backend (e.g. LocalVectorStore) is supplied
+        if vector_store is None:
+            vector_store = PineconeVectorStore(
+                api_key=self.pinecone_api_key,
+                index_name=self.index_name,
+                dimension=self.dimension,
+                pool_maxsize=http_max_connections,
+                request_timeout=http_timeout
+            )
+        self.vector_store = vector_store
+        
+        # API queries past a stage deadline get the fallback response instead of waiting
+        self.stage_timeouts = dict(DEFAULT_STAGE_TIMEOUTS if stage_timeouts is None
+                                   else stage_timeouts)
+        
+        # Concurrent identical questions share one pipeline execution
+        self.coalesce_queries = coalesce_queries
+        self._single_flight = SingleFlight()
+        
+        # Responses to the canned prompts, rebuilt when their categories' documents change
+        self.precomputed_answers = (precomputed_answers if precomputed_answers is not None
+                                    else PrecomputedAnswers())
+        self.precompute_concurrency = precompute_concurrency
+        self._precompute_lock = asyncio.Lock()
+        
+        # Per-session turn history: follow-ups are retrieved with the question they
+        # continue, and recent turns plus a rolling summary go into the prompt
+        self.sessions = session_store if session_store is not None else MemorySessionStore()
+        
+        # Questions clearly about one category search only that category's documents
+        # (widening to the whole index when that finds too little)
+        self.intent_classifier = (intent_classifier if intent_classifier is not None
+                                  else IntentClassifier())
+        self.route_queries = route_queries
         
-        # Initialize Pinecone
-        self.pc = Pinecone(api_key=self.pinecone_api_key)
-        self.index = None
-        self._init_pinecone_index()
+        # Hybrid candidates are over-fetched and rescored in-process, so fewer and
+        # better passages reach the prompt and weak retrievals fall back before generation
+        self.reranker = (reranker if reranker is not None else Reranker()) if rerank else None
+        self.rerank_candidates = rerank_candidates
     
-    def _init_pinecone_index(self):
-        """Initialize or connect to Pinecone index"""
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Backoff before retry `attempt`, honoring Retry-After when the API sends it"""
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
         try:
-            # List existing indexes
-            existing_indexes = [index['name'] for index in self.pc.list_indexes()]
-            
-            if self.index_name not in existing_indexes:
-                # Create index with ServerlessSpec
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=self.dimension,
-                    metric="cosine",
-                    spec=ServerlessSpec(cloud="aws", region="us-east-1")
-                )
-                # Wait for index to be ready
-                time.sleep(10)
-            
-            # Connect to the index
-            self.index = self.pc.Index(self.index_name)
-        except Exception as e:
-            raise Exception(f"Failed to initialize Pinecone index: {str(e)}")
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+        return min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+    
+    def _with_retry(self, func, *args, **kwargs):
+        """Call func, retrying rate-limit and transient errors with exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(attempt, e))
+    
+    async def _awith_retry(self, func, *args, **kwargs):
+        """Async counterpart of _with_retry"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await func(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt, e))
+    
+    @staticmethod
+    def _request_tokens(request: Dict) -> int:
+        """Estimated rate-limit tokens of a request, its completion allowance included"""
+        if 'messages' in request:
+            prompt = sum(estimate_tokens(message['content']) for message in request['messages'])
+            return prompt + request.get('max_tokens', 0)
+        texts = request['input']
+        return sum(estimate_tokens(text) for text in ([texts] if isinstance(texts, str) else texts))
+    
+    async def _aopenai(self, resource, **request):
+        """
+        Call resource.create(**request) once the rate limiter admits it, with retries
+        
+        Each attempt (see _awith_retry) waits for its own slot, so 429s and
+        their retry-after reach the limiter. The raw response's x-ratelimit-*
+        headers keep the limiter's budgets current; stand-in clients without
+        with_raw_response are called as is. A stream holds its slot until it
+        ends or is closed.
+        """
+        return await self._awith_retry(self._aopenai_attempt, resource, request)
+    
+    async def _aopenai_attempt(self, resource, request: Dict):
+        async with contextlib.AsyncExitStack() as slot_exit:
+            slot = await slot_exit.enter_async_context(
+                self.rate_limiter.slot(request['model'], self._request_tokens(request))
+            )
+            raw_resource = getattr(resource, 'with_raw_response', None)
+            if raw_resource is None:
+                response = await resource.create(**request)
+            else:
+                raw_response = await raw_resource.create(**request)
+                slot.observe_headers(raw_response.headers)
+                response = raw_response.parse()
+            if request.get('stream'):
+                return HeldStream(response, slot_exit.pop_all())
+            return response
+    
+    @contextlib.asynccontextmanager
+    async def _deadline(self, stage: str):
+        """Bound an async stage by its deadline, raising StageTimeout when it passes"""
+        timeout = self.stage_timeouts.get(stage)
+        try:
+            async with asyncio.timeout(timeout) as deadline:
+                yield deadline
+        except TimeoutError:
+            self.metrics.inc('rag_timeouts_total', "Query stages that ran past their deadline",
+                             stage=stage)
+            raise StageTimeout(stage, timeout)
     
-    def create_embedding(self, text: str) -> List[float]:
+    def _embedding_request(self, texts) -> Dict:
+        """Arguments of an embeddings request for a text or list of texts"""
+        # base64 is decoded straight into float32 arrays, never into lists of Python floats
+        request = {'input': texts, 'model': self.embedding_model, 'encoding_format': 'base64'}
+        if self.embedding_dimensions is not None:
+            request['dimensions'] = self.embedding_dimensions
+        return request
+    
+    @staticmethod
+    def _decode_embeddings(response) -> np.ndarray:
+        """(texts, dimension) float32 matrix of an embeddings response, in input order"""
+        data = sorted(response.data, key=lambda item: item.index)
+        rows = [
+            np.frombuffer(base64.b64decode(item.embedding), dtype='<f4')
+            if isinstance(item.embedding, str) else np.asarray(item.embedding, dtype=np.float32)
+            for item in data
+        ]
+        return np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+    
+    def create_embedding(self, text: str, use_cache: bool = True) -> np.ndarray:
         """Create embedding for text using OpenAI"""
+        if use_cache:
+            cached = self.embedding_cache.get(text, self.embedding_space)
+            if cached is not None:
+                return cached
+        
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=self.embedding_model
-            )
-            return response.data[0].embedding
+            response = self.client.embeddings.create(**self._embedding_request(text))
+            embedding = self._decode_embeddings(response)[0]
         except Exception as e:
             raise Exception(f"Failed to create embedding: {str(e)}")
+        
+        if use_cache:
+            self.embedding_cache.set(text, self.embedding_space, embedding)
+        return embedding
     
-    def index_documents(self, documents: List[Dict]) -> bool:
-        """Index documents into Pinecone vector store"""
+    async def acreate_embedding(self, text: str, use_cache: bool = True) -> np.ndarray:
+        """Create embedding for text using the async OpenAI client"""
+        if use_cache:
+            cached = await self.embedding_cache.aget(text, self.embedding_space)
+            if cached is not None:
+                return cached
+        
         try:
-            vectors = []
-            for doc in documents:
-                embedding = self.create_embedding(doc['content'])
-                
-                metadata = {
-                    'title': doc.get('title', ''),
-                    'category': doc.get('category', ''),
-                    'content': doc['content'][:1000],  # Pinecone metadata limit
-                    'keywords': ','.join(doc.get('keywords', []))
-                }
+            response = await self._aopenai(self.async_client.embeddings,
+                                           **self._embedding_request(text))
+            embedding = self._decode_embeddings(response)[0]
+        except Exception as e:
+            raise Exception(f"Failed to create embedding: {str(e)}")
+        
+        if use_cache:
+            self.embedding_cache.set(text, self.embedding_space, embedding)
+        return embedding
+    
+    def create_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts in a single request, retrying on rate limits"""
+        try:
+            response = self._with_retry(self.client.embeddings.create,
+                                        **self._embedding_request(texts))
+            return self._decode_embeddings(response)
+        except Exception as e:
+            raise Exception(f"Failed to create embeddings: {str(e)}")
+    
+    async def acreate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Async counterpart of create_embeddings"""
+        try:
+            response = await self._aopenai(self.async_client.embeddings,
+                                           **self._embedding_request(texts))
+            return self._decode_embeddings(response)
+        except Exception as e:
+            raise Exception(f"Failed to create embeddings: {str(e)}")
+    
+    def _build_vector(self, chunk: Dict, embedding: np.ndarray) -> Dict:
+        """Build a vector store record for a document chunk"""
+        metadata = {
+            'title': chunk.get('title', ''),
+            'category': chunk.get('category', ''),
+            'content': chunk['content'],
+            'keywords': ','.join(chunk.get('keywords', [])),
+            'parent_id': chunk['parent_id'],
+            'chunk_index': chunk['chunk_index']
+        }
+        # Documents meant for some programs or years only (matched against user profiles)
+        for field in AUDIENCE_FIELDS:
+            if chunk.get(field):
+                metadata[field] = [str(value) for value in chunk[field]]
+        
+        return {
+            'id': chunk['id'],
+            'values': embedding,
+            'metadata': metadata
+        }
+    
+    def _embedding_text(self, chunk: Dict) -> str:
+        """Text embedded for a chunk; the title gives mid-document chunks their topic"""
+        return f"{chunk['title']}\n{chunk['content']}" if chunk.get('title') else chunk['content']
+    
+    def _iter_chunks(self, documents: Iterable[Dict]) -> Iterator[Dict]:
+        """Stream chunk records for documents using the configured chunk size"""
+        return iter_document_chunks(documents, self.chunk_max_tokens, self.chunk_overlap_tokens)
+    
+    @staticmethod
+    def _iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+        """Yield successive lists of up to batch_size items"""
+        iterator = iter(items)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield batch
+    
+    def _index_batch(self, chunks: List[Dict]) -> List[Dict]:
+        """Embed one batch of chunks in a single request and upsert it"""
+        embeddings = self.create_embeddings([self._embedding_text(chunk) for chunk in chunks])
+        vectors = [self._build_vector(chunk, emb) for chunk, emb in zip(chunks, embeddings)]
+        self._with_retry(self.vector_store.upsert, vectors)
+        self.lexical_index.add(chunks)
+        return chunks
+    
+    async def _aindex_batch(self, chunks: List[Dict], report: Dict, throttle=None) -> List[Dict]:
+        """
+        Async counterpart of _index_batch, counting embedded and upserted chunks in report
+        
+        With a throttle (anything with an async acquire(tokens)), the batch
+        first waits for its estimated tokens to fit the throttle's budget.
+        """
+        texts = [self._embedding_text(chunk) for chunk in chunks]
+        if throttle is not None:
+            await throttle.acquire(sum(estimate_tokens(text) for text in texts))
+        embeddings = await self.acreate_embeddings(texts)
+        report['chunks_embedded'] += len(chunks)
+        vectors = [self._build_vector(chunk, emb) for chunk, emb in zip(chunks, embeddings)]
+        # Vector store clients are synchronous, so upserts run in a worker thread
+        await asyncio.to_thread(self._with_retry, self.vector_store.upsert, vectors)
+        await asyncio.to_thread(self.lexical_index.add, chunks)
+        report['chunks_upserted'] += len(chunks)
+        return chunks
+    
+    @staticmethod
+    def _new_index_report() -> Dict:
+        return {
+            'added': 0,
+            'updated': 0,
+            'skipped': 0,
+            'failed': 0,
+            'deleted': 0,
+            'chunks_embedded': 0,
+            'chunks_upserted': 0,
+            'chunks_deleted': 0,
+            'cancelled': False,
+            'errors': []
+        }
+    
+    def _record_index_failure(self, report: Dict, doc_id: str, error: Exception):
+        """Count a document that could not be indexed, keeping the first errors"""
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_INDEX_ERRORS:
+            report['errors'].append({'id': doc_id, 'error': str(error)})
+        self.metrics.inc('rag_index_failures_total', "Documents that failed to index")
+    
+    def _fail_batch(self, pending: PendingDocuments, report: Dict, chunks: List[Dict],
+                    error: Exception):
+        """
+        Give up on the documents of a batch that could not be embedded or upserted
+        
+        They stay out of the manifest, so the next update re-embeds them; the
+        rest of the update carries on.
+        """
+        for entry in pending.mark_failed(chunks):
+            report[entry['change']] -= 1
+            self._record_index_failure(report, entry['doc_id'], error)
+    
+    def _plan_chunks(self, documents: Iterable[Dict], pending: PendingDocuments,
+                     report: Dict, seen_ids: set, force: bool) -> Iterator[Dict]:
+        """Yield the chunks of new or changed documents, staging those documents in pending"""
+        for position, doc in enumerate(documents):
+            try:
+                changed = self._plan_document(doc, pending, report, seen_ids, force)
+            except Exception as e:
+                doc_id = doc.get('id') if isinstance(doc, dict) else None
+                self._record_index_failure(report, doc_id or f"#{position}", e)
+                continue
+            yield from changed
+    
+    def _plan_document(self, doc: Dict, pending: PendingDocuments, report: Dict,
+                       seen_ids: set, force: bool) -> List[Dict]:
+        """The chunks of a new or changed document, staging it in pending ([] if unchanged)"""
+        if not isinstance(doc, dict):
+            raise ValueError("Document is not a JSON object")
+        if not doc.get('id'):
+            raise ValueError("Document has no 'id'")
+        # A rejected update still counts as seen, so delete_missing keeps the indexed version
+        seen_ids.add(doc['id'])
+        if not isinstance(doc.get('content'), str):
+            raise ValueError("Document has no text 'content'")
+        
+        doc_hash = document_hash(doc)
+        previous = self.manifest.get(doc['id'])
+        if previous is not None and previous[0] == doc_hash and not force:
+            report['skipped'] += 1
+            # Backfill the lexical index for documents embedded before it existed
+            if chunk_id(doc['id'], 0) not in self.lexical_index:
+                self.lexical_index.add(self._iter_chunks([doc]))
+            return []
+        
+        chunks = list(self._iter_chunks([doc]))
+        chunk_hashes = {chunk['id']: chunk_hash(chunk) for chunk in chunks}
+        previous_chunks = previous[1] if previous is not None else {}
+        stale = [cid for cid in previous_chunks if cid not in chunk_hashes]
+        changed = [chunk for chunk in chunks
+                   if force or previous_chunks.get(chunk['id']) != chunk_hashes[chunk['id']]]
+        report['chunks_deleted'] += len(stale)
+        
+        # Documents missing from the manifest may still have a pre-chunking vector
+        if previous is None:
+            stale.append(doc['id'])
+        
+        change = 'updated' if previous is not None else 'added'
+        report[change] += 1
+        pending.stage(doc['id'], doc_hash, chunk_hashes, [chunk['id'] for chunk in changed], stale,
+                      category=doc.get('category', ''), change=change)
+        return changed
+    
+    def _delete_vectors(self, ids: List[str]):
+        """Delete vectors by ID in batches"""
+        for batch in self._iter_batches(ids, 1000):
+            self._with_retry(self.vector_store.delete, batch)
+        self.lexical_index.remove(ids)
+    
+    def _flush_indexes(self):
+        """Persist vector store and lexical index writes"""
+        self.vector_store.flush()
+        self.lexical_index.flush()
+    
+    def _commit_documents(self, completed: List[Dict]):
+        """Delete stale chunks of fully upserted documents, then record them in the manifest"""
+        if not completed:
+            return
+        stale = [cid for entry in completed for cid in entry['stale_chunk_ids']]
+        self._delete_vectors(stale)
+        for entry in completed:
+            self.manifest.put(entry['doc_id'], entry['doc_hash'], entry['chunk_hashes'],
+                              entry['category'])
+        
+        # Cached answers citing re-indexed documents may now be stale
+        self.answer_cache.invalidate(entry['doc_id'] for entry in completed)
+    
+    def delete_missing_documents(self, seen_ids: set) -> Tuple[int, int]:
+        """Delete every recorded document not in seen_ids; returns (documents, chunks) deleted"""
+        missing = [doc_id for doc_id in self.manifest.doc_ids() if doc_id not in seen_ids]
+        chunk_ids = []
+        for doc_id in missing:
+            chunk_ids.extend(self.manifest.get(doc_id)[1])
+        
+        self._delete_vectors(chunk_ids)
+        self._flush_indexes()
+        self.manifest.remove(missing)
+        self.answer_cache.invalidate(missing)
+        return len(missing), len(chunk_ids)
+    
+    def update_index(self, documents: Iterable[Dict], delete_missing: bool = False,
+                     force: bool = False) -> Dict:
+        """
+        Incrementally index documents into the vector store
+        
+        Unchanged documents (by content hash) are skipped and only changed
+        chunks of modified documents are re-embedded. Changed chunks are
+        embedded embed_batch_size at a time with up to embed_concurrency
+        batches in flight; each worker upserts its batch as soon as it is
+        embedded, so vector store writes overlap with embedding. With
+        delete_missing, recorded documents absent from `documents` are removed.
+        
+        A document that is invalid or whose chunks fail to embed or upsert
+        (after retries) is left unrecorded and reported, without failing the
+        others. Returns added/updated/skipped/failed/deleted document counts,
+        chunk counts and the failed documents' errors.
+        """
+        report = self._new_index_report()
+        pending = PendingDocuments()
+        seen_ids = set()
+        try:
+            chunks = self._plan_chunks(documents, pending, report, seen_ids, force)
+            with ThreadPoolExecutor(max_workers=self.embed_concurrency) as pool:
+                in_flight = {}
+                for batch in self._iter_batches(chunks, self.embed_batch_size):
+                    # Keep at most embed_concurrency batches in memory at once
+                    if len(in_flight) >= self.embed_concurrency:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._settle_batch(pending, report, in_flight.pop(future), future)
+                    in_flight[pool.submit(self._index_batch, batch)] = batch
+                    self._commit_documents(pending.pop_completed())
                 
-                vectors.append({
-                    'id': doc['id'],
-                    'values': embedding,
-                    'metadata': metadata
-                })
+                for future, batch in in_flight.items():
+                    self._settle_batch(pending, report, batch, future)
+            self._commit_documents(pending.pop_completed())
+            self._flush_indexes()
             
-            batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                self.index.upsert(vectors=batch)
+            if delete_missing:
+                deleted, deleted_chunks = self.delete_missing_documents(seen_ids)
+                report['deleted'] = deleted
+                report['chunks_deleted'] += deleted_chunks
             
-            return True
+            return report
         except Exception as e:
             raise Exception(f"Failed to index documents: {str(e)}")
     
-    def retrieve_context(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Retrieve relevant context from vector store"""
+    def _settle_batch(self, pending: PendingDocuments, report: Dict, batch: List[Dict], future):
+        """Record the outcome of a batch indexed in the thread pool"""
         try:
-            query_embedding = self.create_embedding(query)
+            future.result()
+        except Exception as e:
+            self._fail_batch(pending, report, batch, e)
+            return
+        report['chunks_embedded'] += len(batch)
+        report['chunks_upserted'] += len(batch)
+        pending.mark_indexed(batch)
+    
+    async def aupdate_index(self, documents: Iterable[Dict], delete_missing: bool = False,
+                            force: bool = False, report: Optional[Dict] = None,
+                            cancelled: Optional[asyncio.Event] = None, throttle=None,
+                            concurrency: Optional[int] = None) -> Dict:
+        """
+        Async counterpart of update_index
+        
+        A caller following progress passes its own report dict, which is
+        filled in and kept current while indexing runs. Setting `cancelled`
+        stops indexing after the batches in flight: finished documents are
+        recorded, the rest are left for the next update, and delete_missing
+        is skipped. Batches wait on `throttle` (see _aindex_batch), and
+        `concurrency` overrides embed_concurrency.
+        """
+        report = report if report is not None else {}
+        report.update(self._new_index_report())
+        pending = PendingDocuments()
+        seen_ids = set()
+        try:
+            chunks = self._plan_chunks(documents, pending, report, seen_ids, force)
+            batches = self._iter_batches(chunks, self.embed_batch_size)
+            # Planning reads the manifest and chunks documents, so batches are drawn in a
+            # thread; holding plan_lock keeps one worker in the generator and keeps the
+            # pending and report updates below from interleaving with it
+            plan_lock = asyncio.Lock()
             
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
+            async def worker():
+                # Workers share one batch iterator, bounding the batches in flight
+                while cancelled is None or not cancelled.is_set():
+                    async with plan_lock:
+                        batch = await asyncio.to_thread(next, batches, None)
+                    if batch is None:
+                        return
+                    try:
+                        await self._aindex_batch(batch, report, throttle)
+                    except Exception as e:
+                        async with plan_lock:
+                            self._fail_batch(pending, report, batch, e)
+                            completed = pending.pop_completed()
+                    else:
+                        async with plan_lock:
+                            pending.mark_indexed(batch)
+                            completed = pending.pop_completed()
+                    await asyncio.to_thread(self._commit_documents, completed)
+            
+            # Worker tasks inherit the background lane, so indexing yields to chat traffic
+            with background():
+                workers = [asyncio.ensure_future(worker())
+                           for _ in range(concurrency or self.embed_concurrency)]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for task in workers:
+                    task.cancel()
+                raise
+            if cancelled is not None and cancelled.is_set():
+                # Partly upserted documents stay out of the manifest and are redone next time
+                for entry in pending.pop_pending():
+                    report[entry['change']] -= 1
+                report['cancelled'] = True
+            await asyncio.to_thread(self._commit_documents, pending.pop_completed())
+            await asyncio.to_thread(self._flush_indexes)
             
-            contexts = []
-            for match in results.get('matches', []):
-                contexts.append({
-                    'id': match.get('id', ''),
-                    'content': match['metadata']['content'],
-                    'title': match['metadata']['title'],
-                    'category': match['metadata']['category'],
-                    'score': match['score']
-                })
+            if delete_missing and not report['cancelled']:
+                deleted, deleted_chunks = await asyncio.to_thread(self.delete_missing_documents, seen_ids)
+                report['deleted'] = deleted
+                report['chunks_deleted'] += deleted_chunks
             
-            return contexts
+            return report
+        except Exception as e:
+            raise Exception(f"Failed to index documents: {str(e)}")
+    
+    def index_documents(self, documents: Iterable[Dict]) -> bool:
+        """Index documents into the vector store"""
+        self.update_index(documents)
+        return True
+    
+    async def aindex_documents(self, documents: Iterable[Dict]) -> bool:
+        """Index documents without blocking the event loop"""
+        await self.aupdate_index(documents)
+        return True
+    
+    def retrieve_context(self, query: str, top_k: int = 5,
+                         query_embedding: Optional[np.ndarray] = None,
+                         lexical_matches: Optional[List[Dict]] = None,
+                         categories: Optional[List[str]] = None,
+                         user_profile: Optional[Dict] = None) -> List[Dict]:
+        """
+        Retrieve relevant context by fusing vector store and BM25 results
+        
+        The fused candidates are reranked (when enabled), so each context's
+        'score' is its calibrated relevance. With categories, only documents
+        in those categories are searched; with a user_profile, documents meant
+        for other programs or years are dropped and those meant for the
+        user's are ranked higher.
+        """
+        try:
+            if query_embedding is None:
+                with self.metrics.span('embedding'):
+                    query_embedding = self.create_embedding(query)
+            if lexical_matches is None:
+                with self.metrics.span('lexical_search'):
+                    lexical_matches = self._lexical_search(
+                        query, self._candidate_count(top_k), categories
+                    )
+            
+            # Over-fetch chunks so top_k distinct documents survive reranking and collapsing
+            with self.metrics.span('vector_query'):
+                results = self.vector_store.query(query_embedding, self._candidate_count(top_k),
+                                                  filter=self._search_filter(categories))
+            
+            return self._rank_contexts(self._parse_matches(results), lexical_matches, top_k,
+                                       user_profile, query)
         except Exception as e:
             raise Exception(f"Failed to retrieve context: {str(e)}")
     
+    async def aretrieve_context(self, query: str, top_k: int = 5,
+                                query_embedding: Optional[np.ndarray] = None,
+                                lexical_matches: Optional[List[Dict]] = None,
+                                categories: Optional[List[str]] = None,
+                                user_profile: Optional[Dict] = None) -> List[Dict]:
+        """Retrieve relevant context without blocking the event loop"""
+        try:
+            if query_embedding is None:
+                async with self._deadline('embedding'):
+                    with self.metrics.span('embedding'):
+                        query_embedding = await self.acreate_embedding(query)
+            if lexical_matches is None:
+                with self.metrics.span('lexical_search'):
+                    lexical_matches = await asyncio.to_thread(
+                        self._lexical_search, query, self._candidate_count(top_k),
+                        categories
+                    )
+            
+            # Over-fetch chunks so top_k distinct documents survive reranking and collapsing
+            async with self._deadline('vector_query'):
+                with self.metrics.span('vector_query'):
+                    results = await asyncio.to_thread(
+                        self.vector_store.query, query_embedding, self._candidate_count(top_k),
+                        self._search_filter(categories)
+                    )
+            
+            return self._rank_contexts(self._parse_matches(results), lexical_matches, top_k,
+                                       user_profile, query)
+        except StageTimeout:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to retrieve context: {str(e)}")
+    
+    def _lexical_search(self, query: str, top_k: int,
+                        categories: Optional[List[str]] = None) -> List[Dict]:
+        """
+        BM25 matches for a query, with their text fetched from the vector store
+        
+        The lexical index keeps no chunk text; matches the vector store does
+        not hold (yet) are dropped.
+        """
+        matches = self.lexical_index.search(query, top_k, categories)
+        if not matches:
+            return matches
+        stored = self.vector_store.fetch([match['id'] for match in matches])
+        return [{**match, 'content': stored[match['id']]['content']}
+                for match in matches if 'content' in stored.get(match['id'], {})]
+    
+    @staticmethod
+    def _search_filter(categories: Optional[List[str]]) -> Optional[Dict]:
+        """Vector store metadata filter restricting a search to categories"""
+        return {'category': {'$in': list(categories)}} if categories else None
+    
+    @staticmethod
+    def _profile_audience(user_profile: Optional[Dict]) -> Tuple[str, str]:
+        """(program, year) of a user profile as stored in document metadata, '' when unset"""
+        profile = user_profile or {}
+        program = str(profile.get('program') or '').strip().lower()
+        year = str(profile.get('year') or '').strip()
+        return program, year
+    
+    def _rank_contexts(self, dense_chunks: List[Dict], lexical_matches: List[Dict],
+                       top_k: int, user_profile: Optional[Dict] = None,
+                       query: Optional[str] = None) -> List[Dict]:
+        """
+        Fuse dense and lexical chunk rankings into top_k document contexts
+        
+        Chunks of documents meant for other programs or years than the
+        profile's are dropped; those meant for the user's form a third
+        ranking in the fusion, which lifts them without overriding relevance.
+        Given the query, hybrid results are then reranked.
+        """
+        program, year = self._profile_audience(user_profile)
+        if not program and not year:
+            chunks = reciprocal_rank_fusion(dense_chunks, lexical_matches)
+            return self._collapse_chunks(self._rerank(query, chunks, dense_chunks), top_k)
+        
+        def audience(chunk: Dict, field: str) -> set:
+            return {str(value).lower() for value in chunk.get(field) or ()}
+        
+        def suits(chunk: Dict) -> bool:
+            programs, years = audience(chunk, 'programs'), audience(chunk, 'years')
+            return ((not program or not programs or program in programs)
+                    and (not year or not years or year in years))
+        
+        dense_chunks = [chunk for chunk in dense_chunks if suits(chunk)]
+        lexical_matches = [chunk for chunk in lexical_matches if suits(chunk)]
+        targeted = {}
+        for chunk in dense_chunks + lexical_matches:
+            if program in audience(chunk, 'programs') or year in audience(chunk, 'years'):
+                targeted.setdefault(chunk['id'], chunk)
+        if targeted:
+            self.metrics.inc('rag_profile_boosts_total',
+                             "Retrievals that ranked documents for the user's program or year higher")
+        chunks = reciprocal_rank_fusion(dense_chunks, lexical_matches, list(targeted.values()))
+        return self._collapse_chunks(self._rerank(query, chunks, dense_chunks), top_k)
+    
+    def _candidate_count(self, top_k: int) -> int:
+        """Chunks fetched from each index for a top_k retrieval"""
+        count = top_k * self.chunk_overfetch
+        return max(count, self.rerank_candidates) if self.reranker is not None else count
+    
+    def _rerank(self, query: Optional[str], chunks: List[Dict],
+                dense_chunks: List[Dict]) -> List[Dict]:
+        """
+        Rescore fused candidate chunks by relevance, dropping those below the threshold
+        
+        Keyword-path results (no dense matches) are exact title/keyword hits
+        and keep their fused order, as do all chunks when reranking is off.
+        """
+        if self.reranker is None or not query or not dense_chunks:
+            return chunks
+        with self.metrics.span('rerank'):
+            dense_scores = {chunk['id']: chunk['score'] for chunk in dense_chunks}
+            idfs = self.lexical_index.idf(set(tokenize(query)))
+            ranked = self.reranker.rerank(query, chunks, dense_scores, idfs)
+        
+        help_text = "Candidate chunks kept or dropped by the reranker"
+        self.metrics.inc('rag_rerank_candidates_total', help_text, len(ranked), result='kept')
+        self.metrics.inc('rag_rerank_candidates_total', help_text, len(chunks) - len(ranked),
+                         result='dropped')
+        return ranked
+    
+    def _route(self, user_query: str,
+               categories: Optional[List[str]]) -> Tuple[Optional[List[str]], bool]:
+        """(categories to search, whether the intent classifier chose them)"""
+        if categories:
+            return list(categories), False
+        category = self.intent_classifier.classify(user_query) if self.route_queries else None
+        return ([category], True) if category else (None, False)
+    
+    def _record_route(self, category: str, result: str):
+        """Count a query routed to a category: answered there ('routed') or 'widened'"""
+        self.metrics.inc('rag_routed_queries_total', "Queries routed to a category search",
+                         category=category, result=result)
+    
+    def _is_keyword_query(self, query: str, lexical_matches: List[Dict]) -> bool:
+        """Whether a short query's terms all hit the title/keywords of the top BM25 match"""
+        return (bool(lexical_matches) and lexical_matches[0]['keyword_hit']
+                and len(query.split()) <= self.keyword_fast_path_max_terms)
+    
+    def _retrieve(self, user_query: str, top_k: int, user_profile: Optional[Dict] = None,
+                  categories: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[np.ndarray]]:
+        """
+        Retrieve contexts for a user query, returning (contexts, query_embedding)
+        
+        Keyword queries are answered from the lexical index alone; their
+        embedding is only returned (for the answer cache) when already cached.
+        Queries the intent classifier routes to a category search the whole
+        index again when the category yields too little.
+        """
+        scope, routed = self._route(user_query, categories)
+        contexts, query_embedding = self._retrieve_scoped(user_query, top_k, user_profile, scope)
+        if routed:
+            if self._has_sufficient_context(contexts):
+                self._record_route(scope[0], 'routed')
+            else:
+                self._record_route(scope[0], 'widened')
+                return self._retrieve_scoped(user_query, top_k, user_profile, None, query_embedding)
+        return contexts, query_embedding
+    
+    def _retrieve_scoped(self, user_query: str, top_k: int, user_profile: Optional[Dict],
+                         categories: Optional[List[str]],
+                         query_embedding: Optional[np.ndarray] = None
+                         ) -> Tuple[List[Dict], Optional[np.ndarray]]:
+        """_retrieve within categories (all when None)"""
+        with self.metrics.span('lexical_search'):
+            lexical_matches = self._lexical_search(user_query, self._candidate_count(top_k),
+                                                        categories)
+        if self._is_keyword_query(user_query, lexical_matches):
+            self._record_retrieval_path('keyword')
+            if query_embedding is None:
+                query_embedding = self.embedding_cache.get(user_query, self.embedding_space)
+            return self._rank_contexts([], lexical_matches, top_k, user_profile), query_embedding
+        
+        self._record_retrieval_path('hybrid')
+        if query_embedding is None:
+            with self.metrics.span('embedding'):
+                query_embedding = self.create_embedding(user_query)
+        contexts = self.retrieve_context(user_query, top_k=top_k, query_embedding=query_embedding,
+                                         lexical_matches=lexical_matches, categories=categories,
+                                         user_profile=user_profile)
+        return contexts, query_embedding
+    
+    async def _aretrieve(self, user_query: str, top_k: int,
+                         user_profile: Optional[Dict] = None,
+                         categories: Optional[List[str]] = None,
+                         query_embedding: Optional[np.ndarray] = None,
+                         lexical_matches: Optional[List[Dict]] = None
+                         ) -> Tuple[List[Dict], Optional[np.ndarray]]:
+        """
+        Async counterpart of _retrieve
+        
+        query_embedding and lexical_matches (searched within the query's
+        routed categories) can be passed in when already computed.
+        """
+        scope, routed = self._route(user_query, categories)
+        contexts, query_embedding = await self._aretrieve_scoped(
+            user_query, top_k, user_profile, scope, query_embedding, lexical_matches
+        )
+        if routed:
+            if self._has_sufficient_context(contexts):
+                self._record_route(scope[0], 'routed')
+            else:
+                self._record_route(scope[0], 'widened')
+                return await self._aretrieve_scoped(user_query, top_k, user_profile, None,
+                                                    query_embedding)
+        return contexts, query_embedding
+    
+    async def _aretrieve_scoped(self, user_query: str, top_k: int,
+                                user_profile: Optional[Dict],
+                                categories: Optional[List[str]],
+                                query_embedding: Optional[np.ndarray] = None,
+                                lexical_matches: Optional[List[Dict]] = None
+                                ) -> Tuple[List[Dict], Optional[np.ndarray]]:
+        """_aretrieve within categories (all when None)"""
+        if lexical_matches is None:
+            with self.metrics.span('lexical_search'):
+                lexical_matches = await asyncio.to_thread(
+                    self._lexical_search, user_query, self._candidate_count(top_k),
+                    categories
+                )
+        if self._is_keyword_query(user_query, lexical_matches):
+            self._record_retrieval_path('keyword')
+            if query_embedding is None:
+                query_embedding = await self.embedding_cache.aget(user_query, self.embedding_space)
+            return self._rank_contexts([], lexical_matches, top_k, user_profile), query_embedding
+        
+        self._record_retrieval_path('hybrid')
+        if query_embedding is None:
+            async with self._deadline('embedding'):
+                with self.metrics.span('embedding'):
+                    query_embedding = await self.acreate_embedding(user_query)
+        contexts = await self.aretrieve_context(user_query, top_k=top_k,
+                                                query_embedding=query_embedding,
+                                                lexical_matches=lexical_matches,
+                                                categories=categories,
+                                                user_profile=user_profile)
+        return contexts, query_embedding
+    
+    def _parse_matches(self, results) -> List[Dict]:
+        """Convert vector store query matches into chunk context dicts"""
+        contexts = []
+        for match in results.get('matches', []):
+            metadata = match['metadata']
+            contexts.append({
+                'id': match.get('id', ''),
+                # Vectors indexed before chunking are whole documents
+                'parent_id': metadata.get('parent_id', match.get('id', '')),
+                'chunk_index': int(metadata.get('chunk_index', 0)),
+                'content': metadata['content'],
+                'title': metadata['title'],
+                'category': metadata['category'],
+                'score': match['score'],
+                **{field: metadata[field] for field in AUDIENCE_FIELDS if field in metadata}
+            })
+        
+        return contexts
+    
+    def _collapse_chunks(self, chunks: List[Dict], top_k: int) -> List[Dict]:
+        """Merge chunk matches into per-document contexts, ranked by best chunk score"""
+        documents: Dict[str, Dict] = {}
+        for chunk in chunks:
+            doc = documents.get(chunk['parent_id'])
+            if doc is None:
+                if len(documents) >= top_k:
+                    continue
+                doc = documents[chunk['parent_id']] = {
+                    'id': chunk['parent_id'],
+                    'title': chunk['title'],
+                    'category': chunk['category'],
+                    'score': chunk['score'],
+                    'chunks': []
+                }
+            if len(doc['chunks']) < self.max_chunks_per_document:
+                doc['chunks'].append(chunk)
+        
+        contexts = []
+        for doc in documents.values():
+            # Matched chunks are stitched back together in document order
+            ordered = sorted(doc.pop('chunks'), key=lambda chunk: chunk['chunk_index'])
+            doc['content'] = ' ... '.join(chunk['content'] for chunk in ordered)
+            contexts.append(doc)
+        
+        return contexts
+    
     def _extract_snippet(self, content: str, max_words: int = 25) -> str:
         """Extract a meaningful snippet from content"""
         words = content.split()
@@ -132,52 +1085,14 @@ class EnhancedRAGPipeline:
         suggestions = []
         categories = set([ctx['category'] for ctx in contexts])
         
-        # Context-based suggestions
-        suggestion_templates = {
-            'Transportation': [
-                {'id': 'bus_schedule', 'label': '📅 Bus Schedule', 
-                 'prompt': 'What are the shuttle bus timings today?'},
-                {'id': 'bus_routes', 'label': '🗺️ View Routes', 
-                 'prompt': 'Show me all shuttle bus routes and stops'}
-            ],
-            'Academic Programs': [
-                {'id': 'program_requirements', 'label': '📚 Requirements', 
-                 'prompt': 'What are the graduation requirements for my program?'},
-                {'id': 'courses', 'label': '📖 Course List', 
-                 'prompt': 'Show me available courses this semester'}
-            ],
-            'Student Life': [
-                {'id': 'events', 'label': '🎉 Campus Events', 
-                 'prompt': 'What events are happening this week?'},
-                {'id': 'clubs', 'label': '👥 Join Clubs', 
-                 'prompt': 'Tell me about student clubs and organizations'}
-            ],
-            'Housing': [
-                {'id': 'housing_options', 'label': '🏠 Housing', 
-                 'prompt': 'What housing options are available?'},
-                {'id': 'housing_apply', 'label': '📝 Apply', 
-                 'prompt': 'How do I apply for on-campus housing?'}
-            ]
-        }
-        
         # Add category-specific suggestions
         for category in categories:
-            if category in suggestion_templates:
-                suggestions.extend(suggestion_templates[category][:2])
-        
-        # Add general helpful suggestions
-        general_suggestions = [
-            {'id': 'contact_admin', 'label': '📞 Contact Admin', 
-             'prompt': 'How can I contact the administration office?'},
-            {'id': 'portal_access', 'label': '🌐 Student Portal', 
-             'prompt': 'How do I access the student portal?'},
-            {'id': 'library_hours', 'label': '📚 Library Hours', 
-             'prompt': 'What are the library opening hours?'}
-        ]
+            if category in SUGGESTION_TEMPLATES:
+                suggestions.extend(map(dict, SUGGESTION_TEMPLATES[category][:2]))
         
         # Limit to 5 suggestions
         if len(suggestions) < 5:
-            suggestions.extend(general_suggestions[:5 - len(suggestions)])
+            suggestions.extend(map(dict, GENERAL_SUGGESTIONS[:5 - len(suggestions)]))
         
         return suggestions[:5]
     
@@ -187,19 +1102,174 @@ class EnhancedRAGPipeline:
             return None
         
         category = contexts[0]['category']
+        return FOLLOW_UPS.get(category, DEFAULT_FOLLOW_UP)
+    
+    def _has_sufficient_context(self, contexts: List[Dict]) -> bool:
+        """
+        Check whether retrieval found context good enough to answer from
+        
+        With reranking, the top context's calibrated relevance (or, on the
+        keyword path, its share of matched query terms) must reach the
+        reranker's min_relevance; without it, the top similarity must reach 0.5.
+        """
+        min_score = self.reranker.min_relevance if self.reranker is not None else 0.5
+        return bool(contexts) and contexts[0]['score'] >= min_score
+    
+    @staticmethod
+    def _has_history(session: Optional[Dict]) -> bool:
+        """Whether a session has earlier turns that shape the answer to its next question"""
+        return bool(session and (session['turns'] or session['summary']))
+    
+    def _lookup_answer(self, query_embedding: Optional[np.ndarray], cited: Dict[str, Optional[str]],
+                       session: Optional[Dict] = None) -> Optional[Dict]:
+        """Cached answer for the query, if its embedding is known and it starts a conversation"""
+        if query_embedding is None or self._has_history(session):
+            return None
+        return self.answer_cache.lookup(query_embedding, cited, versions=cited)
+    
+    def _store_answer(self, query_embedding: Optional[np.ndarray], cited: Dict[str, Optional[str]],
+                      answer: str, session: Optional[Dict] = None):
+        """
+        Cache a generated answer, if the query embedding is known
         
-        follow_ups = {
-            'Transportation': 'Would you like to know about weekend shuttle schedules?',
-            'Academic Programs': 'Would you like to see the course curriculum details?',
-            'Student Life': 'Want to know about upcoming student activities?',
-            'Housing': 'Need help with the housing application process?',
-            'Admissions': 'Would you like information about application deadlines?'
+        Answers to follow-ups depend on the conversation's history, so they
+        are not cached for other sessions asking the same words.
+        """
+        if query_embedding is not None and not self._has_history(session):
+            self.answer_cache.store(query_embedding, cited, answer, versions=cited)
+    
+    def _cited_documents(self, prompt_context: Dict) -> Dict[str, Optional[str]]:
+        """
+        Documents an answer is grounded on (the prompt contexts), by ID, with their versions
+        
+        Versions are the manifest's content hashes, so answers cached by any
+        process stop matching once another process or the loader re-indexes
+        or deletes a document they cite.
+        """
+        doc_ids = [ctx['id'] for ctx in prompt_context['contexts']]
+        hashes = self.manifest.doc_hashes(doc_ids) if self.answer_cache.enabled else {}
+        return {doc_id: hashes.get(doc_id) for doc_id in doc_ids}
+    
+    def _usage(self, prompt_context: Dict, completion_usage=None, cached: bool = False) -> Dict:
+        """Per-request token accounting reported alongside the answer (and counted in metrics)"""
+        self.metrics.inc('rag_tokens_total', "Tokens sent to or generated by the chat model",
+                         prompt_context['tokens'], type='context')
+        if completion_usage:
+            self.metrics.inc('rag_tokens_total', "Tokens sent to or generated by the chat model",
+                             completion_usage.prompt_tokens, type='prompt')
+            self.metrics.inc('rag_tokens_total', "Tokens sent to or generated by the chat model",
+                             completion_usage.completion_tokens, type='completion')
+        return {
+            'context_tokens': prompt_context['tokens'],
+            'contexts_used': len(prompt_context['contexts']),
+            'prompt_tokens': completion_usage.prompt_tokens if completion_usage else 0,
+            'completion_tokens': completion_usage.completion_tokens if completion_usage else 0,
+            'cached': cached
         }
+    
+    def _build_messages(self, user_query: str, prompt_context: Dict,
+                        session: Optional[Dict] = None) -> List[Dict]:
+        """
+        Build the chat completion messages for a query and its budgeted context
+        
+        With a session, its rolling summary is added to the system prompt and
+        its recent grounded turns precede the query.
+        """
+        context_str = prompt_context['text']
+        summary = session['summary'] if session else ''
+        conversation = f"\nEarlier in this conversation:\n{summary}\n" if summary else ''
         
-        return follow_ups.get(category, 'Is there anything else you\'d like to know?')
+        # Create strict system prompt
+        system_prompt = f"""You are the CMU-Africa Campus Assistant. Follow these STRICT rules:
+
+1. RAG-FIRST: Only use the provided context. No hallucination allowed.
+2. If context is insufficient, say: "I don't have verified information about that right now."
+3. Be concise: 1-5 short paragraphs or bullet points.
+4. Be factual and accurate.
+5. Be friendly and student-focused.
+
+Context:
+{context_str}
+{conversation}
+Respond with ONLY the answer text. Do not add any extra formatting or metadata."""
+
+        messages = [{"role": "system", "content": system_prompt}]
+        for turn in session['turns'] if session else []:
+            # Turns that ended in a fallback or error carry nothing worth repeating
+            if turn['assistant']:
+                messages.append({"role": "user", "content": turn['user']})
+                messages.append({"role": "assistant", "content": turn['assistant']})
+        messages.append({"role": "user", "content": user_query})
+        return messages
+    
+    def _build_response_metadata(self, user_query: str, contexts: List[Dict],
+                                 user_profile: Optional[Dict] = None) -> Dict:
+        """Build the sources, suggestions and follow-up for a set of contexts"""
+        # Format sources (top 3)
+        sources = []
+        for i, ctx in enumerate(contexts[:3]):
+            sources.append({
+                'id': ctx.get('id', f'source_{i+1}'),
+                'title': ctx['title'],
+                'snippet': self._extract_snippet(ctx['content'], 25),
+                'category': ctx['category']
+            })
+        
+        # Generate suggestions
+        suggestions = self._generate_suggestions(user_query, contexts, user_profile)
+        
+        # Generate follow-up
+        follow_up = self._generate_follow_up(user_query, contexts)
+        
+        return {
+            'sources': sources,
+            'suggestions': suggestions,
+            'follow_up': follow_up
+        }
+    
+    def _record_outcome(self, outcome: str):
+        """Count a chat response by outcome: answered, cached, fallback or error"""
+        self.metrics.inc('rag_responses_total', "Chat responses by outcome", outcome=outcome)
+    
+    def _record_retrieval_path(self, path: str):
+        """Count retrievals served by the keyword fast path vs hybrid search"""
+        self.metrics.inc('rag_retrievals_total', "Retrievals by path", path=path)
+    
+    def _collect_metrics(self):
+        """Cache and index samples for the metrics exposition"""
+        for name, stats in (('embedding', self.embedding_cache.stats()),
+                            ('answer', self.answer_cache.stats())):
+            labels = (('cache', name),)
+            yield ('rag_cache_hits_total', 'counter', "Cache lookups that hit", labels, stats['hits'])
+            yield ('rag_cache_misses_total', 'counter', "Cache lookups that missed", labels,
+                   stats['misses'])
+            yield ('rag_cache_hit_ratio', 'gauge', "Cache hit rate since start", labels,
+                   stats['hit_rate'])
+            yield ('rag_cache_entries', 'gauge', "Entries held in memory", labels, stats['size'])
+        yield ('rag_lexical_index_chunks', 'gauge', "Chunks in the BM25 index", (),
+               len(self.lexical_index))
+        yield ('rag_inflight_queries', 'gauge', "Distinct queries being answered", (),
+               len(self._single_flight))
+        yield ('rag_precomputed_answers', 'gauge', "Canned prompts with an up-to-date answer", (),
+               self.precomputed_answers.stats()['fresh'])
+        sessions = self.sessions.stats()
+        yield ('rag_sessions', 'gauge', "Conversation sessions held", (), sessions['sessions'])
+        yield ('rag_session_memory_bytes', 'gauge', "Serialized size of the held sessions", (),
+               sessions['bytes'])
+    
+    def _build_response(self, answer: str, user_query: str, contexts: List[Dict],
+                        user_profile: Optional[Dict] = None,
+                        usage: Optional[Dict] = None) -> Dict:
+        """Assemble the structured JSON response around a generated answer"""
+        return {
+            'answer': answer,
+            **self._build_response_metadata(user_query, contexts, user_profile),
+            'usage': usage
+        }
     
     def query(self, user_query: str, user_profile: Optional[Dict] = None, 
-              session_id: Optional[str] = None) -> Dict:
+              session_id: Optional[str] = None,
+              categories: Optional[List[str]] = None) -> Dict:
         """
         Main query method - retrieve context and generate structured JSON response
         
@@ -210,89 +1280,509 @@ class EnhancedRAGPipeline:
                 "suggestions": List[Dict],
                 "follow_up": Optional[str]
             }
+        
+        With a session_id, follow-up questions are answered in the context of
+        the session's earlier turns. categories restricts the search to those
+        categories' documents; the profile's program and year filter and
+        boost documents meant for them.
         """
+        started = time.perf_counter()
+        conversation = self._conversation(user_query, session_id)
+        try:
+            response = self._query(user_query, user_profile, conversation, categories)
+            self._remember_turn(conversation, user_query, response)
+            return response
+        finally:
+            self.metrics.observe('total', time.perf_counter() - started)
+    
+    def _query(self, user_query: str, user_profile: Optional[Dict], conversation: Dict,
+               categories: Optional[List[str]] = None) -> Dict:
+        """Answer one query (see query()), returning the fallback or error response on failure"""
         try:
             # Retrieve relevant context
-            contexts = self.retrieve_context(user_query, top_k=5)
+            contexts, query_embedding = self._retrieve(conversation['query'], top_k=5,
+                                                       user_profile=user_profile,
+                                                       categories=categories)
             
             # Check if we have sufficient context
-            if not contexts or (contexts and contexts[0]['score'] < 0.5):
+            if not self._has_sufficient_context(contexts):
+                self._record_outcome('fallback')
                 return self._generate_fallback_response(user_query)
             
-            # Prepare context for LLM
-            context_str = "\n\n".join([
-                f"[{ctx['category']}] {ctx['title']}:\n{ctx['content']}"
-                for ctx in contexts[:3]
-            ])
+            # Reuse an answer to a near-identical question over the same documents
+            with self.metrics.span('context_build'):
+                prompt_context = self.context_builder.build(conversation['query'], contexts)
+            cited = self._cited_documents(prompt_context)
+            cached = self._lookup_answer(query_embedding, cited, conversation['session'])
+            if cached is not None:
+                self._record_outcome('cached')
+                with self.metrics.span('response_assembly'):
+                    return self._build_response(cached['answer'], user_query, contexts,
+                                                user_profile,
+                                                usage=self._usage(prompt_context, cached=True))
             
-            # Create strict system prompt
-            system_prompt = f"""You are the CMU-Africa Campus Assistant. Follow these STRICT rules:
-
-1. RAG-FIRST: Only use the provided context. No hallucination allowed.
-2. If context is insufficient, say: "I don't have verified information about that right now."
-3. Be concise: 1-5 short paragraphs or bullet points.
-4. Be factual and accurate.
-5. Be friendly and student-focused.
-
-Context:
-{context_str}
-
-Respond with ONLY the answer text. Do not add any extra formatting or metadata."""
-
             # Generate response
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_query}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
+            with self.metrics.span('llm'):
+                response = self.client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=self._build_messages(user_query, prompt_context,
+                                                  conversation['session']),
+                    temperature=0.3,
+                    max_tokens=self.max_answer_tokens
+                )
             
             answer = response.choices[0].message.content.strip()
+            self._store_answer(query_embedding, cited, answer, conversation['session'])
             
-            # Format sources (top 3)
-            sources = []
-            for i, ctx in enumerate(contexts[:3]):
-                sources.append({
-                    'id': ctx.get('id', f'source_{i+1}'),
-                    'title': ctx['title'],
-                    'snippet': self._extract_snippet(ctx['content'], 25),
-                    'category': ctx['category']
-                })
-            
-            # Generate suggestions
-            suggestions = self._generate_suggestions(user_query, contexts, user_profile)
-            
-            # Generate follow-up
-            follow_up = self._generate_follow_up(user_query, contexts)
-            
-            return {
-                'answer': answer,
-                'sources': sources,
-                'suggestions': suggestions,
-                'follow_up': follow_up
-            }
+            self._record_outcome('answered')
+            with self.metrics.span('response_assembly'):
+                return self._build_response(answer, user_query, contexts, user_profile,
+                                            usage=self._usage(prompt_context, response.usage))
             
         except Exception as e:
+            self._record_outcome('error')
             return self._generate_error_response(str(e))
     
+    async def aquery(self, user_query: str, user_profile: Optional[Dict] = None,
+                     session_id: Optional[str] = None,
+                     categories: Optional[List[str]] = None) -> Dict:
+        """
+        Async counterpart of query() used by the API endpoints
+        
+        Stages past their deadline (stage_timeouts) yield the fallback
+        response, and concurrent identical questions from the same kind of
+        profile (and conversation) share one execution.
+        """
+        started = time.perf_counter()
+        # Session stores may be on disk (SQLite), so they are read and written in a worker thread
+        conversation = await asyncio.to_thread(self._conversation, user_query, session_id)
+        try:
+            response = await self._aprecomputed(user_query, user_profile, categories)
+            if response is not None:
+                self._record_outcome('precomputed')
+            elif not self.coalesce_queries:
+                response = await self._aquery(user_query, user_profile, conversation, categories)
+            else:
+                response, shared = await self._single_flight.do(
+                    self._coalesce_key(user_query, user_profile, conversation['session'],
+                                       categories),
+                    lambda: self._aquery(user_query, user_profile, conversation, categories)
+                )
+                if shared:
+                    self.metrics.inc('rag_coalesced_queries_total',
+                                     "Queries answered by an identical in-flight query")
+            await asyncio.to_thread(self._remember_turn, conversation, user_query, response)
+            return response
+        finally:
+            self.metrics.observe('total', time.perf_counter() - started)
+    
+    def _coalesce_key(self, user_query: str, user_profile: Optional[Dict],
+                      session: Optional[Dict] = None,
+                      categories: Optional[List[str]] = None) -> str:
+        """Questions differing only in case or spacing, with equal profiles, history and scope, get one answer"""
+        history = [session['summary'], session['turns']] if session else None
+        return json.dumps([' '.join(user_query.lower().split()), user_profile or {}, history,
+                           sorted(categories or [])], sort_keys=True, default=str)
+    
+    async def _aprecomputed(self, user_query: str, user_profile: Optional[Dict],
+                            categories: Optional[List[str]]) -> Optional[Dict]:
+        """
+        Precomputed response to a canned prompt, if one applies to the request
+        
+        Those were retrieved from the whole index for no particular profile,
+        so requests restricted to categories, or by program or year, skip them.
+        Category versions older than the store's versions_ttl are re-read from
+        the manifest first, so changes indexed by other processes are seen.
+        """
+        store = self.precomputed_answers
+        if categories or any(self._profile_audience(user_profile)) or user_query not in store:
+            return None
+        if store.versions_expired():
+            store.set_versions(await asyncio.to_thread(self.manifest.category_versions))
+        return store.get(user_query)
+    
+    def _conversation(self, user_query: str, session_id: Optional[str]) -> Dict:
+        """
+        Conversation state of a query: {'session_id', 'session', 'topic', 'query'}
+        
+        A follow-up such as "what about weekends?" is retrieved together with
+        the question it continues (its topic); 'query' is the text to retrieve
+        with, and the user's own question otherwise.
+        """
+        session = self.sessions.get(session_id) if session_id else None
+        topic = conversation_topic(user_query, session)
+        if topic == user_query:
+            retrieval_query = user_query
+        else:
+            retrieval_query = f"{topic} {user_query}"
+            self.metrics.inc('rag_query_rewrites_total',
+                             "Follow-up queries retrieved with the question they continue")
+        return {'session_id': session_id, 'session': session, 'topic': topic,
+                'query': retrieval_query}
+    
+    def _remember_turn(self, conversation: Dict, user_query: str, response: Dict):
+        """Record a turn in the query's session; only grounded answers are kept as replies"""
+        if conversation['session_id']:
+            answer = response['answer'] if response.get('sources') else ''
+            self.sessions.append(conversation['session_id'], user_query, answer,
+                                 conversation['topic'])
+    
+    async def _aquery(self, user_query: str, user_profile: Optional[Dict],
+                      conversation: Dict, categories: Optional[List[str]] = None) -> Dict:
+        """One execution of aquery()"""
+        try:
+            # Retrieve relevant context
+            contexts, query_embedding = await self._aretrieve(conversation['query'], top_k=5,
+                                                              user_profile=user_profile,
+                                                              categories=categories)
+            return await self._aanswer(user_query, contexts, query_embedding, user_profile,
+                                       conversation=conversation)
+        except StageTimeout:
+            self._record_outcome('fallback')
+            return self._generate_fallback_response(user_query)
+        except Exception as e:
+            self._record_outcome('error')
+            return self._generate_error_response(str(e))
+    
+    async def _aanswer(self, user_query: str, contexts: List[Dict],
+                       query_embedding: Optional[np.ndarray],
+                       user_profile: Optional[Dict] = None,
+                       llm_slots: Optional[asyncio.Semaphore] = None,
+                       use_answer_cache: bool = True,
+                       conversation: Optional[Dict] = None) -> Dict:
+        """
+        Answer a query from its retrieved contexts: fallback, cached or generated
+        
+        llm_slots, when given, bounds the chat completions in flight. With a
+        conversation (see _conversation()), contexts are selected for its
+        retrieval query and the session's history goes into the prompt.
+        """
+        retrieval_query = conversation['query'] if conversation else user_query
+        session = conversation['session'] if conversation else None
+        
+        # Check if we have sufficient context
+        if not self._has_sufficient_context(contexts):
+            self._record_outcome('fallback')
+            return self._generate_fallback_response(user_query)
+        
+        # Reuse an answer to a near-identical question over the same documents
+        with self.metrics.span('context_build'):
+            prompt_context = self.context_builder.build(retrieval_query, contexts)
+        cited = self._cited_documents(prompt_context)
+        cached = (self._lookup_answer(query_embedding, cited, session)
+                  if use_answer_cache else None)
+        if cached is not None:
+            self._record_outcome('cached')
+            with self.metrics.span('response_assembly'):
+                return self._build_response(cached['answer'], user_query, contexts,
+                                            user_profile,
+                                            usage=self._usage(prompt_context, cached=True))
+        
+        # Generate response
+        async with llm_slots or contextlib.nullcontext():
+            async with self._deadline('llm'):
+                with self.metrics.span('llm'):
+                    response = await self._aopenai(
+                        self.async_client.chat.completions,
+                        model="gpt-4-turbo-preview",
+                        messages=self._build_messages(user_query, prompt_context, session),
+                        temperature=0.3,
+                        max_tokens=self.max_answer_tokens
+                    )
+        
+        answer = response.choices[0].message.content.strip()
+        self._store_answer(query_embedding, cited, answer, session)
+        
+        self._record_outcome('answered')
+        with self.metrics.span('response_assembly'):
+            return self._build_response(answer, user_query, contexts, user_profile,
+                                        usage=self._usage(prompt_context, response.usage))
+    
+    async def _aretrieve_batch(self, searches: List[Dict], top_k: int) -> List:
+        """
+        Batch counterpart of _aretrieve: one embeddings request for all queries
+        
+        searches are dicts of _aretrieve() arguments (user_query, user_profile,
+        categories). Returns a (contexts, query_embedding) pair per search, or
+        the exception raised while retrieving it.
+        """
+        # Searches differing only in case or spacing (as the embedding cache keys
+        # them), for the same profile and categories, are run once
+        distinct: Dict[str, Dict] = {}
+        keys = []
+        for search in searches:
+            key = json.dumps([EmbeddingCache.normalize(search['user_query']),
+                              search.get('user_profile') or {},
+                              sorted(search.get('categories') or [])],
+                             sort_keys=True, default=str)
+            distinct.setdefault(key, search)
+            keys.append(key)
+        searches = list(distinct.values())
+        
+        fetch_k = self._candidate_count(top_k)
+        user_queries = [search['user_query'] for search in searches]
+        scopes = [self._route(search['user_query'], search.get('categories'))[0]
+                  for search in searches]
+        
+        def search_all() -> List[List[Dict]]:
+            matches = []
+            for user_query, scope in zip(user_queries, scopes):
+                with self.metrics.span('lexical_search'):
+                    matches.append(self._lexical_search(user_query, fetch_k, scope))
+            return matches
+        
+        lexical_matches = await asyncio.to_thread(search_all)
+        keyword = [self._is_keyword_query(user_query, matches)
+                   for user_query, matches in zip(user_queries, lexical_matches)]
+        
+        # Cached embeddings are reused; the rest (duplicates once) share a request
+        embeddings: Dict[str, Optional[np.ndarray]] = {}
+        missing = {}
+        for user_query, is_keyword in zip(user_queries, keyword):
+            text = EmbeddingCache.normalize(user_query)
+            if text in embeddings or text in missing:
+                continue
+            cached = await self.embedding_cache.aget(user_query, self.embedding_space)
+            if cached is not None or is_keyword:
+                embeddings[text] = cached
+            else:
+                missing[text] = user_query
+        
+        embedding_error = None
+        if missing:
+            try:
+                async with self._deadline('embedding'):
+                    with self.metrics.span('embedding'):
+                        batches = await asyncio.gather(*(
+                            self.acreate_embeddings(batch)
+                            for batch in self._iter_batches(list(missing.values()),
+                                                            self.embed_batch_size)
+                        ))
+                vectors = [vector for batch in batches for vector in batch]
+                for (text, user_query), vector in zip(missing.items(), vectors):
+                    self.embedding_cache.set(user_query, self.embedding_space, vector)
+                    embeddings[text] = vector
+            except Exception as e:
+                embedding_error = e
+        
+        async def retrieve(search: Dict, matches: List[Dict], is_keyword: bool):
+            query_embedding = embeddings.get(EmbeddingCache.normalize(search['user_query']))
+            if query_embedding is None and not is_keyword:
+                raise embedding_error
+            return await self._aretrieve(search['user_query'], top_k,
+                                         user_profile=search.get('user_profile'),
+                                         categories=search.get('categories'),
+                                         query_embedding=query_embedding,
+                                         lexical_matches=matches)
+        
+        # Vector store queries run concurrently in worker threads
+        results = dict(zip(distinct, await asyncio.gather(*(
+            retrieve(search, matches, is_keyword)
+            for search, matches, is_keyword in zip(searches, lexical_matches, keyword)
+        ), return_exceptions=True)))
+        return [results[key] for key in keys]
+    
+    async def aquery_batch(self, queries: List[Dict], llm_concurrency: int = 4) -> List[Dict]:
+        """
+        Answer several queries together, as aquery() would one at a time
+        
+        queries are dicts of aquery() arguments (user_query, user_profile,
+        session_id, categories). Returns one {'response', 'error'} per query, in order; a
+        failed query gets the error response and its error message without
+        failing the rest of the batch.
+        """
+        started = time.perf_counter()
+        llm_slots = asyncio.Semaphore(llm_concurrency)
+        conversations = await asyncio.to_thread(
+            lambda: [self._conversation(query['user_query'], query.get('session_id'))
+                     for query in queries]
+        )
+        precomputed = [await self._aprecomputed(query['user_query'], query.get('user_profile'),
+                                                query.get('categories'))
+                       for query in queries]
+        pending = [{**query, 'user_query': conversation['query']}
+                   for query, conversation, response in zip(queries, conversations, precomputed)
+                   if response is None]
+        retrieved = iter(await self._aretrieve_batch(pending, top_k=5) if pending else [])
+        
+        async def answer(query: Dict, conversation: Dict, precomputed_response: Optional[Dict],
+                         retrieval) -> Dict:
+            try:
+                if precomputed_response is not None:
+                    self._record_outcome('precomputed')
+                    return {'response': precomputed_response, 'error': None}
+                if isinstance(retrieval, BaseException):
+                    raise retrieval
+                contexts, query_embedding = retrieval
+                response = await self._aanswer(query['user_query'], contexts, query_embedding,
+                                               query.get('user_profile'), llm_slots,
+                                               conversation=conversation)
+                return {'response': response, 'error': None}
+            except StageTimeout:
+                self._record_outcome('fallback')
+                return {'response': self._generate_fallback_response(query['user_query']),
+                        'error': None}
+            except Exception as e:
+                self._record_outcome('error')
+                return {'response': self._generate_error_response(str(e)), 'error': str(e)}
+            finally:
+                # Each query's latency as its caller sees it, from the start of the batch
+                self.metrics.observe('total', time.perf_counter() - started)
+        
+        results = await asyncio.gather(*(
+            answer(query, conversation, response, next(retrieved) if response is None else None)
+            for query, conversation, response in zip(queries, conversations, precomputed)
+        ))
+        
+        def remember_all():
+            # Turns are recorded in request order once the whole batch is answered
+            for query, conversation, result in zip(queries, conversations, results):
+                self._remember_turn(conversation, query['user_query'], result['response'])
+        
+        await asyncio.to_thread(remember_all)
+        return results
+    
+    async def astream_query(self, user_query: str, user_profile: Optional[Dict] = None,
+                            session_id: Optional[str] = None,
+                            categories: Optional[List[str]] = None
+                            ) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Streaming counterpart of aquery()
+        
+        Yields (event, data) pairs: one "metadata" event with sources, suggestions
+        and follow_up as soon as retrieval finishes, then "token" events with
+        answer deltas, and a final "done" event carrying the full answer.
+        """
+        started = time.perf_counter()
+        conversation = await asyncio.to_thread(self._conversation, user_query, session_id)
+        sources = []
+        try:
+            async for event, data in self._astream_events(user_query, user_profile, conversation,
+                                                          categories):
+                if event == 'metadata':
+                    sources = data['sources']
+                elif event == 'done':
+                    await asyncio.to_thread(self._remember_turn, conversation, user_query,
+                                            {'answer': data['answer'], 'sources': sources})
+                yield event, data
+        finally:
+            self.metrics.observe('total', time.perf_counter() - started)
+    
+    async def _astream_events(self, user_query: str, user_profile: Optional[Dict],
+                              conversation: Dict, categories: Optional[List[str]] = None
+                              ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Events of astream_query()"""
+        precomputed = await self._aprecomputed(user_query, user_profile, categories)
+        if precomputed is not None:
+            self._record_outcome('precomputed')
+            async for event in self._astream_static_response(precomputed):
+                yield event
+            return
+        
+        try:
+            contexts, query_embedding = await self._aretrieve(conversation['query'], top_k=5,
+                                                              user_profile=user_profile,
+                                                              categories=categories)
+        except StageTimeout:
+            contexts, query_embedding = [], None
+        except Exception as e:
+            self._record_outcome('error')
+            response = self._generate_error_response(str(e))
+            async for event in self._astream_static_response(response):
+                yield event
+            return
+        
+        if not self._has_sufficient_context(contexts):
+            self._record_outcome('fallback')
+            response = self._generate_fallback_response(user_query)
+            async for event in self._astream_static_response(response):
+                yield event
+            return
+        
+        # Sources, suggestions and follow-up don't depend on the LLM output
+        with self.metrics.span('response_assembly'):
+            metadata = self._build_response_metadata(user_query, contexts, user_profile)
+        yield 'metadata', metadata
+        
+        with self.metrics.span('context_build'):
+            prompt_context = self.context_builder.build(conversation['query'], contexts)
+        cited = self._cited_documents(prompt_context)
+        cached = self._lookup_answer(query_embedding, cited, conversation['session'])
+        if cached is not None:
+            self._record_outcome('cached')
+            yield 'token', {'text': cached['answer']}
+            yield 'done', {
+                'answer': cached['answer'],
+                'usage': self._usage(prompt_context, cached=True)
+            }
+            return
+        
+        answer_parts = []
+        completion_usage = None
+        started = time.perf_counter()
+        try:
+            # The deadline covers the wait for the first token; once tokens flow it is lifted
+            async with self._deadline('llm') as first_token_deadline:
+                with self.metrics.span('llm'):
+                    stream = await self._aopenai(
+                        self.async_client.chat.completions,
+                        model="gpt-4-turbo-preview",
+                        messages=self._build_messages(user_query, prompt_context,
+                                                      conversation['session']),
+                        temperature=0.3,
+                        max_tokens=self.max_answer_tokens,
+                        stream=True,
+                        # The final chunk (with no choices) then carries token usage
+                        stream_options={"include_usage": True}
+                    )
+                    # Closing the stream (also when the client goes away) frees its slot
+                    async with contextlib.aclosing(stream):
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                completion_usage = chunk.usage or completion_usage
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                if not answer_parts:
+                                    first_token_deadline.reschedule(None)
+                                    self.metrics.observe('llm_first_token',
+                                                         time.perf_counter() - started)
+                                answer_parts.append(delta)
+                                yield 'token', {'text': delta}
+        except StageTimeout:
+            self._record_outcome('fallback')
+            answer = self._generate_fallback_response(user_query)['answer']
+            yield 'token', {'text': answer}
+            yield 'done', {'answer': answer, 'usage': None}
+            return
+        except Exception as e:
+            self._record_outcome('error')
+            yield 'error', {
+                'message': self._generate_error_response(str(e))['answer']
+            }
+            return
+        
+        answer = ''.join(answer_parts).strip()
+        self._store_answer(query_embedding, cited, answer, conversation['session'])
+        self._record_outcome('answered')
+        yield 'done', {'answer': answer, 'usage': self._usage(prompt_context, completion_usage)}
+    
+    async def _astream_static_response(self, response: Dict) -> AsyncIterator[Tuple[str, Dict]]:
+        """Stream an already-built response as metadata, one token and done events"""
+        yield 'metadata', {
+            'sources': response['sources'],
+            'suggestions': response['suggestions'],
+            'follow_up': response['follow_up']
+        }
+        yield 'token', {'text': response['answer']}
+        yield 'done', {'answer': response['answer'], 'usage': response.get('usage')}
+    
     def _generate_fallback_response(self, query: str) -> Dict:
         """Generate fallback response when context is insufficient"""
         return {
             'answer': "I don't have verified information about that right now. Would you like me to:\n\n• Search the student portal\n• Contact the admin office\n• Save this as a follow-up question\n\nPlease let me know how I can help!",
             'sources': [],
-            'suggestions': [
-                {'id': 'portal_search', 'label': '🔍 Search Portal', 
-                 'prompt': 'Help me search the student portal'},
-                {'id': 'contact_admin', 'label': '📞 Contact Admin', 
-                 'prompt': 'How do I contact the administration?'},
-                {'id': 'general_info', 'label': 'ℹ️ General Info', 
-                 'prompt': 'Tell me about CMU-Africa campus'},
-                {'id': 'programs', 'label': '🎓 Programs', 
-                 'prompt': 'What programs does CMU-Africa offer?'}
-            ],
+            'suggestions': list(map(dict, FALLBACK_SUGGESTIONS)),
             'follow_up': 'What would you like to know about CMU-Africa?'
         }
     
@@ -313,18 +1803,124 @@ Respond with ONLY the answer text. Do not add any extra formatting or metadata."
     def get_index_stats(self) -> Dict:
         """Get statistics about the vector index"""
         try:
-            stats = self.index.describe_index_stats()
-            # Handle both dict and object response
-            if hasattr(stats, 'total_vector_count'):
-                total = stats.total_vector_count
-                dim = stats.dimension if hasattr(stats, 'dimension') else self.dimension
-            else:
-                total = stats.get('total_vector_count', 0)
-                dim = stats.get('dimension', self.dimension)
+            stats = self.vector_store.describe_stats()
+            return self._parse_index_stats(stats)
+        except Exception as e:
+            return {'error': str(e)}
+    
+    async def aget_index_stats(self) -> Dict:
+        """Get index statistics without blocking the event loop"""
+        try:
+            stats = await asyncio.to_thread(self.vector_store.describe_stats)
+            return self._parse_index_stats(stats)
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def canned_prompts(self) -> Dict[str, Optional[str]]:
+        """
+        Every suggestion pill and follow-up prompt the assistant hands out
+        
+        Users send these verbatim, so they make up much of the traffic. Maps
+        each prompt to the category it is offered for (None for general ones).
+        """
+        prompts: Dict[str, Optional[str]] = {}
+        for category, templates in SUGGESTION_TEMPLATES.items():
+            prompts.update((suggestion['prompt'], category) for suggestion in templates)
+        prompts.update((follow_up, category) for category, follow_up in FOLLOW_UPS.items())
+        for suggestion in GENERAL_SUGGESTIONS + FALLBACK_SUGGESTIONS:
+            prompts.setdefault(suggestion['prompt'], None)
+        return prompts
+    
+    async def _acompute_answer(self, prompt: str) -> Tuple[Dict, set]:
+        """Answer a prompt afresh, returning (response, categories of its contexts)"""
+        contexts, query_embedding = await self._aretrieve(prompt, top_k=5)
+        response = await self._aanswer(prompt, contexts, query_embedding, use_answer_cache=False)
+        if not self._has_sufficient_context(contexts):
+            return response, set()
+        return response, {ctx['category'] for ctx in contexts}
+    
+    async def arefresh_precomputed_answers(self, force: bool = False) -> Dict:
+        """
+        Recompute canned-prompt responses whose documents changed since they were built
+        
+        Category versions come from the manifest, so changes indexed by other
+        processes count too, and responses other processes already saved are
+        adopted rather than recomputed. force recomputes every prompt.
+        """
+        async with self._precompute_lock:
+            store = self.precomputed_answers
+            await asyncio.to_thread(store.reload)
+            store.set_versions(await asyncio.to_thread(self.manifest.category_versions))
+            prompts = self.canned_prompts()
+            stale = list(prompts) if force else store.stale(prompts)
+            
+            semaphore = asyncio.Semaphore(self.precompute_concurrency)
+            failed = []
             
+            async def compute(prompt: str):
+                async with semaphore:
+                    try:
+                        response, categories = await self._acompute_answer(prompt)
+                    except Exception:
+                        failed.append(prompt)
+                        return
+                # A pill's answer also goes stale when its own category changes
+                if categories and prompts[prompt]:
+                    categories.add(prompts[prompt])
+                if response.get('usage'):
+                    response['usage'].update(prompt_tokens=0, completion_tokens=0, cached=True)
+                store.put(prompt, response, categories)
+            
+            with background():
+                await asyncio.gather(*(compute(prompt) for prompt in stale))
+            await asyncio.to_thread(store.flush)
             return {
-                'total_vectors': total,
-                'dimension': dim
+                'prompts': len(prompts),
+                'refreshed': len(stale) - len(failed),
+                'failed': len(failed)
             }
-        except Exception as e:
-            return {'error': str(e)}
+    
+    async def awarm_up(self) -> Dict:
+        """
+        Open upstream connections and prime the query caches before traffic arrives
+        
+        Describes the index, embeds the canned prompts in one request and
+        runs a vector query, so the first requests pay neither connection
+        setup nor the embedding of the questions sent most often.
+        """
+        started = time.perf_counter()
+        await asyncio.to_thread(self.vector_store.describe_stats)
+        
+        prompts = list(self.canned_prompts())
+        with background():
+            embeddings = await self.acreate_embeddings(prompts)
+        for prompt, embedding in zip(prompts, embeddings):
+            self.embedding_cache.set(prompt, self.embedding_space, embedding)
+        await asyncio.to_thread(self.vector_store.query, embeddings[0], 1)
+        
+        return {
+            'embeddings_primed': len(prompts),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def _parse_index_stats(self, stats) -> Dict:
+        """Normalize a describe_index_stats response"""
+        # Handle both dict and object response
+        if hasattr(stats, 'total_vector_count'):
+            total = stats.total_vector_count
+            dim = stats.dimension if hasattr(stats, 'dimension') else self.dimension
+        else:
+            total = stats.get('total_vector_count', 0)
+            dim = stats.get('dimension', self.dimension)
+        
+        return {
+            'total_vectors': total,
+            'dimension': dim,
+            'embedding_cache': self.embedding_cache.stats(),
+            'answer_cache': self.answer_cache.stats(),
+            'lexical_index': self.lexical_index.stats(),
+            'precomputed_answers': self.precomputed_answers.stats(),
+            'sessions': self.sessions.stats(),
+            'manifest': self.manifest.stats(),
+            'rate_limits': self.rate_limiter.stats()
+        }
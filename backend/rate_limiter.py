@@ -0,0 +1,348 @@
+"""
+OpenAI rate-limit scheduling for the CMU-Africa Campus Assistant
+Admits upstream requests against per-model request and token budgets learned
+from the API's x-ratelimit-* headers, serves chat traffic ahead of background
+work (indexing, precomputation), and adapts concurrency to 429s and latency
+"""
+import asyncio
+import contextlib
+import re
+import time
+from contextvars import ContextVar
+from typing import Dict, Mapping, Optional
+
+from metrics import Metrics
+
+# Priority lanes, highest first; requests run in the lane of their context
+LANES = ('interactive', 'background')
+
+_lane: ContextVar[str] = ContextVar('openai_lane', default='interactive')
+
+# "6m0s", "1.5s", "20ms" as used by the x-ratelimit-reset-* headers
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+# Weight of each new latency in a model's moving average; latencies under
+# LATENCY_SPIKE_FLOOR seconds are never spikes, however small the average
+LATENCY_SMOOTHING = 0.1
+LATENCY_SPIKE_FLOOR = 1.0
+
+
+@contextlib.contextmanager
+def background():
+    """Run the upstream requests made in this block (and tasks it starts) in the background lane"""
+    token = _lane.set('background')
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in an x-ratelimit-reset-* duration, or None when absent or malformed"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class _Budget:
+    """Continuously refilled allowance of requests or tokens per minute"""
+
+    def __init__(self, per_minute: Optional[float]):
+        self.per_minute = per_minute
+        self.available = per_minute or 0.0
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.per_minute:
+            self.available = min(self.per_minute,
+                                 self.available + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def delay(self, amount: float, reserve: float) -> float:
+        """Seconds until amount can be spent leaving a reserve share of the budget (0: now)"""
+        if not self.per_minute:
+            return 0.0
+        # More than the budget can hold is admitted once it is full, so nothing waits forever
+        needed = min(amount, self.per_minute * (1.0 - reserve)) + self.per_minute * reserve
+        if self.available >= needed:
+            return 0.0
+        return (needed - self.available) * 60.0 / self.per_minute
+
+    def observe(self, limit: Optional[float], remaining: Optional[float]):
+        """Adopt the limit and remaining allowance the API reported"""
+        if limit:
+            if not self.per_minute:
+                self.available = limit
+            self.per_minute = limit
+        if remaining is not None and self.per_minute:
+            # The API counts requests this process doesn't know about (other workers)
+            self.available = min(self.available, remaining)
+
+
+class _ModelState:
+    """Budgets, concurrency limit and queues of one model"""
+
+    def __init__(self, concurrency: float, requests_per_minute: Optional[float],
+                 tokens_per_minute: Optional[float]):
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.requests = _Budget(requests_per_minute)
+        self.tokens = _Budget(tokens_per_minute)
+        self.waiting = dict.fromkeys(LANES, 0)
+        self.paused_until = 0.0
+        self.latency: Optional[float] = None
+        self.decreased_at = 0.0
+        self.condition = asyncio.Condition()
+
+
+class Slot:
+    """An admitted request; report the response headers to keep the budgets current"""
+
+    def __init__(self, scheduler: 'RateLimitScheduler', model: str):
+        self._scheduler = scheduler
+        self._model = model
+
+    def observe_headers(self, headers: Mapping[str, str]):
+        self._scheduler.observe_headers(self._model, headers)
+
+
+class HeldStream:
+    """
+    A streaming response that keeps its request's slot until it ends or is closed
+
+    Tokens are generated after the response headers arrive, so the stream
+    counts against the concurrency limit, and towards the latency the limit
+    adapts to, until it is read to its end, fails or is closed.
+    """
+
+    def __init__(self, stream, slot_exit: contextlib.AsyncExitStack):
+        self._stream = stream
+        self._slot_exit = slot_exit
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            await self._slot_exit.aclose()
+            raise
+        except BaseException as e:
+            await self._slot_exit.__aexit__(type(e), e, e.__traceback__)
+            raise
+
+    async def aclose(self):
+        """Close the upstream response and release the slot (no-op once the stream ended)"""
+        close = getattr(self._stream, 'close', None) or getattr(self._stream, 'aclose', None)
+        try:
+            if close is not None:
+                await close()
+        finally:
+            await self._slot_exit.aclose()
+
+
+class RateLimitScheduler:
+    """
+    Admission control for upstream model requests (one event loop per instance)
+
+    Each model gets request and token budgets per minute, seeded from
+    requests_per_minute/tokens_per_minute when given and otherwise learned
+    from the first response headers; until then only concurrency is limited.
+    Background-lane requests leave background_reserve of every budget and
+    of the concurrency limit to interactive requests, and wait while any
+    interactive request is queued. The concurrency limit grows by one per
+    limit's worth of requests that complete normally and halves, at most
+    once per average latency, on a 429 or a request slower than
+    latency_spike times the average.
+    """
+
+    def __init__(self, max_concurrency: int = 32, min_concurrency: int = 1,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 background_reserve: float = 0.2, latency_spike: float = 3.0,
+                 metrics: Optional[Metrics] = None):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.background_reserve = background_reserve
+        self.latency_spike = latency_spike
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._models: Dict[str, _ModelState] = {}
+        self.metrics.register_collector(self._collect_metrics)
+
+    def _state(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = _ModelState(
+                self.max_concurrency, self.requests_per_minute, self.tokens_per_minute
+            )
+        return state
+
+    def _admission_delay(self, state: _ModelState, tokens: float, lane: str) -> Optional[float]:
+        """0 when a request may start now, else seconds to wait (None: until a slot frees)"""
+        now = time.monotonic()
+        if now < state.paused_until:
+            return state.paused_until - now
+
+        reserve = self.background_reserve if lane == 'background' else 0.0
+        if lane == 'background' and state.waiting['interactive']:
+            return None
+        if state.in_flight >= max(1, int(state.concurrency * (1.0 - reserve))):
+            return None
+
+        state.requests.refill(now)
+        state.tokens.refill(now)
+        return max(state.requests.delay(1, reserve), state.tokens.delay(tokens, reserve))
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str, tokens: float):
+        """
+        Wait for the current lane's turn to send a request to model, estimated at tokens
+
+        The request's latency and outcome (a 429 is an exception with
+        status_code 429) adjust the model's concurrency limit.
+        """
+        lane = current_lane()
+        state = self._state(model)
+        started = time.monotonic()
+        async with state.condition:
+            state.waiting[lane] += 1
+            try:
+                while True:
+                    delay = self._admission_delay(state, tokens, lane)
+                    if delay == 0:
+                        break
+                    try:
+                        await asyncio.wait_for(state.condition.wait(), delay)
+                    except TimeoutError:
+                        pass
+            finally:
+                state.waiting[lane] -= 1
+            state.in_flight += 1
+            state.requests.available -= 1
+            state.tokens.available -= tokens
+            # Background requests held back for this one may go now
+            if lane == 'interactive' and state.waiting['background']:
+                state.condition.notify_all()
+        admitted = time.monotonic()
+        self._record_wait(lane, admitted - started)
+
+        error = None
+        try:
+            yield Slot(self, model)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            state.in_flight -= 1
+            self._adapt(model, state, time.monotonic() - admitted, error)
+            async with state.condition:
+                state.condition.notify_all()
+
+    def _record_wait(self, lane: str, seconds: float):
+        self.metrics.inc('rag_openai_wait_seconds_total',
+                         "Time upstream requests waited for the rate-limit scheduler",
+                         seconds, lane=lane)
+        # Interactive waits also show as a stage, next to the latency they add to
+        if lane == 'interactive':
+            self.metrics.observe('rate_limit_wait', seconds)
+
+    def _adapt(self, model: str, state: _ModelState, latency: float,
+               error: Optional[BaseException]):
+        """Additive increase on normal completions, multiplicative decrease on trouble"""
+        if getattr(error, 'status_code', None) == 429:
+            response = getattr(error, 'response', None)
+            if response is not None:
+                self.observe_headers(model, response.headers)
+            retry_after = parse_duration(response.headers.get('retry-after')
+                                         if response is not None else None)
+            state.paused_until = max(state.paused_until, time.monotonic() + (retry_after or 1.0))
+            self._decrease(model, state, 'rate_limit')
+            return
+        if error is not None:
+            return
+
+        if (state.latency is not None and latency > LATENCY_SPIKE_FLOOR
+                and latency > self.latency_spike * state.latency):
+            self._decrease(model, state, 'latency')
+        else:
+            state.concurrency = min(self.max_concurrency,
+                                    state.concurrency + 1.0 / state.concurrency)
+        state.latency = latency if state.latency is None else (
+            (1 - LATENCY_SMOOTHING) * state.latency + LATENCY_SMOOTHING * latency
+        )
+
+    def _decrease(self, model: str, state: _ModelState, reason: str):
+        # Requests already in flight when trouble started count as one signal
+        now = time.monotonic()
+        if now - state.decreased_at < (state.latency or 1.0):
+            return
+        state.decreased_at = now
+        state.concurrency = max(self.min_concurrency, state.concurrency / 2)
+        self.metrics.inc('rag_openai_backoffs_total',
+                         "Times the upstream concurrency limit was halved",
+                         model=model, reason=reason)
+
+    def observe_headers(self, model: str, headers: Mapping[str, str]):
+        """Update a model's budgets from x-ratelimit-* response headers"""
+        state = self._state(model)
+        now = time.monotonic()
+        for budget, kind in ((state.requests, 'requests'), (state.tokens, 'tokens')):
+            remaining = _header_float(headers, f'x-ratelimit-remaining-{kind}')
+            budget.refill(now)
+            budget.observe(_header_float(headers, f'x-ratelimit-limit-{kind}'), remaining)
+            if remaining is not None and remaining < 1:
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                if reset:
+                    state.paused_until = max(state.paused_until, now + reset)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per model: concurrency limit, requests in flight and queued, learned budgets"""
+        return {
+            model: {
+                'concurrency_limit': round(state.concurrency, 2),
+                'in_flight': state.in_flight,
+                'queued': dict(state.waiting),
+                'requests_per_minute': state.requests.per_minute,
+                'tokens_per_minute': state.tokens.per_minute,
+                'average_latency_ms': (round(state.latency * 1000, 1)
+                                       if state.latency is not None else None)
+            }
+            for model, state in self._models.items()
+        }
+
+    def _collect_metrics(self):
+        for model, state in self._models.items():
+            for lane in LANES:
+                yield ('rag_openai_queued', 'gauge', "Upstream requests waiting to be admitted",
+                       (('lane', lane), ('model', model)), state.waiting[lane])
+            labels = (('model', model),)
+            yield ('rag_openai_in_flight', 'gauge', "Upstream requests in flight", labels,
+                   state.in_flight)
+            yield ('rag_openai_concurrency_limit', 'gauge',
+                   "Adaptive limit on upstream requests in flight", labels, state.concurrency)
+            for budget, kind in ((state.requests, 'requests'), (state.tokens, 'tokens')):
+                if budget.per_minute:
+                    yield ('rag_openai_rate_limit_per_minute', 'gauge',
+                           "Upstream rate limit learned from response headers",
+                           labels + (('budget', kind),), budget.per_minute)
@@ -0,0 +1,219 @@
+"""
+Passage reranking for the CMU-Africa Campus Assistant
+Rescores over-fetched chunk candidates in-process with a small logistic model
+over dense similarity and query-term coverage, so answer/fallback decisions
+are made on a calibrated probability of relevance rather than a raw cosine
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chunking import iter_sentences
+from lexical_index import tokenize
+
+# Per-candidate features, in model weight order
+FEATURES = ('dense', 'coverage', 'sentence', 'title')
+
+# Hand-set for text-embedding-3-small until weights are fitted on labeled
+# retrievals: a chunk at cosine 0.5 sharing no query terms scores 0.5, the
+# cutoff retrieval used before reranking, and query terms lift it from there
+DEFAULT_WEIGHTS = (12.0, 3.0, 2.0, 1.0)
+DEFAULT_BIAS = -6.0
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30.0, 30.0)))
+
+
+class Reranker:
+    """Logistic relevance model over cheap per-candidate features"""
+
+    def __init__(self, weights: Optional[Sequence[float]] = None,
+                 bias: Optional[float] = None, min_relevance: float = 0.5,
+                 path: Optional[str] = None, term_cache_size: int = 10000):
+        """
+        Initialize the model, loading fitted weights from path when saved there
+
+        Candidates scoring below min_relevance are dropped, and a query whose
+        best candidate does so falls back without calling the LLM. The terms
+        of the term_cache_size most recently reranked chunks are kept, so
+        popular chunks are only tokenized once.
+        """
+        self.weights = np.asarray(weights if weights is not None else DEFAULT_WEIGHTS,
+                                  dtype=np.float64)
+        self.bias = float(bias if bias is not None else DEFAULT_BIAS)
+        self.min_relevance = min_relevance
+        self.path = path
+        self.term_cache_size = term_cache_size
+        self._term_cache: "OrderedDict[Tuple, Tuple[List[frozenset], frozenset]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def features(self, query: str, chunks: List[Dict], dense_scores: Dict[str, float],
+                 idfs: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """
+        (len(chunks), len(FEATURES)) feature matrix for a query's candidates
+
+        'dense' is the chunk's vector store similarity; candidates only the
+        lexical index found get the lowest similarity the vector store
+        returned, an upper bound for chunks it ranked below its cutoff.
+        'coverage', 'sentence' and 'title' are the IDF-weighted share of
+        query terms in the chunk, in its best single sentence, and in its
+        title.
+        """
+        matrix = np.zeros((len(chunks), len(FEATURES)))
+        if not chunks:
+            return matrix
+
+        floor = min(dense_scores.values(), default=0.0)
+        matrix[:, 0] = [dense_scores.get(chunk['id'], floor) for chunk in chunks]
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return matrix
+        weights = np.array([(idfs or {}).get(term, 1.0) for term in terms])
+        weights /= weights.sum() or 1.0
+        columns = {term: column for column, term in enumerate(terms)}
+
+        # One presence row per sentence of every candidate, reduced per candidate
+        sentence_hits: List[int] = []
+        term_hits: List[int] = []
+        offsets: List[int] = []
+        sentence_count = 0
+        titles = np.zeros((len(chunks), len(terms)), dtype=bool)
+        for row, chunk in enumerate(chunks):
+            sentence_terms, title_terms = self._chunk_terms(chunk)
+            offsets.append(sentence_count)
+            for present in sentence_terms:
+                for term in present.intersection(columns):
+                    sentence_hits.append(sentence_count)
+                    term_hits.append(columns[term])
+                sentence_count += 1
+            for term in title_terms.intersection(columns):
+                titles[row, columns[term]] = True
+
+        sentences = np.zeros((sentence_count, len(terms)), dtype=bool)
+        sentences[sentence_hits, term_hits] = True
+        matrix[:, 1] = np.logical_or.reduceat(sentences, offsets) @ weights
+        matrix[:, 2] = np.maximum.reduceat(sentences @ weights, offsets)
+        matrix[:, 3] = titles @ weights
+        return matrix
+
+    def _chunk_terms(self, chunk: Dict) -> Tuple[List[frozenset], frozenset]:
+        """Term sets of a chunk's sentences (at least one) and title, cached per chunk"""
+        key = (chunk['id'], hash(chunk['content']), chunk['title'])
+        with self._lock:
+            cached = self._term_cache.get(key)
+            if cached is not None:
+                self._term_cache.move_to_end(key)
+                return cached
+
+        sentence_terms = [frozenset(tokenize(sentence))
+                          for sentence in iter_sentences(chunk['content'])] or [frozenset()]
+        cached = (sentence_terms, frozenset(tokenize(chunk['title'])))
+        with self._lock:
+            self._term_cache[key] = cached
+            while len(self._term_cache) > self.term_cache_size:
+                self._term_cache.popitem(last=False)
+        return cached
+
+    def relevance(self, features: np.ndarray) -> np.ndarray:
+        """Probability of relevance for each feature row"""
+        return _sigmoid(features @ self.weights + self.bias)
+
+    def rerank(self, query: str, chunks: List[Dict], dense_scores: Dict[str, float],
+               idfs: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Candidates by descending relevance, those below min_relevance dropped
+
+        Each returned chunk's 'score' is its relevance (the retrieval score
+        moves to 'retrieval_score'). When no candidate reaches min_relevance
+        the best one is still returned, so callers see why they fall back.
+        """
+        if not chunks:
+            return []
+        scores = self.relevance(self.features(query, chunks, dense_scores, idfs))
+        # Stable, so equally relevant candidates keep their fused order
+        order = np.argsort(-scores, kind='stable')
+
+        ranked = []
+        for position in order:
+            score = float(scores[position])
+            if ranked and score < self.min_relevance:
+                break
+            chunk = dict(chunks[position])
+            chunk['retrieval_score'] = chunk['score']
+            chunk['score'] = score
+            ranked.append(chunk)
+        return ranked
+
+    def fit(self, features: np.ndarray, labels: np.ndarray, l2: float = 1.0,
+            max_iterations: int = 50) -> Dict:
+        """
+        Fit the weights to labeled candidates (1 relevant, 0 not) by Newton's method
+
+        The bias is not regularized, so relevance stays calibrated to the
+        share of relevant candidates. Returns the example counts and the
+        fitted model's mean log loss.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.float64)
+        design = np.hstack([features, np.ones((len(features), 1))])
+        penalty = np.full(design.shape[1], l2)
+        penalty[-1] = 0.0
+
+        theta = np.append(self.weights, self.bias)
+        for _ in range(max_iterations):
+            p = _sigmoid(design @ theta)
+            gradient = design.T @ (p - labels) + penalty * theta
+            hessian = (design.T * (p * (1 - p))) @ design + np.diag(penalty) \
+                + 1e-9 * np.eye(design.shape[1])
+            step = np.linalg.solve(hessian, gradient)
+            theta -= step
+            if np.max(np.abs(step)) < 1e-6:
+                break
+
+        self.weights, self.bias = theta[:-1], float(theta[-1])
+        p = np.clip(self.relevance(features), 1e-12, 1 - 1e-12)
+        log_loss = -np.mean(labels * np.log(p) + (1 - labels) * np.log(1 - p))
+        return {
+            'examples': len(labels),
+            'positives': int(labels.sum()),
+            'log_loss': float(log_loss)
+        }
+
+    def save(self, path: Optional[str] = None):
+        """Write the fitted weights to a JSON file"""
+        path = path or self.path
+        if not path:
+            raise ValueError("No path configured for reranker weights")
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'features': list(FEATURES),
+                'weights': self.weights.tolist(),
+                'bias': self.bias,
+                'fitted_at': time.time()
+            }, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None):
+        """Load weights saved by save()"""
+        path = path or self.path
+        try:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            if saved['features'] != list(FEATURES):
+                raise ValueError(f"weights are for features {saved['features']}")
+            self.weights = np.asarray(saved['weights'], dtype=np.float64)
+            self.bias = float(saved['bias'])
+        except Exception as e:
+            raise Exception(f"Failed to load reranker weights: {str(e)}")
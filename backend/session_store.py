@@ -0,0 +1,312 @@
+"""
+Conversation memory for the CMU-Africa Campus Assistant
+Compact per-session turn history, kept in a bounded in-memory LRU with TTL or
+in SQLite shared by every worker. Turns older than the last few are folded
+into a rolling summary, so a session's size stays capped however long it runs
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from chunking import iter_sentences
+
+# Openings that make a question lean on the one before it
+FOLLOW_UP_OPENING = re.compile(
+    r"^\s*(?:and|also|but|so|then|what about|how about|what if)\b", re.IGNORECASE
+)
+# Pronouns that refer back to the previous question, when little else is said
+FOLLOW_UP_PRONOUN = re.compile(
+    r"\b(?:it|its|that|they|them|their|those|these|he|she|his|her)\b", re.IGNORECASE
+)
+# Longer questions name their subject, even when they contain a pronoun
+FOLLOW_UP_MAX_WORDS = 6
+
+# Longest line a folded turn adds to the rolling summary
+SUMMARY_LINE_CHARS = 240
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """text with whitespace collapsed, cut at a word boundary to at most max_chars"""
+    text = ' '.join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rsplit(' ', 1)[0] + '…'
+
+
+def conversation_topic(query: str, session: Optional[Dict]) -> str:
+    """
+    The self-contained question a query continues
+
+    For a follow-up, one opening with a connective ("what about weekends?")
+    or a short one resting on a pronoun ("is it free?"), that is the topic of
+    the session's last turn; any other query is its own topic.
+    """
+    if session and session['turns'] and is_follow_up(query):
+        return session['turns'][-1]['topic']
+    return query
+
+
+def is_follow_up(query: str) -> bool:
+    """Whether a query only makes sense as a continuation of the previous one"""
+    if FOLLOW_UP_OPENING.search(query):
+        return True
+    return len(query.split()) <= FOLLOW_UP_MAX_WORDS and bool(FOLLOW_UP_PRONOUN.search(query))
+
+
+def session_size(session: Dict) -> int:
+    """Bytes a session takes up serialized, the unit its memory cap is measured in"""
+    return len(json.dumps(session, ensure_ascii=False).encode('utf-8'))
+
+
+class SessionStore:
+    """Interface and turn compaction shared by session store backends"""
+
+    def __init__(self, max_turns: int = 4, max_turn_chars: int = 600,
+                 max_summary_chars: int = 1200, ttl_seconds: Optional[float] = 3600):
+        """
+        Sessions keep their last max_turns turns verbatim, each text cut to
+        max_turn_chars; older turns are folded into a summary of at most
+        max_summary_chars. Sessions idle for ttl_seconds are dropped.
+        """
+        self.max_turns = max_turns
+        self.max_turn_chars = max_turn_chars
+        self.max_summary_chars = max_summary_chars
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Return {'turns', 'summary', 'updated_at'} for a live session, or None"""
+        raise NotImplementedError
+
+    def append(self, session_id: str, user: str, assistant: str,
+               topic: Optional[str] = None) -> Dict:
+        """Record a turn (assistant is '' when nothing grounded was answered) and return the session"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        """Forget a session; unknown IDs are ignored"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        """Return session counts, memory use and eviction counters"""
+        raise NotImplementedError
+
+    @property
+    def max_session_bytes(self) -> int:
+        """Upper bound on one session's serialized size (ASCII text)"""
+        # user, assistant and topic per turn, the summary, and JSON overhead
+        return self.max_turns * (3 * self.max_turn_chars + 64) + self.max_summary_chars + 64
+
+    def _is_expired(self, updated_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - updated_at > self.ttl_seconds
+
+    def _summarize_turn(self, turn: Dict) -> str:
+        """One summary line for a turn: the question and the opening of its answer"""
+        line = f"- Asked: {turn['user']}"
+        lead = next(iter_sentences(turn['assistant']), '') if turn['assistant'] else ''
+        if lead:
+            line += f" Answered: {lead}"
+        return _truncate(line, SUMMARY_LINE_CHARS)
+
+    def _add_turn(self, session: Optional[Dict], user: str, assistant: str,
+                  topic: Optional[str]) -> Dict:
+        """A new session with the turn appended and turns past max_turns folded into the summary"""
+        turns = list(session['turns']) if session else []
+        turns.append({
+            'user': _truncate(user, self.max_turn_chars),
+            'assistant': _truncate(assistant, self.max_turn_chars),
+            'topic': _truncate(topic or user, self.max_turn_chars)
+        })
+
+        summary_lines = session['summary'].splitlines() if session else []
+        while len(turns) > self.max_turns:
+            summary_lines.append(self._summarize_turn(turns.pop(0)))
+        # The oldest lines go first once the summary outgrows its budget
+        while summary_lines and len('\n'.join(summary_lines)) > self.max_summary_chars:
+            summary_lines.pop(0)
+
+        return {'turns': turns, 'summary': '\n'.join(summary_lines), 'updated_at': time.time()}
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in a per-process LRU with TTL (each worker keeps its own)"""
+
+    def __init__(self, max_sessions: int = 10000, max_turns: int = 4,
+                 max_turn_chars: int = 600, max_summary_chars: int = 1200,
+                 ttl_seconds: Optional[float] = 3600):
+        """Initialize the store; the least recently used sessions past max_sessions are evicted"""
+        super().__init__(max_turns, max_turn_chars, max_summary_chars, ttl_seconds)
+        self.max_sessions = max_sessions
+
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._expired = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self._is_expired(session['updated_at']):
+                self._remove(session_id)
+                self._expired += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def append(self, session_id: str, user: str, assistant: str,
+               topic: Optional[str] = None) -> Dict:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self._is_expired(session['updated_at']):
+                self._expired += 1
+                session = None
+            session = self._add_turn(session, user, assistant, topic)
+
+            size = session_size(session)
+            self._bytes += size - self._sizes.get(session_id, 0)
+            self._sizes[session_id] = size
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._remove(next(iter(self._sessions)))
+                self._evictions += 1
+            return session
+
+    def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        """Drop a session and its size accounting (lock held)"""
+        del self._sessions[session_id]
+        self._bytes -= self._sizes.pop(session_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'bytes': self._bytes,
+                'largest_bytes': max(self._sizes.values(), default=0),
+                'max_session_bytes': self.max_session_bytes,
+                'evictions': self._evictions,
+                'expired': self._expired
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file, shared by every worker pointing at the same path"""
+
+    # Appends between sweeps for expired and excess sessions
+    PRUNE_INTERVAL = 500
+
+    def __init__(self, path: str, max_sessions: int = 100000, max_turns: int = 4,
+                 max_turn_chars: int = 600, max_summary_chars: int = 1200,
+                 ttl_seconds: Optional[float] = 3600):
+        """Open (or create) the session database; sessions past max_sessions are pruned oldest first"""
+        super().__init__(max_turns, max_turn_chars, max_summary_chars, ttl_seconds)
+        self.path = path
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._appends = 0
+        self._evictions = 0
+        self._expired = 0
+
+        try:
+            # Transactions are explicit so a turn's read-modify-write is atomic across workers
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0,
+                                       isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL, "
+                "size INTEGER NOT NULL, data TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+            )
+            self._prune()
+        except Exception as e:
+            raise Exception(f"Failed to initialize session database: {str(e)}")
+
+    def _load(self, session_id: str) -> Optional[Dict]:
+        """The stored session, or None when missing or expired (lock held)"""
+        row = self._db.execute(
+            "SELECT updated_at, data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or self._is_expired(row[0]):
+            return None
+        return json.loads(row[1])
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._load(session_id)
+
+    def append(self, session_id: str, user: str, assistant: str,
+               topic: Optional[str] = None) -> Dict:
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    session = self._add_turn(self._load(session_id), user, assistant, topic)
+                    data = json.dumps(session, ensure_ascii=False)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO sessions (session_id, updated_at, size, data) "
+                        "VALUES (?, ?, ?, ?)",
+                        (session_id, session['updated_at'], len(data.encode('utf-8')), data)
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+
+                self._appends += 1
+                if self._appends % self.PRUNE_INTERVAL == 0:
+                    self._prune()
+                return session
+            except sqlite3.Error:
+                # Conversation memory is best-effort; the answer has already been given
+                return self._add_turn(None, user, assistant, topic)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _prune(self):
+        """Delete expired sessions, then the least recently updated past max_sessions (lock held)"""
+        if self.ttl_seconds:
+            self._expired += self._db.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        self._evictions += self._db.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        ).rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total, largest = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(MAX(size), 0) FROM sessions"
+            ).fetchone()
+            return {
+                'sessions': count,
+                'max_sessions': self.max_sessions,
+                'bytes': total,
+                'largest_bytes': largest,
+                'max_session_bytes': self.max_session_bytes,
+                'evictions': self._evictions,
+                'expired': self._expired
+            }
@@ -0,0 +1,43 @@
+"""
+Cross-process file coordination for the CMU-Africa Campus Assistant
+Lets the API workers and the loader share indexes saved to disk: a file's
+signature shows when another process replaced it, and advisory locks keep
+one process at a time merging its changes into the file
+"""
+import contextlib
+import os
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so run a single process there
+    fcntl = None
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """(inode, size, mtime) of path, or None if missing; changes whenever the file is replaced"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+@contextlib.contextmanager
+def file_lock(path: str, shared: bool = False):
+    """
+    Hold an advisory lock on path (through path + '.lock') across processes
+
+    Writers take it exclusively around read-merge-write; readers of files
+    written in several steps take it shared. Not reentrant: a process
+    holding the exclusive lock must not take the shared one.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
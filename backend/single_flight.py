@@ -0,0 +1,50 @@
+"""
+Request coalescing for the CMU-Africa Campus Assistant
+Concurrent calls with the same key share one in-flight execution, so a burst
+of identical questions (e.g. everyone tapping the same suggestion pill) costs
+one embedding, retrieval and completion
+"""
+import asyncio
+import copy
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Deduplicates concurrent async calls by key (one event loop per instance)"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Await func() unless a call with the same key is already running
+
+        Returns (result, shared); shared callers get a deep copy of the result,
+        so callers can't mutate each other's responses. An exception raised by
+        the execution propagates to every caller.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # Shielded so a caller that goes away doesn't cancel the others' result
+            return copy.deepcopy(await asyncio.shield(task)), True
+
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+        self.executions += 1
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict:
+        return {
+            'in_flight': len(self._inflight),
+            'executions': self.executions,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,700 @@
+"""
+Vector store backends for the CMU-Africa Campus Assistant
+Pinecone for the hosted index, and an in-process NumPy store for running
+and benchmarking fully offline
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ann_index import IVFIndex
+from shared_files import file_lock, file_signature
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# Rows scored per block: the float32 copy made when scanning compact rows stays in cache
+SCAN_BLOCK_ROWS = 256
+
+
+class VectorStore:
+    """Interface shared by vector store backends (Pinecone-shaped records and results)"""
+
+    def upsert(self, vectors: List[Dict]):
+        """Insert or replace {'id', 'values', 'metadata'} records"""
+        raise NotImplementedError
+
+    def query(self, vector: np.ndarray, top_k: int, filter: Optional[Dict] = None) -> Dict:
+        """Return {'matches': [{'id', 'score', 'metadata'}, ...]} by descending cosine score"""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        """Delete records by ID; unknown IDs are ignored"""
+        raise NotImplementedError
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict]:
+        """Return {id: metadata} of the records stored under ids; unknown IDs are left out"""
+        raise NotImplementedError
+
+    def describe_stats(self):
+        """Return index statistics with total_vector_count and dimension"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist pending writes, for backends that need it"""
+
+
+class PineconeVectorStore(VectorStore):
+    """Hosted Pinecone serverless index"""
+
+    def __init__(self, api_key: str, index_name: str, dimension: int,
+                 cloud: str = "aws", region: str = "us-east-1",
+                 pool_threads: int = 1, pool_maxsize: Optional[int] = None,
+                 request_timeout: Optional[float] = None, ready_timeout: float = 300.0):
+        """
+        Initialize or connect to Pinecone index
+
+        pool_maxsize caps the kept-alive connections to the index host (the
+        client defaults to 5 per CPU); request_timeout bounds each data-plane
+        request in seconds. A new index is polled for up to ready_timeout
+        seconds until Pinecone reports it ready.
+        """
+        from pinecone import Pinecone, ServerlessSpec
+        from pinecone.exceptions import PineconeApiException
+
+        self.index_name = index_name
+        self.dimension = dimension
+        self.request_timeout = request_timeout
+        self.pc = Pinecone(api_key=api_key, pool_threads=pool_threads)
+        if pool_maxsize:
+            self.pc.openapi_config.connection_pool_maxsize = pool_maxsize
+        try:
+            # List existing indexes
+            existing_indexes = [index['name'] for index in self.pc.list_indexes()]
+
+            if index_name not in existing_indexes:
+                # Create index with ServerlessSpec
+                try:
+                    self.pc.create_index(
+                        name=index_name,
+                        dimension=dimension,
+                        metric="cosine",
+                        spec=ServerlessSpec(cloud=cloud, region=region)
+                    )
+                except PineconeApiException as e:
+                    # Another worker starting at the same time created it first
+                    if e.status != 409:
+                        raise
+
+            # Connect to the index by host, once it is ready
+            description = self._wait_until_ready(ready_timeout)
+            self.index = self.pc.Index(host=description.host)
+        except Exception as e:
+            raise Exception(f"Failed to initialize Pinecone index: {str(e)}")
+
+    def _wait_until_ready(self, timeout: float):
+        """Poll the index description with backoff until it is ready, and return it"""
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+        while True:
+            description = self.pc.describe_index(self.index_name)
+            if description.status['ready']:
+                return description
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"Index {self.index_name} not ready after {timeout:g}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+    def upsert(self, vectors: List[Dict]):
+        # The client serializes plain lists; arrays are converted only at this boundary
+        vectors = [{**record, 'values': np.asarray(record['values'], dtype=np.float32).tolist()}
+                   for record in vectors]
+        self.index.upsert(vectors=vectors, _request_timeout=self.request_timeout)
+
+    def query(self, vector: np.ndarray, top_k: int, filter: Optional[Dict] = None) -> Dict:
+        return self.index.query(
+            vector=np.asarray(vector, dtype=np.float32).tolist(),
+            top_k=top_k,
+            filter=filter,
+            include_metadata=True,
+            _request_timeout=self.request_timeout
+        )
+
+    def delete(self, ids: List[str]):
+        self.index.delete(ids=ids, _request_timeout=self.request_timeout)
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict]:
+        if not ids:
+            return {}
+        response = self.index.fetch(ids=ids, _request_timeout=self.request_timeout)
+        return {vector_id: vector.metadata or {} for vector_id, vector in response.vectors.items()}
+
+    def describe_stats(self):
+        return self.index.describe_index_stats(_request_timeout=self.request_timeout)
+
+
+def _matches_filter(metadata: Dict, filter: Dict) -> bool:
+    """
+    Evaluate a Pinecone-style equality / $in / $eq metadata filter
+
+    As in Pinecone, a list value (e.g. programs) matches when any of its
+    elements does.
+    """
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        values = value if isinstance(value, list) else [value]
+        if isinstance(condition, dict):
+            if '$eq' in condition and condition['$eq'] not in values:
+                return False
+            if '$in' in condition and not any(item in condition['$in'] for item in values):
+                return False
+            if '$ne' in condition and condition['$ne'] in values:
+                return False
+        elif condition not in values:
+            return False
+    return True
+
+
+def _filter_values(condition) -> Optional[List]:
+    """Values an equality or $in condition accepts, or None for other conditions"""
+    if not isinstance(condition, dict):
+        return [condition]
+    if set(condition) == {'$eq'}:
+        return [condition['$eq']]
+    if set(condition) == {'$in'}:
+        return list(condition['$in'])
+    return None
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store: cosine top-k over a NumPy matrix
+
+    Rows are L2-normalized on insert, so a query is a single matrix-vector
+    product followed by argpartition. Metadata lives in a JSON sidecar next
+    to the vectors; saved vectors are memory-mapped on load.
+
+    With index_type="ivf", an IVFIndex is trained once the store holds
+    ann_min_rows vectors and queries only score rows in the nprobe nearest
+    lists; below that size (or with index_type="flat") the scan is exact.
+    Training (and retraining as the store grows) runs in a background
+    thread and the trained index is swapped in, so queries keep using the
+    current one meanwhile.
+
+    Rows are also grouped by the partition_key metadata field (the
+    category): a query filtering on it exactly scans only those partitions.
+
+    Vectors are stored as float32, float16 or int8 (symmetric scalar
+    quantization with one scale per row). Compact stores also keep a float32
+    copy, memory-mapped once saved: the rescore_factor * top_k best
+    approximate matches are re-ranked with it, so scans only read the
+    compact rows while the final order is at full precision.
+
+    Several processes (API workers, the loader) may share a saved store:
+    queries reload it once another process has saved it, and saving merges
+    this process's upserts and deletes into what is on disk. Saves hold an
+    exclusive lock on the directory and loads a shared one, so a store is
+    never read half written.
+    """
+
+    def __init__(self, dimension: int, path: Optional[str] = None, dtype: str = "float32",
+                 initial_capacity: int = 1024, index_type: str = "flat", nprobe: int = 16,
+                 n_lists: Optional[int] = None, ann_min_rows: int = 10000,
+                 partition_key: Optional[str] = "category", rescore_factor: int = 4):
+        """Initialize the store, loading it from path when one was saved there"""
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        if index_type not in ("flat", "ivf"):
+            raise ValueError(f"Unsupported vector index type: {index_type}")
+
+        self.dimension = dimension
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rescore_factor = rescore_factor if self.dtype != np.float32 else 0
+        self.nprobe = nprobe
+        self._ann = None
+        # Background training: its thread, the rows written since its snapshot, and a
+        # generation bumped by loads so a result trained on replaced rows is dropped
+        self._ann_thread: Optional[threading.Thread] = None
+        self._ann_touched: set = set()
+        self._ann_generation = 0
+        if index_type == "ivf":
+            self._ann = IVFIndex(dimension, n_lists=n_lists, nprobe=nprobe,
+                                 min_train_size=ann_min_rows)
+
+        self._vectors = np.zeros((initial_capacity, dimension), dtype=self.dtype)
+        self._scales = (np.zeros(initial_capacity, dtype=np.float32)
+                        if self.dtype == np.int8 else None)
+        self._full = (np.zeros((initial_capacity, dimension), dtype=np.float32)
+                      if self.rescore_factor else None)
+        self._ids: List[str] = []
+        self._metadata: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self.partition_key = partition_key
+        self._partitions: Dict[str, set] = {}
+        self._lock = threading.RLock()
+        # Set when the loaded store must be rewritten (e.g. converted to another dtype)
+        self._dirty = False
+        # Changes not saved yet, by ID: (normalized values, metadata), or None when deleted;
+        # and the saved store as last read or written
+        self._pending: Dict[str, Optional[Tuple[np.ndarray, Dict]]] = {}
+        self._signature = None
+
+        if path and os.path.exists(os.path.join(path, 'metadata.json')):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _encode(self, values: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Normalized float32 rows in the storage dtype, with their int8 scales"""
+        if self.dtype != np.int8:
+            return values.astype(self.dtype), None
+        scales = np.abs(values).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(values / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _arrays(self) -> List[np.ndarray]:
+        return [array for array in (self._vectors, self._scales, self._full) if array is not None]
+
+    def _ensure_capacity(self, size: int):
+        """Grow the matrices (doubling) so they can hold size rows (lock held)"""
+        capacity = self._vectors.shape[0]
+        if size <= capacity and all(array.flags.writeable for array in self._arrays()):
+            return
+        new_capacity = max(size, capacity * 2, 1)
+        count = len(self._ids)
+
+        def grown(array: np.ndarray) -> np.ndarray:
+            copy = np.zeros((new_capacity,) + array.shape[1:], dtype=array.dtype)
+            copy[:count] = array[:count]
+            return copy
+
+        self._vectors = grown(self._vectors)
+        if self._scales is not None:
+            self._scales = grown(self._scales)
+        if self._full is not None:
+            self._full = grown(self._full)
+
+    def _float_rows(self, size: int) -> np.ndarray:
+        """The first size rows at the best precision held, to train the IVF index (lock held)"""
+        # int8 rows are only off by their (positive) scale, which leaves cosine ranking unchanged
+        return self._full[:size] if self._full is not None else self._vectors[:size]
+
+    def _scores(self, rows: Optional[np.ndarray], size: int, query: np.ndarray) -> np.ndarray:
+        """Cosine scores of query against rows (the first size rows when None) (lock held)"""
+        count = size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCAN_BLOCK_ROWS):
+            block = slice(start, min(start + SCAN_BLOCK_ROWS, count))
+            index = block if rows is None else rows[block]
+            # Compact rows are widened per block so the product runs in BLAS
+            scores[block] = self._vectors[index].astype(np.float32, copy=False) @ query
+            if self._scales is not None:
+                scores[block] *= self._scales[index]
+        return scores
+
+    def _partition_of(self, metadata: Dict) -> Optional[str]:
+        return metadata.get(self.partition_key) if self.partition_key else None
+
+    def _rebuild_partitions(self):
+        """Group every row by its partition value (lock held)"""
+        self._partitions = {}
+        if self.partition_key:
+            for row, metadata in enumerate(self._metadata):
+                self._partitions.setdefault(self._partition_of(metadata), set()).add(row)
+
+    def _move_partition(self, row: int, old: Optional[Dict], new: Optional[Dict]):
+        """Move row from old's partition to new's (either may be None) (lock held)"""
+        if not self.partition_key:
+            return
+        if old is not None:
+            partition = self._partitions.get(self._partition_of(old))
+            if partition is not None:
+                partition.discard(row)
+                if not partition:
+                    del self._partitions[self._partition_of(old)]
+        if new is not None:
+            self._partitions.setdefault(self._partition_of(new), set()).add(row)
+
+    def _partition_rows(self, filter: Optional[Dict]) -> Optional[np.ndarray]:
+        """Rows of the partitions a filter restricts the query to, or None to scan all (lock held)"""
+        if not filter or not self.partition_key or self.partition_key not in filter:
+            return None
+        values = _filter_values(filter[self.partition_key])
+        if values is None:
+            return None
+        rows = set().union(*(self._partitions.get(value, ()) for value in values))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def _update_ann(self, rows: List[int], values: np.ndarray):
+        """Assign written rows to IVF lists, starting a retrain as the store grows (lock held)"""
+        if self._ann is None:
+            return
+        if self._ann.is_trained:
+            self._ann.add(np.asarray(rows, dtype=np.int64), values)
+        if self._ann_thread is not None:
+            self._ann_touched.update(rows)
+            return
+        size = len(self._ids)
+        # Retrain when the store has grown 4x: list sizes (and latency) scale with N / n_lists
+        if size >= self._ann.min_train_size and (
+            not self._ann.is_trained or size >= 4 * self._ann.trained_size
+        ):
+            self._ann_touched = set()
+            self._ann_thread = threading.Thread(
+                target=self._train_ann, args=(self._float_rows(size), self._ann_generation),
+                name="ivf-training", daemon=True
+            )
+            self._ann_thread.start()
+
+    def _train_ann(self, vectors: np.ndarray, generation: int):
+        """
+        Train a new IVF index on a snapshot of the rows, then swap it in
+
+        Rows written or moved while training are read from the matrix rather
+        than the snapshot: they are reassigned under the lock at the swap.
+        """
+        try:
+            ann = self._ann.retrained(vectors)
+        except Exception as e:
+            logger.warning("Training the IVF index failed: %s", e)
+            ann = None
+        with self._lock:
+            self._ann_thread = None
+            if ann is None or generation != self._ann_generation:
+                return
+            size = len(self._ids)
+            for row in self._ann_touched | set(range(size, len(vectors))):
+                ann.remove(row)
+            touched = np.fromiter((row for row in self._ann_touched if row < size),
+                                  dtype=np.int64)
+            ann.add(touched, self._float_rows(size)[touched])
+            self._ann_touched = set()
+            self._ann = ann
+
+    def wait_for_ann(self, timeout: Optional[float] = None):
+        """Block until a background IVF training in progress has been swapped in"""
+        thread = self._ann_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def upsert(self, vectors: List[Dict]):
+        if not vectors:
+            return
+        values = self._normalize(np.asarray([v['values'] for v in vectors], dtype=np.float32))
+        ids = [record['id'] for record in vectors]
+        metadata = [record.get('metadata', {}) for record in vectors]
+
+        with self._lock:
+            self._write(ids, metadata, values)
+            if self.path:
+                for position, vector_id in enumerate(ids):
+                    self._pending[vector_id] = (values[position], metadata[position])
+
+    def _write(self, ids: List[str], metadata: List[Dict], values: np.ndarray):
+        """Insert or replace rows of normalized float32 values (lock held)"""
+        stored, scales = self._encode(values)
+        self._ensure_capacity(len(self._ids) + len(ids))
+        rows = []
+        for position, vector_id in enumerate(ids):
+            row = self._rows.get(vector_id)
+            if row is None:
+                row = len(self._ids)
+                self._rows[vector_id] = row
+                self._ids.append(vector_id)
+                self._metadata.append(metadata[position])
+                self._move_partition(row, None, metadata[position])
+            else:
+                self._move_partition(row, self._metadata[row], metadata[position])
+                self._metadata[row] = metadata[position]
+            self._vectors[row] = stored[position]
+            if self._scales is not None:
+                self._scales[row] = scales[position]
+            if self._full is not None:
+                self._full[row] = values[position]
+            rows.append(row)
+        self._update_ann(rows, values)
+
+    def query(self, vector: np.ndarray, top_k: int, filter: Optional[Dict] = None) -> Dict:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            self._refresh()
+            size = len(self._ids)
+            if size == 0 or top_k <= 0:
+                return {'matches': []}
+
+            # A category is small enough to scan exactly, so partitions bypass the IVF lists
+            rows = self._partition_rows(filter)
+            if rows is not None:
+                if len(rows) == 0:
+                    return {'matches': []}
+                filter = {key: condition for key, condition in filter.items()
+                          if key != self.partition_key}
+            elif self._ann is not None and self._ann.is_trained:
+                rows = self._ann.candidates(query, self.nprobe)
+                if len(rows) == 0:
+                    return {'matches': []}
+
+            scores = self._scores(rows, size, query)
+            if filter:
+                metadata = self._metadata if rows is None else [self._metadata[row] for row in rows]
+                allowed = np.fromiter(
+                    (_matches_filter(item, filter) for item in metadata),
+                    dtype=bool, count=len(scores)
+                )
+                scores[~allowed] = -np.inf
+
+            k = min(top_k, len(scores))
+            # Compact stores shortlist more matches, then rank them at full precision
+            shortlist = min(len(scores), k * self.rescore_factor) if self._full is not None else k
+            top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+            if self._full is not None:
+                top = top[np.isfinite(scores[top])]
+                scores[top] = self._full[top if rows is None else rows[top]] @ query
+            top = top[np.argsort(-scores[top])][:k]
+
+            return {'matches': [
+                {
+                    'id': self._ids[row],
+                    'score': float(scores[position]),
+                    'metadata': self._metadata[row]
+                }
+                for position, row in zip(top, top if rows is None else rows[top])
+                if np.isfinite(scores[position])
+            ]}
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict]:
+        with self._lock:
+            self._refresh()
+            return {vector_id: self._metadata[self._rows[vector_id]]
+                    for vector_id in ids if vector_id in self._rows}
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._remove(ids)
+            # Another process may have saved these IDs since this one last read the store
+            if self.path:
+                for vector_id in ids:
+                    self._pending[vector_id] = None
+
+    def _remove(self, ids: Iterable[str]):
+        """Delete rows by ID, ignoring unknown IDs (lock held)"""
+        self._ensure_capacity(len(self._ids))
+        for vector_id in ids:
+            row = self._rows.pop(vector_id, None)
+            if row is None:
+                continue
+            # Move the last row into the hole to keep the matrix contiguous
+            last = len(self._ids) - 1
+            if self._ann is not None:
+                self._ann.remove(row)
+                if self._ann_thread is not None:
+                    self._ann_touched.add(row)
+            self._move_partition(row, self._metadata[row], None)
+            if row != last:
+                self._move_partition(last, self._metadata[last], None)
+                self._move_partition(row, None, self._metadata[last])
+                self._vectors[row] = self._vectors[last]
+                if self._scales is not None:
+                    self._scales[row] = self._scales[last]
+                if self._full is not None:
+                    self._full[row] = self._full[last]
+                self._ids[row] = self._ids[last]
+                self._metadata[row] = self._metadata[last]
+                self._rows[self._ids[row]] = row
+                if self._ann is not None:
+                    self._ann.move(last, row)
+            self._ids.pop()
+            self._metadata.pop()
+
+    def describe_stats(self) -> Dict:
+        stats = {
+            'total_vector_count': len(self._ids),
+            'dimension': self.dimension,
+            'storage': {
+                'dtype': self.dtype.name,
+                # Scanned per query; the float32 copy for rescoring is only read for shortlists
+                'bytes_per_vector': self.bytes_per_vector,
+                'rescore_factor': self.rescore_factor if self._full is not None else 0
+            }
+        }
+        if self._ann is not None:
+            stats['ann_index'] = {**self._ann.stats(), 'nprobe': self.nprobe}
+        if self.partition_key:
+            with self._lock:
+                stats['partitions'] = {str(value): len(rows)
+                                       for value, rows in self._partitions.items()}
+        return stats
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Bytes of a stored (scanned) row, including its int8 scale"""
+        return self.dimension * self.dtype.itemsize + (4 if self._scales is not None else 0)
+
+    def flush(self):
+        if self.path and (self._pending or self._dirty):
+            self.save()
+
+    def _refresh(self, locked: bool = False):
+        """
+        Reload the store if another process saved it since this one read it (lock held)
+
+        locked: this process already holds the directory's exclusive lock.
+        """
+        if not self.path:
+            return
+        sidecar = os.path.join(self.path, 'metadata.json')
+        if file_signature(sidecar) in (None, self._signature):
+            return
+        if locked:
+            self._load(self.path)
+        else:
+            with file_lock(sidecar, shared=True):
+                self._load(self.path)
+
+    def save(self, path: Optional[str] = None):
+        """
+        Write vectors (.npy) and metadata (JSON sidecar) to a directory
+
+        Saving to the store's own path first reloads changes other processes
+        saved there, so the directory ends up with theirs and this one's.
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No path configured for the local vector store")
+
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            own_store = path == self.path
+            with file_lock(os.path.join(path, 'metadata.json')):
+                if own_store:
+                    self._refresh(locked=True)
+                self._save(path)
+                if own_store:
+                    self._signature = file_signature(os.path.join(path, 'metadata.json'))
+                    self._pending = {}
+            self._dirty = False
+
+    def _save(self, path: str):
+        """Write the store's files to a directory (lock and directory lock held)"""
+        vectors_tmp = os.path.join(path, 'vectors.tmp.npy')
+        metadata_tmp = os.path.join(path, 'metadata.json.tmp')
+        np.save(vectors_tmp, self._vectors[:len(self._ids)])
+        extras = {'scales': self._scales, 'vectors_full': self._full}
+        for name, array in extras.items():
+            if array is not None:
+                np.save(os.path.join(path, f'{name}.tmp.npy'), array[:len(self._ids)])
+        with open(metadata_tmp, 'w') as f:
+            json.dump({
+                'dimension': self.dimension,
+                'dtype': self.dtype.name,
+                'ids': self._ids,
+                'metadata': self._metadata
+            }, f)
+        os.replace(vectors_tmp, os.path.join(path, 'vectors.npy'))
+        for name, array in extras.items():
+            if array is not None:
+                os.replace(os.path.join(path, f'{name}.tmp.npy'),
+                           os.path.join(path, f'{name}.npy'))
+            elif os.path.exists(os.path.join(path, f'{name}.npy')):
+                os.remove(os.path.join(path, f'{name}.npy'))
+        os.replace(metadata_tmp, os.path.join(path, 'metadata.json'))
+        if self._ann is not None and self._ann.is_trained:
+            ann_tmp = os.path.join(path, 'ivf.tmp.npz')
+            np.savez(ann_tmp, **self._ann.state())
+            os.replace(ann_tmp, os.path.join(path, 'ivf.npz'))
+
+    def load(self, path: Optional[str] = None):
+        """Load a saved store, keeping unsaved changes; vectors are memory-mapped until written"""
+        path = path or self.path
+        with self._lock, file_lock(os.path.join(path, 'metadata.json'), shared=True):
+            self._load(path)
+
+    def _load(self, path: str):
+        """Load a saved store (lock and directory lock held)"""
+        signature = file_signature(os.path.join(path, 'metadata.json'))
+        try:
+            with open(os.path.join(path, 'metadata.json'), 'r') as f:
+                sidecar = json.load(f)
+            vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+            extras = {}
+            for name in ('scales', 'vectors_full'):
+                extra_path = os.path.join(path, f'{name}.npy')
+                extras[name] = (np.load(extra_path, mmap_mode='r')
+                                if os.path.exists(extra_path) else None)
+        except Exception as e:
+            raise Exception(f"Failed to load local vector store: {str(e)}")
+
+        if sidecar['dimension'] != self.dimension:
+            raise ValueError(
+                f"Local vector store at {path} has dimension {sidecar['dimension']}, "
+                f"expected {self.dimension}"
+            )
+
+        with self._lock:
+            converted = np.dtype(sidecar.get('dtype', 'float32')) != self.dtype
+            if not converted:
+                # Writes copy the memory-mapped matrices into RAM via _ensure_capacity
+                self._vectors = vectors
+                self._scales = extras['scales']
+                # Saved without a float32 copy (or not wanted): no rescoring
+                self._full = extras['vectors_full'] if self.rescore_factor else None
+            else:
+                # Stored in another dtype: re-encode from the most precise rows saved
+                if extras['vectors_full'] is not None:
+                    values = np.asarray(extras['vectors_full'], dtype=np.float32)
+                else:
+                    values = np.asarray(vectors, dtype=np.float32)
+                    if extras['scales'] is not None:
+                        values = self._normalize(values * extras['scales'][:, None])
+                self._vectors, self._scales = self._encode(values)
+                self._full = values if self.rescore_factor else None
+            self._ids = sidecar['ids']
+            self._metadata = sidecar['metadata']
+            self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+            self._rebuild_partitions()
+            self._dirty = self._dirty or converted
+            if self._ann is not None:
+                self._ann_generation += 1
+                self._load_ann(path)
+            if path == self.path:
+                self._signature = signature
+                self._apply_pending()
+
+    def _apply_pending(self):
+        """Redo the changes not saved yet on top of a freshly loaded store (lock held)"""
+        self._remove([vector_id for vector_id, change in self._pending.items() if change is None])
+        upserts = [(vector_id, change) for vector_id, change in self._pending.items()
+                   if change is not None]
+        if upserts:
+            self._write([vector_id for vector_id, _ in upserts],
+                        [metadata for _, (_, metadata) in upserts],
+                        np.stack([values for _, (values, _) in upserts]))
+
+    def _load_ann(self, path: str):
+        """Restore the saved IVF lists, or train from the loaded vectors (lock held)"""
+        ann_path = os.path.join(path, 'ivf.npz')
+        if os.path.exists(ann_path):
+            with np.load(ann_path) as state:
+                # Lists written alongside an older vectors file are stale; retrain instead
+                if len(state['rows']) == len(self._ids) and state['centroids'].shape[1] == self.dimension:
+                    self._ann.restore(state)
+                    return
+        if len(self._ids) >= self._ann.min_train_size:
+            self._ann.train(self._float_rows(len(self._ids)))
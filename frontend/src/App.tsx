@@ -14,7 +14,10 @@ function App() {
   const [currentSuggestions, setCurrentSuggestions] = useState<Suggestion[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [streamingMessageId, setStreamingMessageId] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // One session per page load, so the backend can resolve follow-up questions
+  const sessionId = useRef('session_' + Date.now());
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -39,25 +42,49 @@ function App() {
     setIsLoading(true);
     setError(null);
 
+    const assistantId = (Date.now() + 1).toString();
+    const updateAssistant = (update: Partial<Message>) => {
+      setMessages((prev) =>
+        prev.map((message) =>
+          message.id === assistantId ? { ...message, ...update } : message
+        )
+      );
+    };
+
     try {
-      // Call API
-      const response = await chatAPI.sendMessage({
-        message: messageText,
-        session_id: 'session_' + Date.now(),
-      });
-
-      // Add assistant message
-      const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        type: 'assistant',
-        content: response.answer,
-        timestamp: new Date(),
-        sources: response.sources,
-        suggestions: response.suggestions,
-        followUp: response.follow_up,
-      };
+      // Stream the answer so sources and first tokens render before generation finishes
+      const response = await chatAPI.streamMessage(
+        {
+          message: messageText,
+          session_id: sessionId.current,
+        },
+        {
+          onMetadata: (metadata) => {
+            const assistantMessage: Message = {
+              id: assistantId,
+              type: 'assistant',
+              content: '',
+              timestamp: new Date(),
+              sources: metadata.sources,
+              suggestions: metadata.suggestions,
+              followUp: metadata.follow_up,
+            };
+            setMessages((prev) => [...prev, assistantMessage]);
+            setStreamingMessageId(assistantId);
+          },
+          onToken: (text) => {
+            setMessages((prev) =>
+              prev.map((message) =>
+                message.id === assistantId
+                  ? { ...message, content: message.content + text }
+                  : message
+              )
+            );
+          },
+        }
+      );
 
-      setMessages((prev) => [...prev, assistantMessage]);
+      updateAssistant({ content: response.answer });
       setCurrentSuggestions(response.suggestions || []);
     } catch (err: any) {
       console.error('Error sending message:', err);
@@ -66,7 +93,7 @@ function App() {
           'Failed to get response. Please check if the backend is running.'
       );
 
-      // Add error message
+      // Replace the assistant message a failed stream may have started with the error
       const errorMessage: Message = {
         id: (Date.now() + 1).toString(),
         type: 'assistant',
@@ -74,9 +101,13 @@ function App() {
           '❌ Sorry, I encountered an error. Please make sure the backend server is running on port 8001. You can check the connection by visiting http://localhost:8001/health',
         timestamp: new Date(),
       };
-      setMessages((prev) => [...prev, errorMessage]);
+      setMessages((prev) => [
+        ...prev.filter((message) => message.id !== assistantId),
+        errorMessage,
+      ]);
     } finally {
       setIsLoading(false);
+      setStreamingMessageId(null);
     }
   };
 
@@ -100,7 +131,7 @@ function App() {
               ))}
 
               {/* Loading Indicator */}
-              {isLoading && (
+              {isLoading && !streamingMessageId && (
                 <div className="flex justify-start mb-4">
                   <div className="bg-white rounded-2xl px-6 py-4 shadow-sm border border-gray-200 animate-pulse">
                     <div className="flex gap-2">
@@ -1,6 +1,6 @@
 
 import axios from 'axios';
-import { ChatRequest, ChatResponse } from '../types';
+import { ChatRequest, ChatResponse, StreamHandlers, StreamMetadata } from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || 'http://localhost:8001';
 
@@ -17,6 +17,72 @@ export const chatAPI = {
     return response.data;
   },
 
+  /**
+   * Stream a chat response from /api/chat/stream (Server-Sent Events).
+   * Sources and suggestions arrive before the first answer token; resolves
+   * with the assembled ChatResponse once the stream is done.
+   */
+  streamMessage: async (
+    request: ChatRequest,
+    handlers: StreamHandlers = {}
+  ): Promise<ChatResponse> => {
+    const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(request),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Stream request failed with status ${response.status}`);
+    }
+
+    const result: ChatResponse = { answer: '', sources: [], suggestions: [] };
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const handleEvent = (rawEvent: string) => {
+      let event = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) return;
+      const payload = JSON.parse(data);
+
+      if (event === 'metadata') {
+        const metadata = payload as StreamMetadata;
+        result.sources = metadata.sources;
+        result.suggestions = metadata.suggestions;
+        result.follow_up = metadata.follow_up;
+        handlers.onMetadata?.(metadata);
+      } else if (event === 'token') {
+        result.answer += payload.text;
+        handlers.onToken?.(payload.text);
+      } else if (event === 'done') {
+        result.answer = payload.answer;
+      } else if (event === 'error') {
+        throw new Error(payload.message);
+      }
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        handleEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+    if (buffer.trim()) handleEvent(buffer);
+
+    return result;
+  },
+
   healthCheck: async () => {
     const response = await api.get('/api/health');
     return response.data;
@@ -31,9 +31,29 @@ export interface ChatRequest {
   session_id?: string;
 }
 
+export interface TokenUsage {
+  context_tokens: number;
+  contexts_used: number;
+  prompt_tokens: number;
+  completion_tokens: number;
+  cached: boolean;
+}
+
 export interface ChatResponse {
   answer: string;
   sources: Source[];
   suggestions: Suggestion[];
   follow_up?: string;
+  usage?: TokenUsage | null;
+}
+
+export interface StreamMetadata {
+  sources: Source[];
+  suggestions: Suggestion[];
+  follow_up?: string;
+}
+
+export interface StreamHandlers {
+  onMetadata?: (metadata: StreamMetadata) => void;
+  onToken?: (text: string) => void;
 }